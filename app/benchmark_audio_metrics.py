@@ -0,0 +1,127 @@
+"""
+Benchmark for audio_analysis_metrics.calculate_audio_metrics
+Compares the block-wise metrics engine (single squared-sum pass per 100 ms
+sub-block, BS.1770 gated loudness) against the previous implementation,
+which decoded the whole file with librosa.load, built a Python list of 100 ms
+segments and squared the whole signal several times.
+
+Uses a synthetic 10-minute 48 kHz recording (speech-like bursts over a noise
+floor) written to a temporary WAV file. Reports wall time and peak traced
+memory (numpy allocations are tracked by tracemalloc) for each, then the
+current implementation's peak memory for longer recordings (it streams the
+file, so it should not grow with duration).
+
+Run this: python app/benchmark_audio_metrics.py
+"""
+
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import soundfile as sf
+
+from services.audio_analysis_metrics import calculate_audio_metrics
+
+
+def _legacy_calculate_audio_metrics(audio_file_path):
+    """Previous calculate_audio_metrics implementation, kept here for comparison only"""
+    import librosa
+
+    y, sr = librosa.load(audio_file_path, sr=None, mono=True)
+    peak_amplitude = np.max(np.abs(y))
+    peak_level = float(20 * np.log10(peak_amplitude + 1e-10))
+    rms = np.sqrt(np.mean(y**2))
+    rms_db = float(20 * np.log10(rms + 1e-10))
+    loudness_lufs = float(rms_db - 23)
+    dynamic_range = float(peak_level - rms_db)
+
+    segment_length = int(sr * 0.1)
+    segments = []
+    for i in range(0, len(y), segment_length):
+        if i + segment_length <= len(y):
+            segments.append(y[i:i+segment_length])
+    segment_rms = [np.sqrt(np.mean(seg**2)) for seg in segments if len(seg) > 0]
+    noise_level = float(20 * np.log10(np.percentile(segment_rms, 10) + 1e-10))
+
+    return {
+        'success': True,
+        'loudness': float(round(loudness_lufs, 1)),
+        'peak_level': float(round(peak_level, 1)),
+        'noise_level': float(round(noise_level, 1)),
+        'dynamic_range': float(round(dynamic_range, 1))
+    }
+
+
+def _write_recording(path, seconds=600, sample_rate=48000, channels=1, seed=42):
+    """Write a speech-like test recording: bursts of modulated noise over a quiet floor"""
+    rng = np.random.default_rng(seed)
+    with sf.SoundFile(path, 'w', samplerate=sample_rate, channels=channels, subtype='PCM_16') as out:
+        for _ in range(seconds):
+            t = np.arange(sample_rate) / sample_rate
+            envelope = 0.3 * (rng.random() > 0.3) * (0.5 + 0.5 * np.sin(2 * np.pi * rng.uniform(2, 6) * t))
+            signal = rng.standard_normal((sample_rate, channels)) * (envelope[:, None] + 0.003)
+            out.write(np.clip(signal, -1, 1).astype(np.float32))
+
+
+def _measure(func, path, repeats=3):
+    """Best wall time (s), peak traced memory (MB) and the result"""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func(path)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak / (1024 * 1024), result
+
+
+def run_benchmark(seconds=600, sample_rate=48000):
+    print("=" * 60)
+    print("calculate_audio_metrics benchmark")
+    print("=" * 60)
+
+    for channels in (1, 2):
+        fd, path = tempfile.mkstemp(suffix='.wav')
+        os.close(fd)
+        try:
+            _write_recording(path, seconds, sample_rate, channels)
+            size_mb = os.path.getsize(path) / (1024 * 1024)
+            legacy_time, legacy_peak, legacy = _measure(_legacy_calculate_audio_metrics, path)
+            current_time, current_peak, current = _measure(calculate_audio_metrics, path)
+        finally:
+            os.unlink(path)
+
+        print(f"\n{seconds // 60} min, {sample_rate} Hz, {channels} channel(s), WAV {size_mb:.1f} MB")
+        print(f"  previous:  {legacy_time:6.2f} s, peak memory {legacy_peak:7.1f} MB")
+        print(f"  current:   {current_time:6.2f} s, peak memory {current_peak:7.1f} MB "
+              f"(speedup {legacy_time / current_time:.1f}x, memory {legacy_peak / current_peak:.1f}x lower)")
+        print(f"  previous:  loudness {legacy['loudness']} (RMS - 23), peak {legacy['peak_level']}, "
+              f"noise {legacy['noise_level']}, dynamic range {legacy['dynamic_range']}")
+        print(f"  current:   loudness {current['loudness']} LUFS (gated), peak {current['peak_level']}, "
+              f"noise {current['noise_level']}, dynamic range {current['dynamic_range']}, "
+              f"short-term max {current['short_term_loudness']}, LRA {current['loudness_range']} LU, "
+              f"{len(current['loudness_timeline'])} timeline points")
+
+
+def run_duration_scaling(minutes=(10, 30, 60), sample_rate=48000):
+    """Peak memory of the streaming implementation as the recording gets longer"""
+    print(f"\nStreaming peak memory by duration ({sample_rate} Hz, mono)")
+    for length in minutes:
+        fd, path = tempfile.mkstemp(suffix='.wav')
+        os.close(fd)
+        try:
+            _write_recording(path, length * 60, sample_rate, 1)
+            elapsed, peak, _ = _measure(calculate_audio_metrics, path, repeats=1)
+        finally:
+            os.unlink(path)
+        print(f"  {length:3d} min: {elapsed:6.2f} s, peak memory {peak:6.1f} MB")
+
+
+if __name__ == '__main__':
+    run_benchmark()
+    run_duration_scaling()
@@ -0,0 +1,118 @@
+"""
+Micro-benchmark for chunking_service.chunk_text
+Compares the current single-pass chunker against the previous implementation,
+which recomputed offsets by re-joining every earlier chunk (O(n^2) in chunks).
+Run this: python app/benchmark_chunking.py
+"""
+
+import random
+import re
+import time
+
+from services.chunking_service import chunk_text
+from services.pdf_service import MAX_WORDS_BETA
+
+
+def _legacy_chunk_text(text, chunk_size=500, overlap=50, chunk_by='tokens'):
+    """Previous chunk_text implementation, kept here for comparison only"""
+    if not text or len(text.strip()) == 0:
+        return []
+    
+    chunks = []
+    if chunk_by == 'tokens':
+        char_chunk_size = chunk_size * 4
+        char_overlap = overlap * 4
+    else:
+        char_chunk_size = chunk_size
+        char_overlap = overlap
+    
+    sentences = [s.strip() for s in re.split(r'(?<=[.!?])\s+', text) if s.strip()]
+    
+    current_chunk = ""
+    current_size = 0
+    chunk_index = 0
+    
+    for sentence in sentences:
+        sentence_size = len(sentence) if chunk_by == 'characters' else len(sentence) // 4
+        if current_size + sentence_size > char_chunk_size and current_chunk:
+            chunks.append({
+                'text': current_chunk.strip(),
+                'chunk_index': chunk_index,
+                'start_char': len(''.join([c['text'] for c in chunks])) if chunks else 0,
+                'end_char': len(''.join([c['text'] for c in chunks])) + len(current_chunk.strip())
+            })
+            chunk_index += 1
+            if overlap > 0:
+                overlap_text = current_chunk[-char_overlap:] if len(current_chunk) > char_overlap else current_chunk
+                current_chunk = overlap_text + " " + sentence
+                current_size = len(overlap_text) + sentence_size
+            else:
+                current_chunk = sentence
+                current_size = sentence_size
+        else:
+            current_chunk += (" " if current_chunk else "") + sentence
+            current_size += sentence_size
+    
+    if current_chunk.strip():
+        chunks.append({
+            'text': current_chunk.strip(),
+            'chunk_index': chunk_index,
+            'start_char': len(''.join([c['text'] for c in chunks])) if chunks else 0,
+            'end_char': len(''.join([c['text'] for c in chunks])) + len(current_chunk.strip())
+        })
+    
+    return chunks
+
+
+def _build_document(word_count, seed=42):
+    """Build a synthetic document of roughly word_count words"""
+    rng = random.Random(seed)
+    vocabulary = ['revenue', 'growth', 'quarter', 'market', 'analysis', 'report', 'customer',
+                  'product', 'the', 'and', 'of', 'in', 'data', 'model', 'results', 'region']
+    sentences = []
+    words = 0
+    while words < word_count:
+        length = rng.randint(8, 25)
+        sentences.append(' '.join(rng.choice(vocabulary) for _ in range(length)).capitalize() + '.')
+        words += length
+        if rng.random() < 0.1:
+            sentences.append('\n\n')
+    return ' '.join(sentences)
+
+
+def _time(func, text, chunk_size, overlap, chunk_by, repeats):
+    """Best-of-N wall time in milliseconds"""
+    best = None
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func(text, chunk_size=chunk_size, overlap=overlap, chunk_by=chunk_by)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run_benchmark(word_count=MAX_WORDS_BETA, repeats=5):
+    """Run the chunking benchmark and print a comparison"""
+    print("=" * 60)
+    print(f"chunk_text benchmark ({word_count:,} words)")
+    print("=" * 60)
+    
+    text = _build_document(word_count)
+    print(f"[INFO] Document: {len(text):,} characters")
+    
+    # (500, 50, 'tokens') is what chunk_document uses for PDF uploads
+    for chunk_size, overlap, chunk_by in [(500, 50, 'tokens'), (100, 10, 'tokens'),
+                                          (1000, 100, 'characters'), (300, 30, 'characters')]:
+        legacy_ms, legacy_chunks = _time(_legacy_chunk_text, text, chunk_size, overlap, chunk_by, repeats)
+        current_ms, current_chunks = _time(chunk_text, text, chunk_size, overlap, chunk_by, repeats)
+        
+        same_text = [c['text'] for c in legacy_chunks] == [c['text'] for c in current_chunks]
+        print(f"\nchunk_size={chunk_size} {chunk_by}, overlap={overlap}: {len(current_chunks)} chunks")
+        print(f"  legacy:  {legacy_ms:8.2f} ms")
+        print(f"  current: {current_ms:8.2f} ms  (speedup {legacy_ms / current_ms:.1f}x)")
+        print(f"  identical chunk texts: {'Yes' if same_text else 'NO'}")
+
+
+if __name__ == '__main__':
+    run_benchmark()
@@ -0,0 +1,106 @@
+"""
+Micro-benchmark for GeminiConfig.get_model
+Compares building a new GenerativeModel per call (the previous behaviour)
+against the keyed model-instance cache.
+
+Offline part: per-call overhead of getting a model ready to send a request
+(construct + resolve the API client). Runs without an API key.
+Online part (only when GEMINI_API_KEY is set): end-to-end latency of small
+count_tokens calls, the kind OCR context detection and token counting make.
+
+Run this: python app/benchmark_gemini_models.py
+"""
+
+import os
+import time
+import statistics
+
+import google.generativeai as genai
+from google.generativeai.client import get_default_generative_client
+
+from config.gemini import gemini
+
+
+def _legacy_get_model(model_name):
+    """Previous get_model behaviour, kept here for comparison only"""
+    return genai.GenerativeModel(model_name)
+
+
+def _ready(model):
+    """Resolve the model's API client the way generate_content does on first use"""
+    if model._client is None:
+        model._client = get_default_generative_client()
+    return model
+
+
+def _time_per_call(func, iterations):
+    """Mean microseconds per call"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) * 1e6 / iterations
+
+
+def run_offline(iterations=20000):
+    """Per-call model overhead without network"""
+    model_name = gemini.model_name
+    api_key = gemini.api_key
+    if not api_key:
+        # A placeholder key is enough: nothing here talks to the API
+        genai.configure(api_key='benchmark-placeholder', transport=gemini.transport)
+        gemini.api_key = 'benchmark-placeholder'
+
+    try:
+        generation_config = {'temperature': 0.2, 'max_output_tokens': 256}
+        legacy_us = _time_per_call(lambda: _ready(_legacy_get_model(model_name)), iterations)
+        cached_us = _time_per_call(lambda: _ready(gemini.get_model(model_name)), iterations)
+        cached_config_us = _time_per_call(
+            lambda: _ready(gemini.get_model(model_name, generation_config=generation_config)), iterations
+        )
+    finally:
+        gemini.api_key = api_key
+
+    print(f"\nget_model overhead ({iterations:,} calls, model {model_name})")
+    print(f"  new model per call:        {legacy_us:8.2f} us/call")
+    print(f"  cached model:              {cached_us:8.2f} us/call  (speedup {legacy_us / cached_us:.1f}x)")
+    print(f"  cached, keyed with config: {cached_config_us:8.2f} us/call")
+
+
+def run_online(calls=20):
+    """count_tokens latency against the real API"""
+    if not os.getenv('GEMINI_API_KEY'):
+        print("\n[INFO] GEMINI_API_KEY not set - skipping live count_tokens comparison")
+        return
+
+    text = "Detect whether this image text is a receipt, a document or a screenshot."
+    model_name = gemini.model_name
+
+    def measure(get_model):
+        samples = []
+        for _ in range(calls):
+            start = time.perf_counter()
+            get_model().count_tokens(text)
+            samples.append((time.perf_counter() - start) * 1000)
+        return statistics.median(samples), max(samples)
+
+    # Warm the connection so neither side pays the first TLS handshake
+    gemini.get_model(model_name).count_tokens(text)
+
+    legacy_median, legacy_max = measure(lambda: _legacy_get_model(model_name))
+    cached_median, cached_max = measure(lambda: gemini.get_model(model_name))
+
+    print(f"\ncount_tokens latency ({calls} calls)")
+    print(f"  new model per call: median {legacy_median:7.1f} ms, max {legacy_max:7.1f} ms")
+    print(f"  cached model:       median {cached_median:7.1f} ms, max {cached_max:7.1f} ms")
+
+
+def run_benchmark():
+    print("=" * 60)
+    print("GeminiConfig.get_model benchmark")
+    print("=" * 60)
+    run_offline()
+    run_online()
+
+
+if __name__ == '__main__':
+    run_benchmark()
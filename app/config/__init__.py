@@ -1,4 +1,4 @@
-from .database import db, get_db, get_collection, close_db, init_db
+from .database import db, get_db, get_collection, close_db, init_db, get_pool_stats
 from .gemini import (
     gemini, 
     get_gemini_model, 
@@ -6,7 +6,9 @@ from .gemini import (
     generate_text_stream,
     analyze_content,
     chat,
-    count_tokens
+    count_tokens,
+    stream_slot,
+    get_stream_stats
 )
 
 __all__ = [
@@ -16,6 +18,7 @@ __all__ = [
     'get_collection', 
     'close_db', 
     'init_db',
+    'get_pool_stats',
     # Gemini AI
     'gemini',
     'get_gemini_model',
@@ -23,6 +26,8 @@ __all__ = [
     'generate_text_stream',
     'analyze_content',
     'chat',
-    'count_tokens'
+    'count_tokens',
+    'stream_slot',
+    'get_stream_stats'
 ]
 
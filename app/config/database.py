@@ -1,11 +1,77 @@
 import os
-from pymongo import MongoClient
+import threading
+from pymongo import MongoClient, monitoring
 from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
 from dotenv import load_dotenv
 
 # Load environment variables (silently fail if .env doesn't exist)
 load_dotenv(verbose=False)
 
+
+class _PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Collects connection pool counters for the health endpoint"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        with self._lock:
+            self.created = 0
+            self.closed = 0
+            self.checked_out = 0
+            self.checkout_failures = 0
+            self.pool_clears = 0
+    
+    def _incr(self, name, delta=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + delta)
+    
+    def snapshot(self):
+        with self._lock:
+            return {
+                'connections_created': self.created,
+                'connections_closed': self.closed,
+                'connections_open': self.created - self.closed,
+                'connections_in_use': self.checked_out,
+                'checkout_failures': self.checkout_failures,
+                'pool_clears': self.pool_clears,
+            }
+    
+    def pool_created(self, event):
+        pass
+    
+    def pool_ready(self, event):
+        pass
+    
+    def pool_cleared(self, event):
+        self._incr('pool_clears')
+    
+    def pool_closed(self, event):
+        pass
+    
+    def connection_created(self, event):
+        self._incr('created')
+    
+    def connection_ready(self, event):
+        pass
+    
+    def connection_closed(self, event):
+        self._incr('closed')
+    
+    def connection_check_out_started(self, event):
+        pass
+    
+    def connection_check_out_failed(self, event):
+        self._incr('checkout_failures')
+    
+    def connection_checked_out(self, event):
+        self._incr('checked_out')
+    
+    def connection_checked_in(self, event):
+        self._incr('checked_out', -1)
+
+
 class Database:
     """MongoDB Database Configuration and Connection Handler"""
     
@@ -24,7 +90,14 @@ class Database:
         if not hasattr(self, 'initialized'):
             self.mongodb_uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
             self.db_name = os.getenv('DB_NAME', 'ai_analytics')
+            # Connection pool settings (one pooled client per worker process)
+            self.max_pool_size = int(os.getenv('MONGODB_MAX_POOL_SIZE', '10'))
+            self.min_pool_size = int(os.getenv('MONGODB_MIN_POOL_SIZE', '0'))
+            self.max_idle_time_ms = int(os.getenv('MONGODB_MAX_IDLE_TIME_MS', '300000'))
             self._connection_failed = False
+            self._pid = None
+            self._lock = threading.Lock()
+            self._pool_listener = _PoolStatsListener()
             self.initialized = True
     
     def _clean_connection_string(self, uri):
@@ -51,15 +124,35 @@ class Database:
             return base_uri
         return uri
     
+    def _check_fork(self):
+        """
+        Drop a client inherited from a parent process (e.g. gunicorn --preload)
+        MongoClient is not fork-safe, so each worker builds its own pool lazily
+        """
+        if self._client is not None and self._pid != os.getpid():
+            # Don't close() - the sockets belong to the parent process
+            self._client = None
+            self._db = None
+            self._pool_listener.reset()
+    
     def connect(self):
         """
         Establish connection to MongoDB
+        The client is created once per process and reused for every request
         Returns: MongoDB database object or None if connection fails
         """
         if self._connection_failed:
             return None
-            
-        if self._client is None:
+        
+        self._check_fork()
+        if self._client is not None:
+            return self._db
+        
+        with self._lock:
+            if self._client is not None:
+                return self._db
+            if self._connection_failed:
+                return None
             try:
                 # Clean connection string to remove invalid options
                 clean_uri = self._clean_connection_string(self.mongodb_uri)
@@ -69,6 +162,10 @@ class Database:
                     'serverSelectionTimeoutMS': 5000,
                     'connectTimeoutMS': 10000,
                     'socketTimeoutMS': 10000,
+                    'maxPoolSize': self.max_pool_size,
+                    'minPoolSize': self.min_pool_size,
+                    'maxIdleTimeMS': self.max_idle_time_ms,
+                    'event_listeners': [self._pool_listener],
                 }
                 
                 # For MongoDB Atlas (connection strings with mongodb+srv://)
@@ -84,8 +181,9 @@ class Database:
                 
                 # Get database
                 self._db = self._client[self.db_name]
+                self._pid = os.getpid()
                 
-                print(f"[OK] Successfully connected to MongoDB database: {self.db_name}")
+                print(f"[OK] Successfully connected to MongoDB database: {self.db_name} (pid {self._pid}, maxPoolSize={self.max_pool_size})")
                 return self._db
                 
             except (ConnectionFailure, ServerSelectionTimeoutError) as e:
@@ -102,17 +200,13 @@ class Database:
                 self._client = None
                 self._db = None
                 return None
-        
-        return self._db
     
     def get_db(self):
         """
         Get the database instance
         Returns: MongoDB database object or None if not connected
         """
-        if self._db is None and not self._connection_failed:
-            return self.connect()
-        return self._db
+        return self.connect()
     
     def get_collection(self, collection_name):
         """
@@ -127,12 +221,31 @@ class Database:
         return db[collection_name]
     
     def close(self):
-        """Close the database connection"""
-        if self._client:
-            self._client.close()
+        """
+        Close the pooled client
+        Only call this on worker shutdown - not per request
+        """
+        with self._lock:
+            if self._client and self._pid == os.getpid():
+                self._client.close()
+                print("[OK] MongoDB connection closed")
             self._client = None
             self._db = None
-            print("[OK] MongoDB connection closed")
+    
+    def get_pool_stats(self):
+        """
+        Get connection pool settings and counters for this worker process
+        Returns: dict
+        """
+        stats = {
+            'pid': os.getpid(),
+            'initialized': self._client is not None and self._pid == os.getpid(),
+            'max_pool_size': self.max_pool_size,
+            'min_pool_size': self.min_pool_size,
+            'max_idle_time_ms': self.max_idle_time_ms,
+        }
+        stats.update(self._pool_listener.snapshot())
+        return stats
     
     def is_connected(self):
         """
@@ -140,6 +253,7 @@ class Database:
         Returns: bool
         """
         try:
+            self._check_fork()
             if self._client:
                 self._client.admin.command('ping')
                 return True
@@ -164,6 +278,10 @@ def close_db():
     """Close database connection"""
     db.close()
 
+def get_pool_stats():
+    """Get connection pool stats for this worker"""
+    return db.get_pool_stats()
+
 def init_db():
     """Initialize database connection"""
     return db.connect()
@@ -1,10 +1,105 @@
 import os
+import json
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from dotenv import load_dotenv
 import google.generativeai as genai
 
+from .response_cache import response_cache, make_response_key
+from .single_flight import SingleFlight
+
 # Load environment variables (silently fail if .env doesn't exist)
 load_dotenv(verbose=False)
 
+
+# Coalesce concurrent identical generations (one upstream call per prompt/config)
+_generation_flight = SingleFlight('gemini.generate_text')
+_stream_flight = SingleFlight('gemini.generate_text_stream')
+
+
+class StreamLimitError(RuntimeError):
+    """Raised when a worker is already serving its maximum number of streams"""
+
+
+def _gevent_patched():
+    """Whether the process runs under gevent monkey-patching (gunicorn -k gevent)"""
+    try:
+        from gevent import monkey
+        return monkey.is_module_patched('socket')
+    except ImportError:
+        return False
+
+
+def _should_cache(request_key, generation_config, use_cache=None):
+    """
+    Whether a generation goes through the response cache (opt-in)
+
+    use_cache=True caches, use_cache=False never does; by default only
+    deterministic requests (temperature 0) are cached, so sampled answers
+    such as chat replies stay fresh. Callers pass regenerate=True to skip the
+    cached answer (the new one replaces it).
+    """
+    if not request_key or not response_cache.enabled or use_cache is False:
+        return False
+    return use_cache is True or generation_config.get('temperature') == 0
+
+
+def _config_key(value):
+    """Hashable cache key for a generation config or safety settings value"""
+    if not value:
+        return None
+    if isinstance(value, dict):
+        key = tuple(sorted(value.items()))
+        try:
+            hash(key)
+            return key
+        except TypeError:
+            pass
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+def build_chat_contents(messages):
+    """
+    Convert chat messages into a Gemini 'contents' payload
+    
+    'assistant' maps to Gemini's 'model' role. System messages are prepended
+    to the next user turn, and consecutive turns from the same role are
+    merged, since the API expects user/model turns to alternate.
+    """
+    contents = []
+    pending_system = []
+    for message in messages:
+        role = message.get('role', 'user')
+        text = message.get('content', '')
+        if not text:
+            continue
+        if role == 'system':
+            pending_system.append(text)
+            continue
+        role = 'model' if role in ('assistant', 'model') else 'user'
+        if role == 'user' and pending_system:
+            text = "\n\n".join(pending_system + [text])
+            pending_system = []
+        if contents and contents[-1]['role'] == role:
+            contents[-1]['parts'][0] += "\n\n" + text
+        else:
+            contents.append({'role': role, 'parts': [text]})
+    return contents
+
+
+def get_genai_transport():
+    """
+    Transport for google-generativeai clients
+
+    gRPC blocks gevent's hub, so cooperative workers use the REST transport
+    (plain sockets that gevent can patch). GEMINI_TRANSPORT overrides this.
+    """
+    transport = os.getenv('GEMINI_TRANSPORT', '').lower()
+    if transport:
+        return transport
+    return 'rest' if _gevent_patched() else None
+
 class GeminiConfig:
     """Google Gemini AI Configuration and Helper"""
     
@@ -22,27 +117,66 @@ class GeminiConfig:
         if not hasattr(self, 'initialized'):
             self.api_key = os.getenv('GEMINI_API_KEY', '')
             self.model_name = os.getenv('GEMINI_MODEL', 'gemini-2.0-flash-exp')
+            self.transport = get_genai_transport()
+            
+            # Streams held open at once by this worker, and how long a new one waits for a slot
+            self.max_streams = int(os.getenv('GEMINI_MAX_CONCURRENT_STREAMS', '32'))
+            self.stream_wait_seconds = float(os.getenv('GEMINI_STREAM_WAIT_SECONDS', '30'))
+            self._stream_slots = threading.BoundedSemaphore(self.max_streams)
+            
+            # GenerativeModel instances keyed by (model, generation config, safety settings)
+            self.model_cache_size = int(os.getenv('GEMINI_MODEL_CACHE_SIZE', '16'))
+            self._models = OrderedDict()
+            self._models_lock = threading.Lock()
+            self._stream_stats_lock = threading.Lock()
+            self.active_streams = 0
+            self.rejected_streams = 0
             self.initialized = True
             
             # Configure API key
             if self.api_key:
-                genai.configure(api_key=self.api_key)
-                print(f"[OK] Gemini AI configured with model: {self.model_name}")
+                genai.configure(api_key=self.api_key, transport=self.transport)
+                print(f"[OK] Gemini AI configured with model: {self.model_name} (transport: {self.transport or 'grpc'})")
             else:
                 print("[WARNING] GEMINI_API_KEY not found in environment variables")
     
-    def get_model(self, model_name=None):
+    def get_model(self, model_name=None, generation_config=None, safety_settings=None):
         """
         Get Gemini generative model
+        Instances are cached per (model, generation config, safety settings), so
+        repeated calls reuse one model object and its already-created API client
+        (the SDK shares one transport per process across models).
         Args:
             model_name (str): Optional model name override
+            generation_config (dict): Optional default generation config for the model
+            safety_settings: Optional safety settings for the model
         Returns: GenerativeModel instance
         """
         if not self.api_key:
             raise ValueError("GEMINI_API_KEY not configured")
         
         model = model_name or self.model_name
-        return genai.GenerativeModel(model)
+        key = (model, _config_key(generation_config), _config_key(safety_settings))
+        
+        with self._models_lock:
+            instance = self._models.get(key)
+            if instance is not None:
+                self._models.move_to_end(key)
+                return instance
+        
+        instance = genai.GenerativeModel(
+            model,
+            generation_config=generation_config,
+            safety_settings=safety_settings
+        )
+        
+        with self._models_lock:
+            # Another thread may have built the same model meanwhile - keep the first one
+            instance = self._models.setdefault(key, instance)
+            self._models.move_to_end(key)
+            while len(self._models) > self.model_cache_size:
+                self._models.popitem(last=False)
+        return instance
     
     def generate_text(self, prompt, model_name=None, **kwargs):
         """
@@ -50,7 +184,7 @@ class GeminiConfig:
         Args:
             prompt (str): The prompt to send to Gemini
             model_name (str): Optional model name override
-            **kwargs: Additional generation parameters
+            **kwargs: Additional generation parameters (use_cache=True opts into the response cache, regenerate=True skips the cached answer; see _should_cache)
         Returns: Generated text response
         """
         try:
@@ -64,12 +198,28 @@ class GeminiConfig:
                 'max_output_tokens': kwargs.get('max_output_tokens', 8192),
             }
             
-            response = model.generate_content(
-                prompt,
-                generation_config=generation_config
-            )
+            request_key = make_response_key(model_name or self.model_name, prompt, generation_config) if isinstance(prompt, str) else None
+            use_cache = _should_cache(request_key, generation_config, kwargs.get('use_cache'))
             
-            return response.text
+            # Identical requests are answered from the response cache
+            if use_cache and not kwargs.get('regenerate'):
+                cached = response_cache.get(request_key)
+                if cached is not None:
+                    return cached['text']
+            
+            def call():
+                response = model.generate_content(
+                    prompt,
+                    generation_config=generation_config
+                )
+                if use_cache:
+                    response_cache.put(request_key, response.text)
+                return response.text
+            
+            # Concurrent identical requests share one API call
+            if request_key:
+                return _generation_flight.do(request_key, call)
+            return call()
             
         except Exception as e:
             print(f"[ERROR] Gemini generation error: {e}")
@@ -81,7 +231,7 @@ class GeminiConfig:
         Args:
             prompt (str): The prompt to send to Gemini
             model_name (str): Optional model name override
-            **kwargs: Additional generation parameters
+            **kwargs: Additional generation parameters (use_cache=True opts into the response cache, regenerate=True skips the cached answer; see _should_cache)
         Yields: Text chunks as they are generated
         """
         try:
@@ -95,37 +245,105 @@ class GeminiConfig:
                 'max_output_tokens': kwargs.get('max_output_tokens', 8192),
             }
             
-            response = model.generate_content(
-                prompt,
-                generation_config=generation_config,
-                stream=True
-            )
+            request_key = make_response_key(model_name or self.model_name, prompt, generation_config) if isinstance(prompt, str) else None
+            use_cache = _should_cache(request_key, generation_config, kwargs.get('use_cache'))
             
-            for chunk in response:
-                if chunk.text:
-                    yield chunk.text
+            # Replay a cached answer chunk by chunk instead of calling the API
+            if use_cache and not kwargs.get('regenerate'):
+                cached = response_cache.get(request_key)
+                if cached is not None:
+                    yield from response_cache.replay(cached)
+                    return
+            
+            def upstream():
+                chunks = []
+                with self.stream_slot():
+                    response = model.generate_content(
+                        prompt,
+                        generation_config=generation_config,
+                        stream=True
+                    )
+                    
+                    for chunk in response:
+                        if chunk.text:
+                            chunks.append(chunk.text)
+                            yield chunk.text
+                
+                # Only complete streams are cached
+                if use_cache:
+                    response_cache.put(request_key, ''.join(chunks), chunks)
+            
+            # Concurrent identical requests subscribe to one upstream stream
+            if request_key:
+                yield from _stream_flight.stream(request_key, upstream)
+            else:
+                yield from upstream()
                     
         except Exception as e:
             print(f"[ERROR] Gemini streaming error: {e}")
             raise
     
+    @contextmanager
+    def stream_slot(self):
+        """
+        Hold one of this worker's stream slots for the duration of a stream
+        
+        Waits up to GEMINI_STREAM_WAIT_SECONDS for a slot (cooperatively under
+        gevent), then raises StreamLimitError. Use it around any upstream
+        stream=True call so the cap covers every streaming endpoint.
+        """
+        if not self._stream_slots.acquire(timeout=self.stream_wait_seconds):
+            with self._stream_stats_lock:
+                self.rejected_streams += 1
+            raise StreamLimitError(
+                f"Server is busy: {self.max_streams} streams already in progress, please retry shortly"
+            )
+        with self._stream_stats_lock:
+            self.active_streams += 1
+        try:
+            yield
+        finally:
+            with self._stream_stats_lock:
+                self.active_streams -= 1
+            self._stream_slots.release()
+    
+    def get_stream_stats(self):
+        """Concurrent stream counters for the health endpoint"""
+        with self._stream_stats_lock:
+            return {
+                'active_streams': self.active_streams,
+                'max_streams': self.max_streams,
+                'rejected_streams': self.rejected_streams,
+                'transport': self.transport or 'grpc',
+                'cooperative_workers': _gevent_patched()
+            }
+    
     def chat(self, messages, model_name=None, **kwargs):
         """
-        Start a chat conversation with Gemini
+        Continue a chat conversation with Gemini in a single generation call
+        The earlier turns are sent as history, so the model answers only the last one.
         Args:
-            messages (list): List of message dictionaries with 'role' and 'content'
+            messages (list): List of message dictionaries with 'role' ('user',
+                'assistant'/'model' or 'system') and 'content'; the last one is
+                the message to answer
             model_name (str): Optional model name override
             **kwargs: Additional generation parameters
         Returns: Chat response
         """
         try:
-            model = self.get_model(model_name)
-            chat = model.start_chat(history=[])
+            contents = build_chat_contents(messages)
+            if not contents or contents[-1]['role'] != 'user':
+                raise ValueError("The last chat message must come from the user")
             
-            # Send each message
-            for message in messages:
-                response = chat.send_message(message['content'])
+            model = self.get_model(model_name)
+            generation_config = {
+                'temperature': kwargs.get('temperature', 0.7),
+                'top_p': kwargs.get('top_p', 0.95),
+                'top_k': kwargs.get('top_k', 40),
+                'max_output_tokens': kwargs.get('max_output_tokens', 8192),
+            }
             
+            response = model.generate_content(contents, generation_config=generation_config)
             return response.text
             
         except Exception as e:
@@ -173,9 +391,9 @@ class GeminiConfig:
 gemini = GeminiConfig()
 
 # Helper functions for easy access
-def get_gemini_model(model_name=None):
-    """Get Gemini model instance"""
-    return gemini.get_model(model_name)
+def get_gemini_model(model_name=None, generation_config=None, safety_settings=None):
+    """Get Gemini model instance (cached)"""
+    return gemini.get_model(model_name, generation_config, safety_settings)
 
 def generate_text(prompt, **kwargs):
     """Generate text using Gemini"""
@@ -197,3 +415,11 @@ def count_tokens(text, model_name=None):
     """Count tokens in text"""
     return gemini.count_tokens(text, model_name)
 
+def stream_slot():
+    """Hold a concurrent stream slot (context manager)"""
+    return gemini.stream_slot()
+
+def get_stream_stats():
+    """Get concurrent stream counters"""
+    return gemini.get_stream_stats()
+
@@ -0,0 +1,357 @@
+"""
+Response Cache - Exact-match cache for Gemini text generations
+Keys are sha256(model, prompt, temperature, top_p, top_k, max_output_tokens),
+so repeating an analysis on the same input returns the stored answer
+instead of spending API quota on it again. Caching is opt-in per call:
+only temperature-0 requests and calls passing use_cache=True are cached.
+
+Entries keep the chunk boundaries of the stream that produced them, so a
+cached answer can be replayed through generate_text_stream chunk by chunk.
+
+GEMINI_RESPONSE_CACHE_BACKEND:
+    'memory' (default) - in-process LRU
+    'disk'   - one JSON file per entry in GEMINI_RESPONSE_CACHE_DIR
+    'mongo'  - 'gemini_response_cache' collection with a TTL index
+    'none'   - disabled
+Every backend expires entries after GEMINI_RESPONSE_CACHE_TTL_SECONDS and
+evicts the oldest entries beyond GEMINI_RESPONSE_CACHE_SIZE entries /
+GEMINI_RESPONSE_CACHE_MAX_MB.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+
+load_dotenv(verbose=False)
+
+
+def make_response_key(model_name, prompt, generation_config):
+    """Build the cache key for one generation request"""
+    payload = json.dumps([
+        model_name,
+        prompt,
+        generation_config.get('temperature'),
+        generation_config.get('top_p'),
+        generation_config.get('top_k'),
+        generation_config.get('max_output_tokens')
+    ], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class _MemoryResponseStore:
+    """In-process LRU bounded by entry count and total characters"""
+
+    name = 'memory'
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry['expires_at'] <= time.time():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = entry
+            self._bytes += len(entry['text'])
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry['text'])
+
+    def size(self):
+        return len(self._entries)
+
+
+class _DiskResponseStore:
+    """
+    One JSON file per entry; expired files are removed on read and the
+    oldest files are evicted when the directory exceeds its budget
+    """
+
+    name = 'disk'
+
+    def __init__(self, directory, max_entries, max_bytes):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        # key -> (mtime, size), oldest first
+        self._files = OrderedDict()
+        entries = []
+        for name in os.listdir(directory):
+            if name.endswith('.json'):
+                path = os.path.join(directory, name)
+                try:
+                    entries.append((os.path.getmtime(path), name[:-5], os.path.getsize(path)))
+                except OSError:
+                    continue
+        for mtime, key, size in sorted(entries):
+            self._files[key] = (mtime, size)
+        self._bytes = sum(size for _, size in self._files.values())
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry['expires_at'] <= time.time():
+            with self._lock:
+                self._remove(key)
+            return None
+        return entry
+
+    def put(self, key, entry):
+        path = self._path(key)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+        size = os.path.getsize(path)
+
+        with self._lock:
+            if key in self._files:
+                self._bytes -= self._files.pop(key)[1]
+            self._files[key] = (time.time(), size)
+            self._bytes += size
+            while self._files and (len(self._files) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._files)))
+
+    def _remove(self, key):
+        entry = self._files.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def size(self):
+        return len(self._files)
+
+
+class _MongoResponseStore:
+    """
+    MongoDB collection with a TTL index on expires_at
+    Beyond max_entries, the oldest entries are trimmed on write
+    """
+
+    name = 'mongo'
+
+    def __init__(self, collection_name, max_entries):
+        self.collection_name = collection_name
+        self.max_entries = max_entries
+        self._collection = None
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _get_collection(self):
+        if self._collection is not None:
+            return self._collection
+        with self._lock:
+            if self._collection is None:
+                from config.database import get_collection
+                collection = get_collection(self.collection_name)
+                if collection is None:
+                    return None
+                collection.create_index('expires_at_date', expireAfterSeconds=0)
+                collection.create_index('created_at')
+                self._collection = collection
+        return self._collection
+
+    def get(self, key):
+        collection = self._get_collection()
+        if collection is None:
+            return None
+        entry = collection.find_one({'_id': key}, {'_id': 0, 'expires_at_date': 0})
+        # The TTL monitor only runs once a minute, so check expiry here too
+        if entry is None or entry['expires_at'] <= time.time():
+            return None
+        return entry
+
+    def put(self, key, entry):
+        collection = self._get_collection()
+        if collection is None:
+            return
+        document = dict(entry)
+        document['expires_at_date'] = datetime.fromtimestamp(entry['expires_at'], timezone.utc)
+        collection.replace_one({'_id': key}, document, upsert=True)
+
+        # Trim the oldest entries every 100 writes rather than on each one
+        self._writes += 1
+        if self._writes % 100 == 0:
+            excess = collection.estimated_document_count() - self.max_entries
+            if excess > 0:
+                oldest = [doc['_id'] for doc in collection.find({}, {'_id': 1}).sort('created_at', 1).limit(excess)]
+                collection.delete_many({'_id': {'$in': oldest}})
+
+    def size(self):
+        collection = self._get_collection()
+        return collection.estimated_document_count() if collection is not None else 0
+
+
+class ResponseCache:
+    """Exact-match generation cache with hit/miss counters"""
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        """Singleton pattern"""
+        if cls._instance is None:
+            cls._instance = super(ResponseCache, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self.backend = os.getenv('GEMINI_RESPONSE_CACHE_BACKEND', 'memory').lower()
+        self.ttl_seconds = int(os.getenv('GEMINI_RESPONSE_CACHE_TTL_SECONDS', '3600'))
+        self.max_entries = int(os.getenv('GEMINI_RESPONSE_CACHE_SIZE', '500'))
+        self.max_bytes = int(os.getenv('GEMINI_RESPONSE_CACHE_MAX_MB', '32')) * 1024 * 1024
+        # Chunk size used when replaying an answer that was cached from a non-streaming call
+        self.replay_chunk_chars = int(os.getenv('GEMINI_RESPONSE_CACHE_REPLAY_CHARS', '200'))
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._store = None
+
+        try:
+            if self.backend == 'memory':
+                self._store = _MemoryResponseStore(self.max_entries, self.max_bytes)
+            elif self.backend == 'disk':
+                self._store = _DiskResponseStore(
+                    os.getenv('GEMINI_RESPONSE_CACHE_DIR', os.path.join(os.getcwd(), '.response_cache')),
+                    self.max_entries, self.max_bytes
+                )
+            elif self.backend == 'mongo':
+                self._store = _MongoResponseStore(
+                    os.getenv('GEMINI_RESPONSE_CACHE_COLLECTION', 'gemini_response_cache'),
+                    self.max_entries
+                )
+        except Exception as e:
+            print(f"[WARN] Response cache ({self.backend}) unavailable: {e}. Caching disabled.")
+            self._store = None
+
+        ResponseCache._initialized = True
+
+    @property
+    def enabled(self):
+        return self._store is not None
+
+    def get(self, key):
+        """
+        Look up a cached generation
+
+        Returns:
+            dict: {'text', 'boundaries', ...} or None
+        """
+        if self._store is None:
+            return None
+        try:
+            entry = self._store.get(key)
+        except Exception as e:
+            print(f"[WARN] Response cache read failed: {e}")
+            entry = None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+    def put(self, key, text, chunks=None):
+        """
+        Store a generation
+
+        Args:
+            key (str): Key from make_response_key
+            text (str): Full response text
+            chunks (list): Stream chunks, if the response was streamed
+        """
+        if self._store is None or not text:
+            return
+        boundaries = None
+        if chunks:
+            boundaries = []
+            end = 0
+            for chunk in chunks:
+                end += len(chunk)
+                boundaries.append(end)
+        now = time.time()
+        entry = {
+            'text': text,
+            'boundaries': boundaries,
+            'created_at': now,
+            'expires_at': now + self.ttl_seconds
+        }
+        try:
+            self._store.put(key, entry)
+        except Exception as e:
+            print(f"[WARN] Response cache write failed: {e}")
+
+    def replay(self, entry):
+        """Yield a cached response chunk by chunk, as the original stream did"""
+        text = entry['text']
+        boundaries = entry.get('boundaries')
+        if not boundaries:
+            step = max(1, self.replay_chunk_chars)
+            boundaries = list(range(step, len(text), step)) + [len(text)]
+        start = 0
+        for end in boundaries:
+            if end > start:
+                yield text[start:end]
+            start = end
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                'backend': self.backend if self._store else None,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'ttl_seconds': self.ttl_seconds,
+            }
+        if self._store is not None:
+            try:
+                stats['entries'] = self._store.size()
+            except Exception:
+                stats['entries'] = None
+        return stats
+
+
+# Singleton instance
+response_cache = ResponseCache()
+
+
+def get_response_cache_stats():
+    """Get response cache counters"""
+    return response_cache.get_stats()
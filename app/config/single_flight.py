@@ -0,0 +1,196 @@
+"""
+Single Flight - Coalesce concurrent identical upstream calls
+When several requests ask for the same generation or embedding at the same
+time, only the first one calls the API; the others wait for and share its
+result. Streams fan out: one upstream stream is read into a shared buffer
+that every subscriber replays from the start at its own pace; once every
+subscriber has gone, the upstream stream is closed.
+"""
+
+import copy
+import threading
+
+_groups = []
+
+
+def _error_for_waiter(error):
+    """
+    A copy of a shared error for one waiting thread, so threads re-raising
+    it don't keep rewriting the same __traceback__ (falls back to the original)
+    """
+    try:
+        copied = copy.copy(error)
+    except Exception:
+        return error
+    if type(copied) is not type(error):
+        return error
+    copied.__cause__ = error
+    return copied
+
+
+class _Call:
+    """One in-flight non-streaming call"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _Broadcast:
+    """One in-flight upstream stream and the chunks read from it so far"""
+
+    def __init__(self):
+        self.chunks = []
+        self.finished = False
+        self.error = None
+        self.condition = threading.Condition()
+        # Changed under the owning SingleFlight's lock
+        self.subscribers = 0
+        self.abandoned = False
+
+    def publish(self, chunk):
+        with self.condition:
+            self.chunks.append(chunk)
+            self.condition.notify_all()
+
+    def finish(self, error=None):
+        with self.condition:
+            self.finished = True
+            self.error = error
+            self.condition.notify_all()
+
+    def subscribe(self):
+        position = 0
+        while True:
+            with self.condition:
+                while position >= len(self.chunks) and not self.finished:
+                    self.condition.wait()
+                pending = self.chunks[position:]
+                finished = self.finished
+                error = self.error
+            for chunk in pending:
+                yield chunk
+            position += len(pending)
+            if finished and position >= len(self.chunks):
+                if error is not None:
+                    raise _error_for_waiter(error)
+                return
+
+
+class SingleFlight:
+    """Group of keyed calls where concurrent duplicates share one execution"""
+
+    def __init__(self, name):
+        self.name = name
+        _groups.append(self)
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._streams = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key, func):
+        """
+        Run func() once for all concurrent callers with the same key
+
+        Returns:
+            The result of func(); callers that joined an in-flight call get
+            the same result (or the same exception)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise _error_for_waiter(call.error)
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def stream(self, key, func):
+        """
+        Yield the chunks of func() (a generator), sharing one upstream
+        stream between concurrent subscribers with the same key
+
+        The upstream is drained on a background thread, so a subscriber that
+        disconnects early never stalls the others. When the last subscriber
+        leaves before the end, the upstream generator is closed (releasing its
+        stream slot and stopping the billed generation).
+        """
+        with self._lock:
+            broadcast = self._streams.get(key)
+            if broadcast is not None:
+                self.coalesced += 1
+            else:
+                broadcast = _Broadcast()
+                self._streams[key] = broadcast
+                self.executed += 1
+                threading.Thread(target=self._pump, args=(key, broadcast, func), daemon=True).start()
+            broadcast.subscribers += 1
+
+        try:
+            yield from broadcast.subscribe()
+        finally:
+            with self._lock:
+                broadcast.subscribers -= 1
+                if broadcast.subscribers == 0 and not broadcast.finished:
+                    broadcast.abandoned = True
+                    # Later callers start a fresh upstream instead of joining a closing one
+                    if self._streams.get(key) is broadcast:
+                        del self._streams[key]
+
+    def _pump(self, key, broadcast, func):
+        error = None
+        upstream = None
+        try:
+            upstream = func()
+            for chunk in upstream:
+                if broadcast.abandoned:
+                    print(f"[INFO] {self.name}: every subscriber left, closing the upstream stream")
+                    break
+                broadcast.publish(chunk)
+        except Exception as e:
+            error = e
+        finally:
+            try:
+                if upstream is not None:
+                    upstream.close()
+            except Exception as e:
+                error = error or e
+            # New subscribers after this point start a fresh upstream call
+            with self._lock:
+                if self._streams.get(key) is broadcast:
+                    del self._streams[key]
+            broadcast.finish(error)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'executed': self.executed,
+                'coalesced': self.coalesced,
+                'in_flight': len(self._calls) + len(self._streams)
+            }
+
+
+def get_single_flight_stats():
+    """Executed/coalesced counters for every single-flight group"""
+    return {group.name: group.get_stats() for group in _groups}
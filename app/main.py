@@ -6,8 +6,11 @@ from flask import Flask
 from flask_cors import CORS
 from dotenv import load_dotenv
 import os
-from config import init_db, close_db
-from routes import pdf_bp, rag_bp, audio_bp
+import atexit
+from config import init_db, close_db, get_pool_stats, get_stream_stats
+from config.response_cache import get_response_cache_stats
+from config.single_flight import get_single_flight_stats
+from routes import pdf_bp, rag_bp, audio_bp, csv_bp
 from routes.image_routes import image_bp
 from routes.ai_routes import ai_bp
 
@@ -16,7 +19,8 @@ load_dotenv(verbose=False)
 port = int(os.getenv('PORT', 8080))
 
 app = Flask(__name__)
-CORS(app)
+# X-Dataset-Id lets the CSV UI reference a dataset instead of re-sending rows
+CORS(app, expose_headers=['X-Dataset-Id'])
 
 # Memory-optimized configuration for low-resource VPS
 # Reduce max upload size to prevent memory issues (25MB instead of 50MB)
@@ -29,12 +33,17 @@ app.register_blueprint(rag_bp)
 app.register_blueprint(image_bp)
 app.register_blueprint(ai_bp)
 app.register_blueprint(audio_bp)
+app.register_blueprint(csv_bp)
 
 try:
     init_db()
 except Exception as e:
     print(f"Warning: Could not connect to database: {e}")
 
+# Keep the pooled MongoDB client for the lifetime of the worker process
+# and only close it when the worker shuts down
+atexit.register(close_db)
+
 
 @app.route('/')
 def home():
@@ -70,9 +79,41 @@ def health():
     
     response = {
         'status': 'healthy',
-        'database': db_status
+        'database': db_status,
+        'database_pool': get_pool_stats()
     }
     
+    try:
+        response['streams'] = get_stream_stats()
+        response['response_cache'] = get_response_cache_stats()
+        response['single_flight'] = get_single_flight_stats()
+    except Exception:
+        pass
+    
+    try:
+        from services.embedding_cache import get_embedding_cache_stats
+        response['embedding_cache'] = get_embedding_cache_stats()
+    except Exception:
+        pass
+    
+    try:
+        from services.document_summarizer import get_document_summarizer_stats
+        response['document_summaries'] = get_document_summarizer_stats()
+    except Exception:
+        pass
+    
+    try:
+        from services.csv_dataset_service import get_csv_dataset_stats
+        response['csv_datasets'] = get_csv_dataset_stats()
+    except Exception:
+        pass
+    
+    try:
+        from services.transcription_client import get_transcription_stats
+        response['transcriptions'] = get_transcription_stats()
+    except Exception:
+        pass
+    
     if memory_mb is not None:
         response['memory'] = {
             'process_mb': round(memory_mb, 2),
@@ -141,11 +182,6 @@ def db_init():
         }, 500
 
 
-@app.teardown_appcontext
-def shutdown_session(exception=None):
-    close_db()
-
-
 if __name__ == '__main__':
     print(f"Server is running on port {port}")
     debug_mode = os.getenv('FLASK_ENV') != 'production'
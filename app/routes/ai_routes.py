@@ -3,10 +3,11 @@ AI Routes - Handle AI chat, generation, and analysis endpoints
 """
 from flask import Blueprint, request, jsonify, Response
 import os
-from config import generate_text, generate_text_stream, analyze_content
+from config import generate_text, generate_text_stream, analyze_content, chat
+from services.chat_service import send_chat_message, get_conversation, delete_conversation
 from services.ai_prompt_service import build_chat_prompt, build_streaming_chat_prompt
 from services.pdf_analysis_service import build_document_insight_prompt
-from services.csv_service import build_csv_insight_prompt
+from services.csv_service import register_csv_rows, build_csv_dataset_prompt, build_csv_prompt_for_dataset
 from services.audio_analysis.prompts import build_audio_insight_prompt
 
 ai_bp = Blueprint('ai', __name__, url_prefix='/api/ai')
@@ -85,6 +86,80 @@ def ai_generate_stream():
         }, 500
 
 
+@ai_bp.route('/chat', methods=['POST'])
+def ai_chat():
+    """
+    Multi-turn chat (one generation call per turn)
+    
+    Either send 'message' (+ optional 'conversation_id') to use server-side
+    history, or send the full 'messages' list for a stateless call.
+    """
+    try:
+        data = request.json
+        temperature = data.get('temperature', 0.7)
+        max_tokens = data.get('max_output_tokens', 8192)
+        messages = data.get('messages')
+        user_message = data.get('message')
+        
+        if messages and not user_message:
+            response = chat(messages, temperature=temperature, max_output_tokens=max_tokens)
+            return {
+                'status': 'success',
+                'response': response,
+                'model': os.getenv('GEMINI_MODEL', 'gemini-2.0-flash-exp')
+            }
+        
+        if not user_message:
+            return {
+                'status': 'error',
+                'message': 'Message is required'
+            }, 400
+        
+        result = send_chat_message(
+            user_message,
+            conversation_id=data.get('conversation_id'),
+            system_prompt=data.get('system_prompt'),
+            temperature=temperature,
+            max_output_tokens=max_tokens
+        )
+        
+        return {
+            'status': 'success',
+            'response': result['response'],
+            'conversation_id': result['conversation_id'],
+            'turns': result['turns'],
+            'summarized': result['summarized'],
+            'model': os.getenv('GEMINI_MODEL', 'gemini-2.0-flash-exp')
+        }
+        
+    except Exception as e:
+        return {
+            'status': 'error',
+            'message': str(e)
+        }, 500
+
+
+@ai_bp.route('/chat/<conversation_id>', methods=['GET', 'DELETE'])
+def ai_chat_conversation(conversation_id):
+    """Get or delete a server-side conversation"""
+    try:
+        if request.method == 'DELETE':
+            if not delete_conversation(conversation_id):
+                return {'status': 'error', 'message': 'Conversation not found'}, 404
+            return {'status': 'success', 'message': 'Conversation deleted'}
+        
+        conversation = get_conversation(conversation_id)
+        if not conversation:
+            return {'status': 'error', 'message': 'Conversation not found'}, 404
+        return {'status': 'success', 'conversation': conversation}
+        
+    except Exception as e:
+        return {
+            'status': 'error',
+            'message': str(e)
+        }, 500
+
+
 @ai_bp.route('/analyze', methods=['POST'])
 def ai_analyze():
     """Analyze content using Gemini AI"""
@@ -99,7 +174,8 @@ def ai_analyze():
                 'message': 'Content is required'
             }, 400
         
-        result = analyze_content(content, analysis_type)
+        # Repeat analyses are served from the response cache unless regenerate is set
+        result = analyze_content(content, analysis_type, use_cache=True, regenerate=bool(data.get('regenerate')))
         
         return {
             'status': 'success',
@@ -119,7 +195,12 @@ def ai_test():
     """Test Gemini AI connection"""
     try:
         test_prompt = "Say 'Hello! Gemini is working!' in a friendly way."
-        response = generate_text(test_prompt, max_output_tokens=100)
+        response = generate_text(
+            test_prompt,
+            max_output_tokens=100,
+            use_cache=True,
+            regenerate=request.args.get('regenerate', '').lower() in ('1', 'true')
+        )
         
         return {
             'status': 'success',
@@ -148,23 +229,46 @@ def ai_generate_insights_stream():
         
         file_type = data.get('fileType', '').upper()
         print(f"[INSIGHT] Generating insights for file type: {file_type}")
+        response_headers = {}
         
         if file_type == 'CSV':
             csv_data = data.get('data', [])
             columns = data.get('columns', [])
             metadata = data.get('metadata', {})
             analysis_type = data.get('analysisType', 'overview')
+            # Uploaded or previously posted datasets are referenced by id
+            dataset_id = data.get('datasetId')
             
-            print(f"[INSIGHT] CSV data: {len(csv_data) if csv_data else 0} rows, {len(columns) if columns else 0} columns, analysis_type: {analysis_type}")
+            if dataset_id is not None and not isinstance(dataset_id, str):
+                return jsonify({
+                    'status': 'error',
+                    'message': 'datasetId must be a string'
+                }), 400
             
-            if not csv_data or not columns:
+            print(f"[INSIGHT] CSV data: {'dataset ' + dataset_id if dataset_id else str(len(csv_data) if csv_data else 0) + ' rows'}, {len(columns) if columns else 0} columns, analysis_type: {analysis_type}")
+            
+            if not dataset_id and (not csv_data or not columns):
                 return jsonify({
                     'status': 'error',
-                    'message': 'CSV data and columns are required'
+                    'message': 'CSV data and columns (or datasetId) are required'
                 }), 400
             
             try:
-                prompt = build_csv_insight_prompt(csv_data, columns, metadata, analysis_type)
+                if dataset_id:
+                    prompt = build_csv_dataset_prompt(dataset_id, metadata, analysis_type)
+                else:
+                    # Same rows as an earlier request resolve to the same dataset;
+                    # build from the one just registered, it may not be retrievable by id
+                    dataset = register_csv_rows(csv_data, columns)
+                    dataset_id = dataset['dataset_id']
+                    prompt = build_csv_prompt_for_dataset(dataset, metadata, analysis_type)
+                if prompt is None:
+                    return jsonify({
+                        'status': 'error',
+                        'message': 'Dataset not found - send the data again'
+                    }), 404
+                # Follow-up analysis types can send this id instead of the rows
+                response_headers['X-Dataset-Id'] = dataset_id
                 print(f"[INSIGHT] Prompt built successfully, length: {len(prompt)}, type: {analysis_type}")
             except Exception as e:
                 print(f"[INSIGHT] Error building CSV prompt: {str(e)}")
@@ -226,13 +330,16 @@ def ai_generate_insights_stream():
         
         temperature = data.get('temperature', 0.7)
         max_tokens = data.get('max_tokens', 2048)
+        # Same prompt and settings replay the cached insights; "Regenerate" asks for a fresh answer
+        regenerate = bool(data.get('regenerate'))
         
         print(f"[INSIGHT] Starting generation with temperature={temperature}, max_tokens={max_tokens}")
         
         def generate():
             try:
                 chunk_count = 0
-                for chunk in generate_text_stream(prompt, temperature=temperature, max_output_tokens=max_tokens):
+                for chunk in generate_text_stream(prompt, temperature=temperature, max_output_tokens=max_tokens,
+                                                  use_cache=True, regenerate=regenerate):
                     if chunk:
                         chunk_count += 1
                         yield f"data: {chunk}\n\n"
@@ -242,7 +349,7 @@ def ai_generate_insights_stream():
                 print(f"[INSIGHT] Generation error: {error_msg}")
                 yield f"data: {error_msg}\n\n"
         
-        return Response(generate(), mimetype='text/event-stream')
+        return Response(generate(), mimetype='text/event-stream', headers=response_headers)
         
     except Exception as e:
         import traceback
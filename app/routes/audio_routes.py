@@ -6,7 +6,9 @@ from werkzeug.utils import secure_filename
 from datetime import datetime
 import os
 
-from services.audio_service import get_audio_metadata, transcribe_audio, analyze_audio_with_ai, analyze_audio_stream
+from services.audio_service import get_audio_metadata, analyze_audio_with_ai, analyze_audio_stream
+from services.audio_pipeline import start_audio_pipeline
+from services.transcription_client import handle_transcription_webhook, ASSEMBLYAI_WEBHOOK_HEADER
 
 audio_bp = Blueprint('audio', __name__, url_prefix='/api/audio')
 
@@ -73,9 +75,10 @@ def upload_audio():
         # Secure the filename
         filename = secure_filename(file.filename)
         
-        # Get audio metadata
-        file.seek(0)
-        metadata_result = get_audio_metadata(file)
+        # Start transcription and compute metadata/metrics while it runs
+        job = start_audio_pipeline(file, file.filename)
+        
+        metadata_result = job.metadata()
         
         if not metadata_result['success']:
             return jsonify({
@@ -83,9 +86,8 @@ def upload_audio():
                 'message': f"Failed to read audio: {metadata_result['error']}"
             }), 500
         
-        # Transcribe audio
-        file.seek(0)
-        transcription_result = transcribe_audio(file)
+        # Wait for the transcription
+        transcription_result = job.transcription()
         
         if not transcription_result['success']:
             return jsonify({
@@ -132,7 +134,10 @@ def upload_audio():
                 'loudness': metadata_result.get('loudness'),
                 'peak_level': metadata_result.get('peak_level'),
                 'noise_level': metadata_result.get('noise_level'),
-                'dynamic_range': metadata_result.get('dynamic_range')
+                'dynamic_range': metadata_result.get('dynamic_range'),
+                'short_term_loudness': metadata_result.get('short_term_loudness'),
+                'loudness_range': metadata_result.get('loudness_range'),
+                'loudness_timeline': metadata_result.get('loudness_timeline')
             },
             'transcription': {
                 'text': transcription_result.get('transcript', ''),
@@ -219,6 +224,7 @@ def analyze_audio_stream_endpoint():
             }), 400
         
         analysis_type = request.form.get('analysis_type', 'overview')
+        filename = file.filename
         
         # Read file into memory
         from io import BytesIO
@@ -228,7 +234,7 @@ def analyze_audio_stream_endpoint():
         
         def generate():
             try:
-                for chunk in analyze_audio_stream(file_stream, analysis_type):
+                for chunk in analyze_audio_stream(file_stream, analysis_type, filename):
                     yield f"data: {chunk}\n\n"
                 yield "data: [DONE]\n\n"
             except Exception as e:
@@ -250,6 +256,33 @@ def analyze_audio_stream_endpoint():
         }), 500
 
 
+@audio_bp.route('/transcription-webhook', methods=['POST'])
+def transcription_webhook():
+    """
+    AssemblyAI completion callback (set ASSEMBLYAI_WEBHOOK_URL to this endpoint's public URL)
+    
+    Expected: JSON {'transcript_id', 'status'}
+    
+    Returns: JSON acknowledgement; 401 if the webhook secret does not match
+    """
+    result = handle_transcription_webhook(
+        request.get_json(silent=True) or {},
+        request.headers.get(ASSEMBLYAI_WEBHOOK_HEADER)
+    )
+    
+    if not result['success']:
+        status_code = 401 if result['error'] == 'Invalid webhook secret' else 400
+        return jsonify({
+            'status': 'error',
+            'message': result['error']
+        }), status_code
+    
+    return jsonify({
+        'status': 'success',
+        'completed': result['completed']
+    }), 200
+
+
 @audio_bp.route('/metadata', methods=['POST'])
 def get_audio_metadata_endpoint():
     """
@@ -292,7 +325,10 @@ def get_audio_metadata_endpoint():
                 'loudness': metadata_result.get('loudness'),
                 'peak_level': metadata_result.get('peak_level'),
                 'noise_level': metadata_result.get('noise_level'),
-                'dynamic_range': metadata_result.get('dynamic_range')
+                'dynamic_range': metadata_result.get('dynamic_range'),
+                'short_term_loudness': metadata_result.get('short_term_loudness'),
+                'loudness_range': metadata_result.get('loudness_range'),
+                'loudness_timeline': metadata_result.get('loudness_timeline')
             }
         }), 200
         
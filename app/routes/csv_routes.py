@@ -0,0 +1,130 @@
+"""
+CSV Routes - Stream CSV uploads into stored columnar datasets
+"""
+from flask import Blueprint, request, jsonify
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.utils import secure_filename
+from werkzeug.wsgi import get_input_stream
+import gzip
+import os
+import zlib
+
+from services.csv_dataset_service import ingest_csv_stream, get_dataset, delete_dataset, describe_dataset
+from services.csv_analysis.columnar import CsvLimitError
+
+csv_bp = Blueprint('csv', __name__, url_prefix='/api/csv')
+
+# Raw-body uploads are streamed, so they are not bound by MAX_CONTENT_LENGTH
+CSV_UPLOAD_MAX_MB = int(os.getenv('CSV_UPLOAD_MAX_MB', '1024'))
+# Cap on the CSV after gzip decoding - the body cap alone doesn't bound a gzip bomb
+CSV_UPLOAD_MAX_DECOMPRESSED_MB = int(os.getenv('CSV_UPLOAD_MAX_DECOMPRESSED_MB', str(CSV_UPLOAD_MAX_MB)))
+
+
+@csv_bp.route('/upload', methods=['POST'])
+def upload_csv():
+    """
+    Upload a CSV and store it as a typed columnar dataset
+    
+    Expected: the raw CSV as the request body (Content-Type: text/csv, may be
+    sent with Content-Encoding: gzip), or multipart/form-data with a 'file'
+    field (limited by MAX_CONTENT_LENGTH)
+    Optional query parameters: 'filename', 'hasHeaders' (default true),
+    'delimiter' (detected when omitted)
+    The body size, decompressed size, row count and distinct values are capped
+    (413 when exceeded); a malformed gzip body is a 400
+    
+    Returns: JSON with dataset_id and the column types; pass dataset_id as
+    'datasetId' to /api/ai/generate-insights-stream instead of the rows
+    """
+    try:
+        has_headers = request.args.get('hasHeaders', 'true').lower() != 'false'
+        delimiter = request.args.get('delimiter') or None
+        if delimiter == '\\t':
+            delimiter = '\t'
+        
+        if request.mimetype == 'multipart/form-data':
+            file = request.files.get('file')
+            if file is None or file.filename == '':
+                return jsonify({
+                    'status': 'error',
+                    'message': 'No file provided'
+                }), 400
+            filename = secure_filename(file.filename)
+            stream = file.stream
+        else:
+            filename = secure_filename(request.args.get('filename', '')) or None
+            # Read the body incrementally straight from the WSGI input
+            stream = get_input_stream(request.environ, max_content_length=CSV_UPLOAD_MAX_MB * 1024 * 1024)
+            if request.headers.get('Content-Encoding', '').lower() == 'gzip':
+                stream = gzip.GzipFile(fileobj=stream, mode='rb')
+        
+        dataset = ingest_csv_stream(
+            stream, filename=filename, has_headers=has_headers, delimiter=delimiter,
+            max_bytes=CSV_UPLOAD_MAX_DECOMPRESSED_MB * 1024 * 1024
+        )
+        if not dataset['row_count']:
+            delete_dataset(dataset['dataset_id'])
+            return jsonify({
+                'status': 'error',
+                'message': 'The CSV file has no data rows'
+            }), 400
+        
+        return jsonify({
+            'status': 'success',
+            **describe_dataset(dataset)
+        }), 201
+        
+    except CsvLimitError as e:
+        print(f"[WARN] CSV upload rejected: {e}")
+        return jsonify({
+            'status': 'error',
+            'message': f'{str(e)}. Please upload a smaller file.'
+        }), 413
+    except RequestEntityTooLarge:
+        # The body itself is over CSV_UPLOAD_MAX_MB (or MAX_CONTENT_LENGTH for multipart)
+        print("[WARN] CSV upload rejected: request body too large")
+        return jsonify({
+            'status': 'error',
+            'message': f'The upload exceeds the {CSV_UPLOAD_MAX_MB} MB limit. Please upload a smaller file.'
+        }), 413
+    except (gzip.BadGzipFile, EOFError, zlib.error) as e:
+        print(f"[WARN] CSV upload rejected: malformed gzip body: {e}")
+        return jsonify({
+            'status': 'error',
+            'message': f'The gzip-encoded body could not be decompressed: {str(e)}'
+        }), 400
+    except Exception as e:
+        print(f"[ERROR] CSV upload failed: {e}")
+        return jsonify({
+            'status': 'error',
+            'message': f'Failed to parse CSV: {str(e)}'
+        }), 500
+
+
+@csv_bp.route('/datasets/<dataset_id>', methods=['GET'])
+def get_csv_dataset(dataset_id):
+    """Describe a stored dataset (columns, types, row count)"""
+    dataset = get_dataset(dataset_id)
+    if dataset is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Dataset not found'
+        }), 404
+    return jsonify({
+        'status': 'success',
+        **describe_dataset(dataset)
+    })
+
+
+@csv_bp.route('/datasets/<dataset_id>', methods=['DELETE'])
+def delete_csv_dataset(dataset_id):
+    """Delete a stored dataset"""
+    if not delete_dataset(dataset_id):
+        return jsonify({
+            'status': 'error',
+            'message': 'Dataset not found'
+        }), 404
+    return jsonify({
+        'status': 'success',
+        'dataset_id': dataset_id
+    })
@@ -6,7 +6,7 @@ from werkzeug.utils import secure_filename
 from datetime import datetime
 import os
 
-from services.pdf_service import extract_text_from_pdf, extract_pdf_metadata, analyze_pdf_with_ai, extract_tables_from_pdf
+from services.pdf_service import extract_text_from_pdf, extract_pdf_metadata, analyze_pdf_with_ai, analyze_pdf_document
 
 pdf_bp = Blueprint('pdf', __name__, url_prefix='/api/pdf')
 
@@ -55,8 +55,9 @@ def upload_pdf():
         # Secure the filename
         filename = secure_filename(file.filename)
         
-        # Extract text from PDF
-        extraction_result = extract_text_from_pdf(file)
+        # Parse the PDF once - text, images, tables and metadata all come from this pass
+        pdf_analysis = analyze_pdf_document(file, extract_tables=True)
+        extraction_result = pdf_analysis.text_result()
         
         if not extraction_result['success']:
             # Check if it's a limit error (400) or processing error (500)
@@ -70,9 +71,8 @@ def upload_pdf():
                 'error_type': 'limit_exceeded' if is_limit_error else 'processing_error'
             }), status_code
         
-        # Extract tables from PDF
-        file.seek(0)  # Reset file stream position
-        tables_result = extract_tables_from_pdf(file)
+        # Tables were collected during the same page walk
+        tables_result = pdf_analysis.tables_result()
         
         # Prepare response data
         # Use word_count from extraction_result if available, otherwise calculate
@@ -102,7 +102,10 @@ def upload_pdf():
         
         if analysis_type and extraction_result['text']:
             try:
-                analysis = analyze_pdf_with_ai(extraction_result['text'], analysis_type)
+                analysis = analyze_pdf_with_ai(
+                    extraction_result['text'], analysis_type,
+                    regenerate=request.form.get('regenerate', '').lower() in ('1', 'true')
+                )
                 response_data['ai_analysis'] = {
                     'type': analysis_type,
                     'result': analysis
@@ -128,21 +131,19 @@ def upload_pdf():
             document_id = str(db_result['id']) if db_result['success'] else None
             response_data['db_id'] = document_id
         
-        # RAG: Chunk and embed document for vector search
+        # RAG: Chunk and embed document for vector search in the background
         enable_rag = request.form.get('enable_rag', 'true').lower() == 'true'
         if enable_rag and extraction_result['text']:
             try:
-                from services.chunking_service import chunk_document
-                from services.embedding_service import generate_embeddings_batch
-                from services.pinecone_service import store_chunks
+                from services.rag_job_service import submit_rag_job
                 
                 # Generate document ID if not saved to DB
                 if not document_id:
                     import uuid
                     document_id = str(uuid.uuid4())
                 
-                # Chunk the document
-                chunks = chunk_document(
+                job = submit_rag_job(
+                    document_id=document_id,
                     text=extraction_result['text'],
                     metadata={
                         'filename': filename,
@@ -153,47 +154,13 @@ def upload_pdf():
                     overlap=50
                 )
                 
-                # Check embedding configuration
-                from services.pinecone_service import pinecone_service
-                use_pinecone_embeddings = pinecone_service.use_pinecone_embeddings
-                index_dimension = pinecone_service.dimension
-                
-                # Generate embeddings for chunks
-                chunk_texts = [chunk['text'] for chunk in chunks]
-                
-                if use_pinecone_embeddings and index_dimension == 1024:
-                    # Use Pinecone Inference API to generate 1024-dim embeddings
-                    try:
-                        from services.pinecone_embedding_service import generate_pinecone_embeddings_batch
-                        print("[INFO] Using Pinecone Inference API for embeddings (1024 dimensions)")
-                        embeddings = generate_pinecone_embeddings_batch(chunk_texts)
-                    except Exception as e:
-                        print(f"[WARN] Pinecone Inference API failed: {e}")
-                        print(f"[WARN] Error details: {str(e)}")
-                        raise ValueError(f"Failed to generate Pinecone embeddings: {str(e)}")
-                else:
-                    # Use Google embeddings (768 dimensions) - default
-                    print(f"[INFO] Using Google text-embedding-004 for embeddings ({index_dimension} dimensions)")
-                    embeddings = generate_embeddings_batch(chunk_texts)
-                
-                # Validate embeddings match chunks
-                if len(embeddings) != len(chunks):
-                    print(f"[ERROR] Embedding count mismatch: {len(embeddings)} embeddings for {len(chunks)} chunks")
-                    raise ValueError(f"Failed to generate embeddings: got {len(embeddings)} embeddings for {len(chunks)} chunks")
-                
-                # Store in Pinecone (will use integrated embeddings if enabled)
-                rag_result = store_chunks(
-                    document_id=document_id,
-                    chunks=chunks,
-                    embeddings=embeddings  # None if using integrated embeddings
-                )
-                
                 response_data['rag'] = {
                     'enabled': True,
                     'document_id': document_id,
-                    'chunks_created': len(chunks),
-                    'vectors_stored': rag_result.get('vectors_stored', 0) if rag_result.get('success') else 0,
-                    'success': rag_result.get('success', False)
+                    'job_id': job['job_id'],
+                    'status': job['status'],
+                    'status_url': f"/api/rag/jobs/{job['job_id']}",
+                    'success': True
                 }
                 
             except Exception as e:
@@ -295,7 +262,10 @@ def analyze_pdf():
             }), status_code
         
         # Analyze with AI
-        analysis = analyze_pdf_with_ai(extraction['text'], analysis_type)
+        analysis = analyze_pdf_with_ai(
+            extraction['text'], analysis_type,
+            regenerate=request.form.get('regenerate', '').lower() in ('1', 'true')
+        )
         
         return jsonify({
             'status': 'success',
@@ -84,3 +84,28 @@ def rag_query_sync_endpoint():
             'message': str(e)
         }), 500
 
+
+
+@rag_bp.route('/api/rag/jobs/<job_id>', methods=['GET'])
+def rag_job_status_endpoint(job_id):
+    """Progress of a background RAG indexing job (queued from /api/pdf/upload)"""
+    try:
+        from services.rag_job_service import get_rag_job
+        job = get_rag_job(job_id)
+        
+        if not job:
+            return jsonify({
+                'status': 'error',
+                'message': 'Job not found'
+            }), 404
+        
+        return jsonify({
+            'status': 'success',
+            'job': job
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
@@ -4,7 +4,8 @@ from .csv_service import build_csv_insight_prompt
 from .pdf_analysis_service import build_document_insight_prompt
 from .chunking_service import chunk_text, chunk_document
 from .embedding_service import generate_embedding, generate_embeddings_batch, generate_query_embedding
-from .pinecone_service import get_pinecone_index, store_chunks, search_similar_chunks, delete_document
+from .pinecone_service import get_pinecone_index
+from .vector_store import get_vector_store, store_chunks, search_similar_chunks, delete_document
 from .rag_service import rag_query, rag_query_sync
 
 __all__ = [
@@ -18,6 +19,7 @@ __all__ = [
     'generate_embeddings_batch',
     'generate_query_embedding',
     'get_pinecone_index',
+    'get_vector_store',
     'store_chunks',
     'search_similar_chunks',
     'delete_document',
@@ -4,6 +4,8 @@ Build prompts for different audio analysis types
 """
 from typing import Dict
 
+from ..context_budget import fit_items, fit_text, get_context_budget
+
 
 def build_audio_insight_prompt(transcript: str, metadata: Dict, transcription_data: Dict, analysis_type: str = 'overview'):
     """
@@ -152,7 +154,7 @@ Requirements:
 - All fields can be null if not available
 
 Transcript:
-{transcript[:5000]}
+{fit_text(transcript, get_context_budget(0.5))}
 
 Return ONLY the JSON object, wrapped in ```json code block.
 """
@@ -175,10 +177,10 @@ SECTION: Timestamped Segments
 Example:
 [00:00 - 00:15] Speaker 1: Welcome everyone to today's meeting.
 
-{transcript[:10000]}
+{fit_text(transcript, get_context_budget())}
 
 Segments Data:
-{str(segments[:20]) if segments else 'No segments available'}
+{str(fit_items(segments, get_context_budget(0.1))) if segments else 'No segments available'}
 
 Format the transcription clearly with proper timestamps.
 """
@@ -233,7 +235,7 @@ Duration: {duration_min} minutes
 Word Count: {word_count}
 
 Transcript:
-{transcript[:8000]}
+{fit_text(transcript, get_context_budget(0.8))}
 
 Return ONLY the JSON object, wrapped in ```json code block.
 """
@@ -279,9 +281,9 @@ Requirements:
 Duration: {duration_min} minutes {duration_sec} seconds
 
 Transcript:
-{transcript[:8000]}
+{fit_text(transcript, get_context_budget(0.8))}
 
-Chapters: {str(chapters[:10]) if chapters else 'None'}
+Chapters: {str(fit_items(chapters, get_context_budget(0.05))) if chapters else 'None'}
 
 Return ONLY the JSON object, wrapped in ```json code block.
 """
@@ -343,10 +345,10 @@ Requirements:
 Duration: {duration_min} minutes {duration_sec_remainder} seconds ({total_seconds} seconds total)
 
 Transcript:
-{transcript[:8000]}
+{fit_text(transcript, get_context_budget(0.8))}
 
-Sentiment Data: {str(sentiment_data[:10]) if sentiment_data else 'None'}
-Segments: {str(segments[:5]) if segments else 'None'}
+Sentiment Data: {str(fit_items(sentiment_data, get_context_budget(0.05))) if sentiment_data else 'None'}
+Segments: {str(fit_items(segments, get_context_budget(0.03))) if segments else 'None'}
 
 Return ONLY the JSON object, wrapped in ```json code block.
 """
@@ -401,9 +403,9 @@ Requirements:
 - All arrays can be empty if no data is found
 
 Transcript:
-{transcript[:8000]}
+{fit_text(transcript, get_context_budget(0.8))}
 
-Entities: {str(entities[:20]) if entities else 'None'}
+Entities: {str(fit_items(entities, get_context_budget(0.05))) if entities else 'None'}
 
 Return ONLY the JSON object, wrapped in ```json code block.
 """
@@ -458,10 +460,10 @@ Requirements:
 Duration: {duration_min} minutes {duration_sec} seconds
 
 Transcript:
-{transcript[:8000]}
+{fit_text(transcript, get_context_budget(0.8))}
 
-Segments: {str(segments[:20]) if segments else 'None'}
-Speakers: {str(speakers[:10]) if speakers else 'None'}
+Segments: {str(fit_items(segments, get_context_budget(0.1))) if segments else 'None'}
+Speakers: {str(fit_items(speakers, get_context_budget(0.03))) if speakers else 'None'}
 
 Return ONLY the JSON object, wrapped in ```json code block.
 """
@@ -510,7 +512,7 @@ Requirements:
 - All arrays can be empty if no data is found
 
 Transcript:
-{transcript[:8000]}
+{fit_text(transcript, get_context_budget(0.8))}
 
 Return ONLY the JSON object, wrapped in ```json code block.
 """
@@ -574,10 +576,10 @@ Requirements:
 Duration: {duration_min} minutes {duration_sec} seconds ({duration} seconds total)
 
 Transcript:
-{transcript[:8000]}
+{fit_text(transcript, get_context_budget(0.8))}
 
-Segments: {str(segments[:30]) if segments else 'None'}
-Chapters: {str(chapters[:10]) if chapters else 'None'}
+Segments: {str(fit_items(segments, get_context_budget(0.1))) if segments else 'None'}
+Chapters: {str(fit_items(chapters, get_context_budget(0.05))) if chapters else 'None'}
 
 Return ONLY the JSON object, wrapped in ```json code block.
 """
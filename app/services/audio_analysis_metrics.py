@@ -1,124 +1,425 @@
 """
 Audio Analysis Metrics Service
 Calculates audio signal analysis metrics: loudness, peak level, noise level, dynamic range
+
+Loudness follows ITU-R BS.1770: the signal is K-weighted per channel, mean
+squares are taken over 400 ms blocks (75% overlap) and gated at -70 LUFS
+(absolute) and -10 LU below the ungated level (relative). Short-term loudness
+(3 s windows), loudness range and a loudness-over-time series are derived
+from the same blocks.
+
+The file is decoded and processed block by block (soundfile.blocks, or
+audioread for formats libsndfile can't read): every block is reshaped into
+100 ms sub-blocks (views, no copies) and each sub-block's squared sum is
+taken in a single pass. Gating blocks, short-term windows and the noise floor
+are built from those sums and kept as fixed-size level histograms, so memory
+stays the same however long the recording is.
 """
 import numpy as np
 from typing import Dict, Optional
 import os
 
-def calculate_audio_metrics(audio_file_path: str) -> Dict:
+# Sub-block size: 100 ms (the 400 ms gating blocks overlap by 75%)
+_SUB_BLOCK_SECONDS = 0.1
+_GATING_BLOCK_SUB_BLOCKS = 4
+_SHORT_TERM_SUB_BLOCKS = 30
+# Loudness-over-time series: one short-term value per second, at most this many points
+_TIMELINE_STEP_SUB_BLOCKS = 10
+_MAX_TIMELINE_POINTS = 600
+# Sub-blocks decoded and filtered per step (bounds the float64 K-weighting buffer)
+_PROCESS_SUB_BLOCKS = 30
+
+_ABSOLUTE_GATE_LUFS = -70.0
+_RELATIVE_GATE_LU = -10.0
+# EBU Tech 3342 loudness range: relative gate and percentiles
+_LRA_RELATIVE_GATE_LU = -20.0
+_LRA_PERCENTILES = (10, 95)
+
+# Level histograms (low, high, resolution): loudness in LUFS, noise floor in dB
+_LOUDNESS_HISTOGRAM = (_ABSOLUTE_GATE_LUFS, 10.0, 0.01)
+_NOISE_HISTOGRAM = (-160.0, 10.0, 0.05)
+
+
+def _empty_metrics(error: str) -> Dict:
+    """Failure result with every metric set to None"""
+    return {
+        'success': False,
+        'error': error,
+        'loudness': None,
+        'peak_level': None,
+        'noise_level': None,
+        'dynamic_range': None,
+        'short_term_loudness': None,
+        'loudness_range': None,
+        'loudness_timeline': None
+    }
+
+
+def _k_weighting_sos(sample_rate: int) -> np.ndarray:
+    """
+    BS.1770 K-weighting filter (high shelf + RLB high-pass) as second-order sections
+
+    Coefficients are derived for the given sample rate; at 48 kHz they match
+    the values tabulated in the recommendation.
+    """
+    # Stage 1: high shelf (+4 dB above ~1.5 kHz, head acoustics)
+    fc, gain_db, q = 1681.974450955533, 3.999843853973347, 0.7071752369554196
+    k = np.tan(np.pi * fc / sample_rate)
+    vh = 10 ** (gain_db / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = [(vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0,
+             1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+
+    # Stage 2: RLB high-pass (~38 Hz)
+    fc, q = 38.13547087602444, 0.5003270373238773
+    k = np.tan(np.pi * fc / sample_rate)
+    a0 = 1 + k / q + k * k
+    high_pass = [1.0, -2.0, 1.0, 1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+
+    return np.array([shelf, high_pass])
+
+
+def _channel_weights(channels: int) -> np.ndarray:
+    """BS.1770 channel gains: 1.0 for front channels, 1.41 for surrounds, LFE excluded"""
+    if channels == 6:
+        # L, R, C, LFE, Ls, Rs
+        return np.array([1.0, 1.0, 1.0, 0.0, 1.41, 1.41])
+    if channels == 5:
+        return np.array([1.0, 1.0, 1.0, 1.41, 1.41])
+    return np.ones(channels)
+
+
+def _lufs(mean_square):
+    """Loudness (LUFS / LKFS) of a channel-weighted mean square"""
+    return -0.691 + 10 * np.log10(np.asarray(mean_square) + 1e-10)
+
+
+class _LevelHistogram:
+    """Fixed-resolution histogram of levels (dB / LUFS) with the summed power in each bin"""
+
+    def __init__(self, low: float, high: float, resolution: float):
+        self.low = low
+        self.resolution = resolution
+        self.counts = np.zeros(int(round((high - low) / resolution)), dtype=np.int64)
+        self.power = np.zeros(len(self.counts))
+
+    def add(self, levels: np.ndarray, power: Optional[np.ndarray] = None):
+        bins = len(self.counts)
+        index = np.clip(((levels - self.low) / self.resolution).astype(np.int64), 0, bins - 1)
+        self.counts += np.bincount(index, minlength=bins)
+        if power is not None:
+            self.power += np.bincount(index, weights=power, minlength=bins)
+
+    def total(self, start: int = 0) -> int:
+        return int(self.counts[start:].sum())
+
+    def first_bin(self, level: float) -> int:
+        """Index of the first bin at or above level"""
+        return min(len(self.counts), max(0, int(np.ceil((level - self.low) / self.resolution))))
+
+    def mean_power(self, start: int = 0) -> float:
+        count = self.total(start)
+        return float(self.power[start:].sum() / count) if count else 0.0
+
+    def percentile(self, q: float, start: int = 0) -> float:
+        """Level (bin centre) below which q percent of the values from bin start on fall"""
+        cumulative = np.cumsum(self.counts[start:])
+        index = int(np.searchsorted(cumulative, q / 100 * cumulative[-1]))
+        return self.low + (start + index + 0.5) * self.resolution
+
+
+def _slide(history: np.ndarray, values: np.ndarray, size: int):
+    """
+    Means of every window of size consecutive sub-blocks across the tail of
+    the previous block (history) and values
+
+    Returns:
+        tuple: (window means, history for the next call)
+    """
+    joined = np.concatenate((history, values))
+    if len(joined) < size:
+        return joined[:0], joined
+    means = np.lib.stride_tricks.sliding_window_view(joined, size).mean(axis=1)
+    return means, joined[len(joined) - size + 1:]
+
+
+class _MetricsAccumulator:
+    """
+    Accumulates per-sub-block squared sums from consecutive blocks of audio
+
+    Feed (frames, channels) float32 blocks in order with add(), then call
+    result() once. Blocks are not kept: only the last few sub-block values
+    (for windows spanning two blocks) and fixed-size histograms are.
+    """
+
+    def __init__(self, sample_rate: int, channels: int):
+        from scipy.signal import sosfilt
+
+        self._sosfilt = sosfilt
+        self.sample_rate = sample_rate
+        self.sub_block = max(1, int(round(sample_rate * _SUB_BLOCK_SECONDS)))
+        self._sos = _k_weighting_sos(sample_rate)
+        self._weights = _channel_weights(channels)
+        self._mix = np.full(channels, 1 / channels, dtype=np.float32)
+        # Filter state (sections, 2, channels): the K-weighting runs across blocks
+        self._zi = np.zeros((self._sos.shape[0], 2, channels))
+        # Frames left over from the previous block (less than one sub-block)
+        self._pending = None
+
+        self.frames = 0
+        self.sub_blocks = 0
+        self.peak = 0.0
+        self.sum_squares = 0.0
+        # 100 ms mono RMS levels, 400 ms gating block and 3 s short-term loudness
+        self._noise = _LevelHistogram(*_NOISE_HISTOGRAM)
+        self._gating = _LevelHistogram(*_LOUDNESS_HISTOGRAM)
+        self._short_term = _LevelHistogram(*_LOUDNESS_HISTOGRAM)
+        self._gating_history = np.zeros(0)
+        self._short_term_history = np.zeros(0)
+        self._short_term_windows = 0
+        self.short_term_max = None
+        self._timeline = []
+        self._timeline_step = _TIMELINE_STEP_SUB_BLOCKS
+
+    def _mono_mix(self, block: np.ndarray) -> np.ndarray:
+        # Matrix-vector product: much faster than mean(axis=1) over a short axis
+        return block[:, 0] if block.shape[1] == 1 else block @ self._mix
+
+    def add(self, block: np.ndarray):
+        """Add the next (frames, channels) block"""
+        if not len(block):
+            return
+        self.frames += len(block)
+        self.peak = max(self.peak, float(block.max()), -float(block.min()))
+
+        if self._pending is not None:
+            block = np.concatenate((self._pending, block))
+            self._pending = None
+        count = len(block) // self.sub_block
+        aligned = count * self.sub_block
+        if aligned < len(block):
+            self._pending = block[aligned:].copy()
+        if not count:
+            return
+        block = block[:aligned]
+        self.sub_blocks += count
+
+        # One squared-sum pass per sub-block (einsum avoids a squared copy)
+        mono = self._mono_mix(block).reshape(count, self.sub_block)
+        mono_squares = np.einsum('ij,ij->i', mono, mono, dtype=np.float64)
+        self.sum_squares += float(mono_squares.sum())
+        self._noise.add(10 * np.log10(mono_squares / self.sub_block + 1e-20))
+
+        weighted, self._zi = self._sosfilt(self._sos, block, axis=0, zi=self._zi)
+        weighted = weighted.reshape(count, self.sub_block, -1)
+        channel_squares = np.einsum('ijk,ijk->ik', weighted, weighted) / self.sub_block
+        power = channel_squares @ self._weights
+
+        gating, self._gating_history = _slide(self._gating_history, power, _GATING_BLOCK_SUB_BLOCKS)
+        self._add_gated(self._gating, gating)
+        short_term, self._short_term_history = _slide(self._short_term_history, power, _SHORT_TERM_SUB_BLOCKS)
+        self._add_short_term(short_term, _SHORT_TERM_SUB_BLOCKS)
+
+    @staticmethod
+    def _add_gated(histogram: _LevelHistogram, power: np.ndarray):
+        """Add window powers that pass the absolute gate"""
+        levels = _lufs(power)
+        keep = levels > _ABSOLUTE_GATE_LUFS
+        histogram.add(levels[keep], power[keep])
+
+    def _add_short_term(self, power: np.ndarray, size: int):
+        if not len(power):
+            return
+        self._add_gated(self._short_term, power)
+        levels = _lufs(power)
+        peak = float(levels.max())
+        self.short_term_max = peak if self.short_term_max is None else max(self.short_term_max, peak)
+
+        # One timeline point every step windows; when the series gets too long,
+        # drop every other point and double the step
+        first = -self._short_term_windows % _TIMELINE_STEP_SUB_BLOCKS
+        for offset in range(first, len(levels), _TIMELINE_STEP_SUB_BLOCKS):
+            index = self._short_term_windows + offset
+            if index % self._timeline_step:
+                continue
+            self._timeline.append({
+                'time': round((index + size) * self.sub_block / self.sample_rate, 1),
+                'loudness': round(float(levels[offset]), 1)
+            })
+            if len(self._timeline) > _MAX_TIMELINE_POINTS:
+                self._timeline = self._timeline[::2]
+                self._timeline_step *= 2
+        self._short_term_windows += len(levels)
+
+    def result(self) -> Dict:
+        """Metrics for everything added"""
+        if self._pending is not None:
+            # The trailing partial sub-block counts towards peak/RMS only
+            tail = self._mono_mix(self._pending)
+            self.sum_squares += float(np.dot(tail, tail))
+            self._pending = None
+
+        # Clips shorter than one window are measured as a single window
+        if 0 < self.sub_blocks < _GATING_BLOCK_SUB_BLOCKS:
+            self._add_gated(self._gating, self._gating_history.mean(keepdims=True))
+        if 0 < self.sub_blocks < _SHORT_TERM_SUB_BLOCKS:
+            self._add_short_term(self._short_term_history.mean(keepdims=True), self.sub_blocks)
+
+        peak_level = float(20 * np.log10(self.peak + 1e-10))
+        rms = np.sqrt(self.sum_squares / self.frames)
+        rms_db = float(20 * np.log10(rms + 1e-10))
+
+        # Noise floor: 10th percentile of 100 ms RMS (the quietest segments)
+        if self._noise.total():
+            noise_level = self._noise.percentile(10)
+        else:
+            noise_level = float(-60.0)
+
+        loudness = loudness_range = None
+        if self.sub_blocks:
+            loudness = self._gated_loudness()
+            loudness_range = self._loudness_range()
+
+        return {
+            'success': True,
+            'loudness': None if loudness is None else float(round(loudness, 1)),
+            'peak_level': float(round(peak_level, 1)),
+            'noise_level': float(round(noise_level, 1)),
+            'dynamic_range': float(round(peak_level - rms_db, 1)),
+            'short_term_loudness': None if self.short_term_max is None else float(round(self.short_term_max, 1)),
+            'loudness_range': None if loudness_range is None else float(round(loudness_range, 1)),
+            'loudness_timeline': self._timeline
+        }
+
+    def _gated_loudness(self) -> float:
+        """Integrated loudness of the 400 ms blocks (absolute + relative gate)"""
+        if not self._gating.total():
+            # Silence: nothing passes the absolute gate
+            return _ABSOLUTE_GATE_LUFS
+        relative_gate = _lufs(self._gating.mean_power()) + _RELATIVE_GATE_LU
+        return float(_lufs(self._gating.mean_power(self._gating.first_bin(relative_gate))))
+
+    def _loudness_range(self) -> float:
+        """Spread (LU) between the 10th and 95th percentile of gated short-term loudness"""
+        if not self._short_term.total():
+            return 0.0
+        relative_gate = _lufs(self._short_term.mean_power()) + _LRA_RELATIVE_GATE_LU
+        start = self._short_term.first_bin(relative_gate)
+        low, high = (self._short_term.percentile(q, start) for q in _LRA_PERCENTILES)
+        return float(high - low)
+
+
+def _pcm16_frames(data, channels: int) -> np.ndarray:
+    """(frames, channels) float32 view of interleaved 16-bit PCM"""
+    return np.frombuffer(data, dtype='<i2').reshape(-1, channels) / np.float32(32768)
+
+
+def _measure_soundfile(audio_source):
+    """Stream a path or file-like object through libsndfile (WAV, FLAC, OGG, MP3, ...) one block at a time"""
+    import soundfile as sf
+
+    with sf.SoundFile(audio_source) as audio:
+        accumulator = _MetricsAccumulator(audio.samplerate, audio.channels)
+        # One reused output buffer: decoding allocates nothing per block
+        buffer = np.empty((accumulator.sub_block * _PROCESS_SUB_BLOCKS, audio.channels), dtype=np.float32)
+        for block in audio.blocks(out=buffer):
+            accumulator.add(block)
+    return accumulator
+
+
+def _measure_audioread(audio_file_path: str):
+    """Stream formats libsndfile can't read (M4A, AAC, WebM) through audioread / ffmpeg"""
+    import audioread
+
+    with audioread.audio_open(audio_file_path) as audio:
+        accumulator = _MetricsAccumulator(audio.samplerate, audio.channels)
+        frame_bytes = 2 * audio.channels
+        block_bytes = accumulator.sub_block * _PROCESS_SUB_BLOCKS * frame_bytes
+        # Decoder chunks are small; group them into full blocks
+        data = bytearray()
+        for chunk in audio:
+            data += chunk
+            if len(data) >= block_bytes:
+                usable = len(data) - len(data) % frame_bytes
+                accumulator.add(_pcm16_frames(bytes(data[:usable]), audio.channels))
+                del data[:usable]
+        if len(data) >= frame_bytes:
+            accumulator.add(_pcm16_frames(bytes(data[:len(data) - len(data) % frame_bytes]), audio.channels))
+    return accumulator
+
+
+def _measure_audioread_buffer(file_object, file_extension: Optional[str]):
+    """audioread / ffmpeg decode from a path: spill an in-memory upload to a temporary file"""
+    import shutil
+    import tempfile
+
+    file_object.seek(0)
+    suffix = f'.{file_extension}' if file_extension else ''
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
+        shutil.copyfileobj(file_object, temp_file)
+        temp_path = temp_file.name
+    try:
+        return _measure_audioread(temp_path)
+    finally:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+
+
+def calculate_audio_metrics(audio_source, file_extension: Optional[str] = None) -> Dict:
     """
     Calculate audio analysis metrics: loudness, peak level, noise level, dynamic range
-    
+
+    The file is streamed in blocks of a few seconds; memory use does not grow
+    with its duration. File-like objects are decoded in place; they are only
+    written to a temporary file for formats libsndfile can't read.
+
     Args:
-        audio_file_path: Path to audio file
-        
+        audio_source: Path to audio file, or a seekable binary file-like object
+        file_extension: Format hint for the temporary file fallback (e.g. 'm4a')
+
     Returns:
         dict: {
-            'loudness': float (LUFS),
+            'loudness': float (integrated LUFS, BS.1770 gated),
             'peak_level': float (dB),
             'noise_level': float (dB),
             'dynamic_range': float (dB),
+            'short_term_loudness': float (max 3 s loudness, LUFS),
+            'loudness_range': float (LU),
+            'loudness_timeline': list of {'time' (s), 'loudness' (LUFS)},
             'success': bool,
             'error': str (if failed)
         }
     """
     try:
-        # Try to import librosa and soundfile
+        # Try to import soundfile and scipy
         try:
-            import librosa
             import soundfile as sf
+            import scipy.signal
         except ImportError:
-            return {
-                'success': False,
-                'error': 'librosa or soundfile not installed. Run: pip install librosa soundfile',
-                'loudness': None,
-                'peak_level': None,
-                'noise_level': None,
-                'dynamic_range': None
-            }
-        
-        # Load audio file
+            return _empty_metrics('soundfile or scipy not installed. Run: pip install librosa soundfile')
+
         try:
-            y, sr = librosa.load(audio_file_path, sr=None, mono=True)
+            try:
+                accumulator = _measure_soundfile(audio_source)
+            except sf.LibsndfileError as e:
+                # Container/codec libsndfile doesn't support - decode with ffmpeg instead
+                try:
+                    if isinstance(audio_source, (str, os.PathLike)):
+                        accumulator = _measure_audioread(audio_source)
+                    else:
+                        accumulator = _measure_audioread_buffer(audio_source, file_extension)
+                except ImportError:
+                    raise e
         except Exception as e:
-            return {
-                'success': False,
-                'error': f'Failed to load audio file: {str(e)}',
-                'loudness': None,
-                'peak_level': None,
-                'noise_level': None,
-                'dynamic_range': None
-            }
-        
-        if len(y) == 0:
-            return {
-                'success': False,
-                'error': 'Audio file is empty',
-                'loudness': None,
-                'peak_level': None,
-                'noise_level': None,
-                'dynamic_range': None
-            }
-        
-        # Calculate Peak Level (dB)
-        # Peak level is the maximum absolute amplitude
-        peak_amplitude = np.max(np.abs(y))
-        # Convert to dB, add small value to avoid log(0)
-        # Convert to Python float for JSON serialization
-        peak_level = float(20 * np.log10(peak_amplitude + 1e-10))
-        
-        # Calculate RMS (Root Mean Square) for loudness estimation
-        rms = np.sqrt(np.mean(y**2))
-        # Convert to Python float for JSON serialization
-        rms_db = float(20 * np.log10(rms + 1e-10))
-        
-        # Estimate Loudness (LUFS) - simplified version
-        # For accurate LUFS, use pyloudnorm library (see Option B in recommendation)
-        # This is an approximation: LUFS ≈ RMS_dB - 23 (varies by content type)
-        loudness_lufs = float(rms_db - 23)
-        
-        # Calculate Dynamic Range (difference between peak and RMS)
-        dynamic_range = float(peak_level - rms_db)
-        
-        # Estimate Noise Level (dB) - analyze quiet segments
-        # Split into segments and find minimum RMS (likely noise floor)
-        segment_length = int(sr * 0.1)  # 100ms segments
-        if segment_length > 0:
-            segments = []
-            for i in range(0, len(y), segment_length):
-                if i + segment_length <= len(y):
-                    segments.append(y[i:i+segment_length])
-            
-            if segments:
-                segment_rms = [np.sqrt(np.mean(seg**2)) for seg in segments if len(seg) > 0]
-                if segment_rms:
-                    # Use 10th percentile as noise floor (quietest segments)
-                    noise_rms = np.percentile(segment_rms, 10)
-                    # Convert to Python float for JSON serialization
-                    noise_level = float(20 * np.log10(noise_rms + 1e-10))
-                else:
-                    noise_level = float(-60.0)  # Default if calculation fails
-            else:
-                noise_level = float(-60.0)  # Default if no segments
-        else:
-            noise_level = float(-60.0)  # Default if segment_length is 0
-        
-        return {
-            'success': True,
-            'loudness': float(round(loudness_lufs, 1)),
-            'peak_level': float(round(peak_level, 1)),
-            'noise_level': float(round(noise_level, 1)),
-            'dynamic_range': float(round(dynamic_range, 1))
-        }
-        
-    except Exception as e:
-        return {
-            'success': False,
-            'error': str(e),
-            'loudness': None,
-            'peak_level': None,
-            'noise_level': None,
-            'dynamic_range': None
-        }
+            return _empty_metrics(f'Failed to load audio file: {str(e) or type(e).__name__}')
+
+        if accumulator.frames == 0:
+            return _empty_metrics('Audio file is empty')
 
+        return accumulator.result()
+
+    except Exception as e:
+        return _empty_metrics(str(e))
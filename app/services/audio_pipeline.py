@@ -0,0 +1,140 @@
+"""
+Audio Pipeline - Run transcription and local analysis of an upload concurrently
+The AssemblyAI upload starts right away while the mutagen metadata and signal
+metrics are computed on a small worker pool. The billed transcript request is
+approved by a cheap header check (mutagen finds a positive duration); files
+mutagen can't parse wait for the decoder instead, so an unreadable upload
+never leaves a paid job running. Both results are joined before the prompt is
+built, so an upload takes about max(transcription, metrics) instead of their sum.
+"""
+
+import io
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dotenv import load_dotenv
+
+from services.audio_service import get_audio_metadata, probe_audio_duration, start_transcription
+
+load_dotenv(verbose=False)
+
+# Metadata / metrics computations at once (CPU and memory bound)
+AUDIO_METRICS_WORKERS = int(os.getenv('AUDIO_METRICS_WORKERS', '2'))
+
+
+def _named_buffer(audio_bytes, filename):
+    """BytesIO over the upload bytes that carries the upload's file name"""
+    buffer = io.BytesIO(audio_bytes)
+    buffer.filename = filename
+    return buffer
+
+
+def _approve_when_readable(audio_bytes, filename, metadata_future):
+    """
+    Future that resolves to True once the upload is known to hold audio
+
+    Readable headers approve at once; otherwise the verdict of the full
+    get_audio_metadata (which also tries the decoder) decides.
+    """
+    approval = Future()
+    if probe_audio_duration(audio_bytes, filename):
+        approval.set_result(True)
+        return approval
+
+    def _on_metadata(future):
+        try:
+            approval.set_result(bool(future.result().get('success')))
+        except Exception:
+            approval.set_result(False)
+
+    metadata_future.add_done_callback(_on_metadata)
+    return approval
+
+
+def _log_ready(label, start):
+    print(f"[AUDIO] {label} ready in {time.perf_counter() - start:.2f}s")
+
+
+def _timed(label, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    _log_ready(label, start)
+    return result
+
+
+class AudioPipelineJob:
+    """Transcription and metadata of one upload, running concurrently"""
+
+    def __init__(self, transcription_future, metadata_future):
+        self._transcription = transcription_future
+        self._metadata = metadata_future
+
+    def metadata(self):
+        """Wait for get_audio_metadata's result (metadata + signal metrics)"""
+        return self._metadata.result()
+
+    def transcription(self):
+        """Wait for the transcription result (see transcribe_audio)"""
+        return self._transcription.result()
+
+
+class AudioPipeline:
+    """Starts the remote transcription and the local analysis side by side"""
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        """Singleton pattern"""
+        if cls._instance is None:
+            cls._instance = super(AudioPipeline, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self._metrics_executor = ThreadPoolExecutor(
+            max_workers=max(1, AUDIO_METRICS_WORKERS), thread_name_prefix='audio-metrics'
+        )
+        AudioPipeline._initialized = True
+
+    def start(self, file_stream, filename=None):
+        """
+        Start transcription and metadata extraction for an upload
+
+        The upload is read once; each task gets its own BytesIO over the same
+        bytes, so neither moves the other's file position.
+
+        Args:
+            file_stream: Audio file stream (upload or BytesIO)
+            filename (str): Original file name (format detection)
+
+        Returns:
+            AudioPipelineJob: Join with .metadata() and .transcription()
+        """
+        filename = filename or getattr(file_stream, 'filename', None) or 'audio'
+        file_stream.seek(0)
+        audio_bytes = file_stream.read()
+        file_stream.seek(0)
+
+        started = time.perf_counter()
+        metadata = self._metrics_executor.submit(
+            _timed, 'Metadata and metrics', get_audio_metadata, _named_buffer(audio_bytes, filename)
+        )
+        # The upload overlaps the metrics; the transcript is only requested for readable audio
+        transcription = start_transcription(
+            _named_buffer(audio_bytes, filename),
+            approval=_approve_when_readable(audio_bytes, filename, metadata)
+        )
+        transcription.add_done_callback(lambda _: _log_ready('Transcription', started))
+        return AudioPipelineJob(transcription, metadata)
+
+
+# Singleton instance
+audio_pipeline = AudioPipeline()
+
+
+def start_audio_pipeline(file_stream, filename=None):
+    """Start transcription and metadata extraction for an upload concurrently"""
+    return audio_pipeline.start(file_stream, filename)
@@ -6,18 +6,18 @@ Uses Gemini for analysis
 """
 import os
 import io
+from concurrent.futures import Future
 from typing import Dict, Optional
-import requests
 from dotenv import load_dotenv
 
 from config.gemini import generate_text, generate_text_stream
 from services.audio_analysis import prompts as audio_prompts
+from services.transcription_client import start_transcription_job
 
 load_dotenv(verbose=False)
 
-# AssemblyAI API configuration (for Speech-to-Text transcription)
+# AssemblyAI API configuration (for Speech-to-Text transcription, see transcription_client)
 ASSEMBLYAI_API_KEY = os.getenv('ASSEMBLYAI_API_KEY', '').strip()
-ASSEMBLYAI_BASE_URL = 'https://api.assemblyai.com/v2'
 
 # ElevenLabs API configuration (for Text-to-Speech - optional)
 ELEVENLABS_API_KEY = os.getenv('ELEVENLABS_API_KEY', '').strip()
@@ -48,6 +48,34 @@ else:
 MAX_AUDIO_DURATION_SECONDS = 600  # 10 minutes max
 MAX_FILE_SIZE_MB = 10
 
+# Signal metrics copied from calculate_audio_metrics into the metadata
+AUDIO_METRIC_KEYS = (
+    'loudness', 'peak_level', 'noise_level', 'dynamic_range',
+    'short_term_loudness', 'loudness_range', 'loudness_timeline'
+)
+
+
+def probe_audio_duration(audio_bytes: bytes, filename: str = 'audio') -> Optional[float]:
+    """
+    Cheap readability check: duration from the container headers (no decoding)
+    
+    Args:
+        audio_bytes: Raw upload bytes
+        filename: Upload file name (mutagen scores formats by it)
+        
+    Returns:
+        float: Duration in seconds, or None if mutagen can't read a positive duration
+    """
+    try:
+        from mutagen import File as MutagenFile
+        audio_buffer = io.BytesIO(audio_bytes)
+        audio_buffer.name = filename
+        audio_file = MutagenFile(audio_buffer)
+        length = getattr(getattr(audio_file, 'info', None), 'length', 0) if audio_file is not None else 0
+        return float(length) if length and length > 0 else None
+    except Exception:
+        return None
+
 
 def get_audio_metadata(file_stream) -> Dict:
     """
@@ -67,6 +95,7 @@ def get_audio_metadata(file_stream) -> Dict:
             'bitrate': int,
             'error': str (if failed)
         }
+        success is False when neither mutagen nor the metrics decoder can read the file
     """
     try:
         # Save file position
@@ -89,6 +118,9 @@ def get_audio_metadata(file_stream) -> Dict:
             'bitrate': None
         }
         
+        # Set once mutagen or the decoder actually reads audio out of the bytes
+        readable = False
+        
         # Try to extract detailed metadata using mutagen
         try:
             from mutagen import File as MutagenFile
@@ -98,112 +130,105 @@ def get_audio_metadata(file_stream) -> Dict:
             from mutagen.oggvorbis import OggVorbis
             from mutagen.wave import WAVE
             
-            # Save file to temporary location for mutagen (it needs a file path or file-like object)
-            import tempfile
-            import shutil
-            
-            # Create a temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{file_extension}') as temp_file:
-                shutil.copyfileobj(file_stream, temp_file)
-                temp_path = temp_file.name
-            
+            # Read the upload once: mutagen and the metrics decoder each get a
+            # BytesIO over the same bytes (no copy, no temporary file)
+            audio_bytes = file_stream.read()
+            file_stream.seek(0)
+            audio_buffer = io.BytesIO(audio_bytes)
+            # Mutagen scores formats by file name as well as by header
+            audio_buffer.name = filename
+
+            # Load file with mutagen (a parse error still lets the decoder try)
             try:
-                # Load file with mutagen
-                audio_file = MutagenFile(temp_path)
-                
-                if audio_file is not None:
-                    # Get duration
-                    if hasattr(audio_file, 'info'):
-                        if hasattr(audio_file.info, 'length'):
-                            metadata['duration'] = audio_file.info.length
-                        
-                        # Get sample rate
-                        if hasattr(audio_file.info, 'sample_rate'):
-                            metadata['sample_rate'] = int(audio_file.info.sample_rate)
-                        
-                        # Get channels
-                        if hasattr(audio_file.info, 'channels'):
-                            metadata['channels'] = int(audio_file.info.channels)
-                        
-                        # Get bitrate
-                        if hasattr(audio_file.info, 'bitrate'):
-                            bitrate = audio_file.info.bitrate
-                            # Convert to kbps if needed (mutagen returns bps for some formats)
-                            if bitrate > 1000:
-                                metadata['bitrate'] = int(bitrate / 1000)  # Convert to kbps
-                            else:
-                                metadata['bitrate'] = int(bitrate)
-                    
-                    # For MP3 files, try to get additional info
-                    if file_extension == 'mp3' and isinstance(audio_file, MP3):
-                        if hasattr(audio_file.info, 'bitrate'):
-                            # Mutagen returns MP3 bitrate in bps, convert to kbps
-                            bitrate = audio_file.info.bitrate
-                            metadata['bitrate'] = int(bitrate / 1000) if bitrate > 1000 else int(bitrate)
-                        if hasattr(audio_file.info, 'sample_rate'):
-                            metadata['sample_rate'] = int(audio_file.info.sample_rate)
-                        if hasattr(audio_file.info, 'channels'):
-                            metadata['channels'] = int(audio_file.info.channels)
+                audio_file = MutagenFile(audio_buffer)
+            except Exception as e:
+                print(f"[AUDIO] mutagen could not parse the file: {str(e)}")
+                audio_file = None
+            
+            if audio_file is not None:
+                # Get duration
+                if hasattr(audio_file, 'info'):
+                    if hasattr(audio_file.info, 'length'):
+                        metadata['duration'] = audio_file.info.length
                     
-                    # For MP4/M4A files
-                    elif file_extension in ['mp4', 'm4a'] and isinstance(audio_file, MP4):
-                        if hasattr(audio_file.info, 'bitrate'):
-                            metadata['bitrate'] = int(audio_file.info.bitrate / 1000) if audio_file.info.bitrate > 1000 else int(audio_file.info.bitrate)
+                    # Get sample rate
+                    if hasattr(audio_file.info, 'sample_rate'):
+                        metadata['sample_rate'] = int(audio_file.info.sample_rate)
                     
-                    # For FLAC files
-                    elif file_extension == 'flac' and isinstance(audio_file, FLAC):
-                        if hasattr(audio_file.info, 'bitrate'):
-                            metadata['bitrate'] = int(audio_file.info.bitrate / 1000) if audio_file.info.bitrate > 1000 else int(audio_file.info.bitrate)
+                    # Get channels
+                    if hasattr(audio_file.info, 'channels'):
+                        metadata['channels'] = int(audio_file.info.channels)
                     
-                    # For WAV files
-                    elif file_extension == 'wav' and isinstance(audio_file, WAVE):
-                        if hasattr(audio_file.info, 'bitrate'):
-                            metadata['bitrate'] = int(audio_file.info.bitrate / 1000) if audio_file.info.bitrate > 1000 else int(audio_file.info.bitrate)
+                    # Get bitrate
+                    if hasattr(audio_file.info, 'bitrate'):
+                        bitrate = audio_file.info.bitrate
+                        # Convert to kbps if needed (mutagen returns bps for some formats)
+                        if bitrate > 1000:
+                            metadata['bitrate'] = int(bitrate / 1000)  # Convert to kbps
+                        else:
+                            metadata['bitrate'] = int(bitrate)
                 
-                # Calculate audio analysis metrics (loudness, peak level, noise level, dynamic range)
-                # Do this after mutagen extraction so we can reuse the temp file
-                try:
-                    from services.audio_analysis_metrics import calculate_audio_metrics
-                    audio_metrics = calculate_audio_metrics(temp_path)
-                    
-                    if audio_metrics.get('success'):
-                        metadata['loudness'] = audio_metrics.get('loudness')
-                        metadata['peak_level'] = audio_metrics.get('peak_level')
-                        metadata['noise_level'] = audio_metrics.get('noise_level')
-                        metadata['dynamic_range'] = audio_metrics.get('dynamic_range')
-                    else:
-                        # Set to None if calculation failed (will show as N/A in UI)
-                        metadata['loudness'] = None
-                        metadata['peak_level'] = None
-                        metadata['noise_level'] = None
-                        metadata['dynamic_range'] = None
-                        if audio_metrics.get('error'):
-                            print(f"[AUDIO] Audio metrics calculation failed: {audio_metrics.get('error')}")
-                except Exception as e:
-                    # If metrics calculation fails, continue without them
-                    print(f"[AUDIO] Warning: Could not calculate audio metrics: {str(e)}")
-                    metadata['loudness'] = None
-                    metadata['peak_level'] = None
-                    metadata['noise_level'] = None
-                    metadata['dynamic_range'] = None
+                # For MP3 files, try to get additional info
+                if file_extension == 'mp3' and isinstance(audio_file, MP3):
+                    if hasattr(audio_file.info, 'bitrate'):
+                        # Mutagen returns MP3 bitrate in bps, convert to kbps
+                        bitrate = audio_file.info.bitrate
+                        metadata['bitrate'] = int(bitrate / 1000) if bitrate > 1000 else int(bitrate)
+                    if hasattr(audio_file.info, 'sample_rate'):
+                        metadata['sample_rate'] = int(audio_file.info.sample_rate)
+                    if hasattr(audio_file.info, 'channels'):
+                        metadata['channels'] = int(audio_file.info.channels)
                 
-            finally:
-                # Clean up temporary file
-                try:
-                    os.unlink(temp_path)
-                except:
-                    pass
+                # For MP4/M4A files
+                elif file_extension in ['mp4', 'm4a'] and isinstance(audio_file, MP4):
+                    if hasattr(audio_file.info, 'bitrate'):
+                        metadata['bitrate'] = int(audio_file.info.bitrate / 1000) if audio_file.info.bitrate > 1000 else int(audio_file.info.bitrate)
                 
-                # Reset file stream position
-                file_stream.seek(0)
+                # For FLAC files
+                elif file_extension == 'flac' and isinstance(audio_file, FLAC):
+                    if hasattr(audio_file.info, 'bitrate'):
+                        metadata['bitrate'] = int(audio_file.info.bitrate / 1000) if audio_file.info.bitrate > 1000 else int(audio_file.info.bitrate)
+                
+                # For WAV files
+                elif file_extension == 'wav' and isinstance(audio_file, WAVE):
+                    if hasattr(audio_file.info, 'bitrate'):
+                        metadata['bitrate'] = int(audio_file.info.bitrate / 1000) if audio_file.info.bitrate > 1000 else int(audio_file.info.bitrate)
+            
+            readable = bool(metadata['duration'] and metadata['duration'] > 0)
+            
+            # Calculate audio analysis metrics (loudness, peak level, noise level, dynamic range)
+            # Decoded from memory; only formats that need a real path are spilled to disk
+            try:
+                from services.audio_analysis_metrics import calculate_audio_metrics
+                audio_metrics = calculate_audio_metrics(io.BytesIO(audio_bytes), file_extension)
+                
+                readable = readable or bool(audio_metrics.get('success'))
+                if not audio_metrics.get('success') and audio_metrics.get('error'):
+                    print(f"[AUDIO] Audio metrics calculation failed: {audio_metrics.get('error')}")
+                # Set to None if calculation failed (will show as N/A in UI)
+                for key in AUDIO_METRIC_KEYS:
+                    metadata[key] = audio_metrics.get(key)
+            except Exception as e:
+                # If metrics calculation fails, continue without them
+                print(f"[AUDIO] Warning: Could not calculate audio metrics: {str(e)}")
+                for key in AUDIO_METRIC_KEYS:
+                    metadata[key] = None
                 
         except ImportError:
             # mutagen not installed, skip detailed extraction
             print("[AUDIO] mutagen not installed, skipping detailed metadata extraction")
+            readable = True  # nothing to check the file with
         except Exception as e:
             # If mutagen extraction fails, continue with basic metadata
             print(f"[AUDIO] Error extracting detailed metadata: {str(e)}")
             file_stream.seek(0)
+            readable = readable or bool(metadata['duration'] and metadata['duration'] > 0)
+        
+        if not readable:
+            return {
+                'success': False,
+                'error': 'Unsupported or corrupted audio file (no readable audio stream)'
+            }
         
         return metadata
         
@@ -214,27 +239,122 @@ def get_audio_metadata(file_stream) -> Dict:
         }
 
 
-def transcribe_audio(file_stream) -> Dict:
+def _build_transcription_result(transcript_data: Dict) -> Dict:
+    """Turn a completed AssemblyAI transcript into the transcription result"""
+    # Extract transcript and segments
+    transcript_text = transcript_data.get('text', '') or ''
+    words = transcript_data.get('words', [])
+    
+    # Check if transcript is empty
+    if not transcript_text and not words:
+        print("[AUDIO] WARNING: Transcription completed but returned empty text. This may be due to:")
+        print("  - Music/background noise without clear speech")
+        print("  - Language not supported or misdetected")
+        print("  - Audio quality issues")
+    
+    # Build segments with timestamps
+    segments = []
+    current_segment = None
+    
+    for word in words:
+        start = word.get('start', 0) / 1000  # Convert to seconds
+        end = word.get('end', 0) / 1000
+        text = word.get('text', '')
+        speaker = word.get('speaker', None)
+        
+        if current_segment is None or (speaker and current_segment.get('speaker') != speaker):
+            if current_segment:
+                segments.append(current_segment)
+            current_segment = {
+                'start': start,
+                'end': end,
+                'text': text,
+                'speaker': f"Speaker {speaker}" if speaker is not None else None
+            }
+        else:
+            current_segment['text'] += ' ' + text
+            current_segment['end'] = end
+    
+    if current_segment:
+        segments.append(current_segment)
+    
+    # Get additional data
+    language = transcript_data.get('language_code', 'unknown')
+    
+    # Get duration - try audio_duration first, then calculate from segments/words
+    duration = transcript_data.get('audio_duration', 0)
+    # audio_duration might already be in seconds or in milliseconds
+    if duration > 10000:  # If it's in milliseconds (more than 10 seconds in ms)
+        duration = duration / 1000  # Convert to seconds
+    elif duration == 0 or duration < 0.1:  # If duration is 0 or very small, calculate from words
+        if words and len(words) > 0:
+            # Calculate from last word's end time
+            last_word = words[-1]
+            if last_word and 'end' in last_word:
+                duration = last_word.get('end', 0) / 1000
+        elif segments and len(segments) > 0:
+            # Calculate from last segment's end time
+            last_segment = segments[-1]
+            if last_segment and 'end' in last_segment:
+                duration = last_segment['end'] / 1000 if last_segment['end'] > 100 else last_segment['end']
+    
+    # Log transcription results
+    word_count = len(words) if words else 0
+    print(f"[AUDIO] Transcription complete: {word_count} words, language: {language}, duration: {duration:.2f}s")
+    print(f"[AUDIO] Duration sources - audio_duration: {transcript_data.get('audio_duration', 0)}, calculated: {duration:.2f}s")
+    
+    return {
+        'success': True,
+        'transcript': transcript_text,
+        'segments': segments,
+        'language': language,
+        'duration': duration,
+        'speakers': transcript_data.get('utterances', []),
+        'chapters': transcript_data.get('chapters', []),
+        'sentiment': transcript_data.get('sentiment_analysis_results', []),
+        'entities': transcript_data.get('entities', []),
+        'word_count': word_count,
+        'is_empty': not transcript_text and not words
+    }
+
+
+def _probe_duration(file_stream) -> Optional[float]:
+    """Audio duration from the file headers (seeds transcription polling)"""
+    try:
+        from mutagen import File as MutagenFile
+        file_stream.seek(0)
+        audio_file = MutagenFile(file_stream)
+        return audio_file.info.length if audio_file is not None else None
+    except Exception:
+        return None
+    finally:
+        file_stream.seek(0)
+
+
+def start_transcription(file_stream, duration: Optional[float] = None, approval: Optional[Future] = None) -> Future:
     """
-    Transcribe audio using AssemblyAI API
+    Start transcribing audio with AssemblyAI without waiting for it
+    
+    The upload runs on the transcription client's pool; completion comes from
+    its poller or webhook, so no thread is held while AssemblyAI works.
     
     Args:
-        file_stream: Audio file stream
+        file_stream: Audio file stream (must stay readable until uploaded)
+        duration: Audio duration in seconds, if known (default: read from headers)
+        approval: Optional Future resolving to True once the (billed) transcript
+            may be requested; the upload starts without waiting for it
         
     Returns:
-        dict: {
-            'success': bool,
-            'transcript': str,
-            'segments': list,
-            'language': str,
-            'error': str (if failed)
-        }
+        Future: Resolves to the transcribe_audio result dict
     """
+    result = Future()
+    
     if not ASSEMBLYAI_API_KEY:
-        return {
+        result.set_result({
             'success': False,
             'error': 'ASSEMBLYAI_API_KEY not configured. Please set it in .env file.'
-        }
+        })
+        return result
     
     try:
         # Check file size
@@ -243,196 +363,53 @@ def transcribe_audio(file_stream) -> Dict:
         file_stream.seek(0)
         
         if file_size > MAX_FILE_SIZE_MB * 1024 * 1024:
-            return {
+            result.set_result({
                 'success': False,
                 'error': f'File size exceeds maximum allowed size ({MAX_FILE_SIZE_MB}MB)'
-            }
-        
-        # Upload audio file to AssemblyAI
-        upload_url = f'{ASSEMBLYAI_BASE_URL}/upload'
-        headers = {'Authorization': ASSEMBLYAI_API_KEY}
-        
-        file_stream.seek(0)
-        files = {'file': file_stream}
-        
-        print("[AUDIO] Uploading audio to AssemblyAI...")
-        upload_response = requests.post(upload_url, headers=headers, files=files)
-        
-        if upload_response.status_code != 200:
-            error_text = upload_response.text
-            if 'Invalid API key' in error_text or upload_response.status_code == 401:
-                return {
-                    'success': False,
-                    'error': f'Invalid AssemblyAI API key. Please check your ASSEMBLYAI_API_KEY in .env file. Error: {error_text}'
-                }
-            return {
-                'success': False,
-                'error': f'Failed to upload audio: {error_text}'
-            }
-        
-        upload_url_result = upload_response.json()
-        audio_url = upload_url_result.get('upload_url')
-        
-        if not audio_url:
-            return {
-                'success': False,
-                'error': 'Failed to get upload URL from AssemblyAI'
-            }
-        
-        # Request transcription
-        transcript_url = f'{ASSEMBLYAI_BASE_URL}/transcript'
-        transcript_request = {
-            'audio_url': audio_url,
-            'speaker_labels': True,  # Enable speaker diarization
-            'auto_chapters': True,  # Auto-detect chapters
-            'sentiment_analysis': True,  # Enable sentiment analysis
-            'entity_detection': True,  # Detect entities
-            'language_detection': True,  # Auto-detect language
-            'punctuate': True,  # Add punctuation
-            'format_text': True  # Format text properly
-        }
-        
-        print("[AUDIO] Requesting transcription...")
-        transcript_response = requests.post(
-            transcript_url,
-            json=transcript_request,
-            headers=headers
-        )
-        
-        if transcript_response.status_code != 200:
-            return {
-                'success': False,
-                'error': f'Failed to request transcription: {transcript_response.text}'
-            }
-        
-        transcript_id = transcript_response.json().get('id')
-        
-        if not transcript_id:
-            return {
-                'success': False,
-                'error': 'Failed to get transcript ID'
-            }
-        
-        # Poll for transcription completion
-        polling_url = f'{ASSEMBLYAI_BASE_URL}/transcript/{transcript_id}'
-        print("[AUDIO] Waiting for transcription to complete...")
-        
-        import time
-        max_polls = 60  # Max 5 minutes (5 seconds * 60)
-        poll_count = 0
-        
-        while poll_count < max_polls:
-            polling_response = requests.get(polling_url, headers=headers)
-            
-            if polling_response.status_code != 200:
-                return {
-                    'success': False,
-                    'error': f'Failed to poll transcription status: {polling_response.text}'
-                }
-            
-            transcript_data = polling_response.json()
-            status = transcript_data.get('status')
-            
-            if status == 'completed':
-                # Extract transcript and segments
-                transcript_text = transcript_data.get('text', '') or ''
-                words = transcript_data.get('words', [])
-                
-                # Check if transcript is empty
-                if not transcript_text and not words:
-                    print("[AUDIO] WARNING: Transcription completed but returned empty text. This may be due to:")
-                    print("  - Music/background noise without clear speech")
-                    print("  - Language not supported or misdetected")
-                    print("  - Audio quality issues")
-                
-                # Build segments with timestamps
-                segments = []
-                current_segment = None
-                
-                for word in words:
-                    start = word.get('start', 0) / 1000  # Convert to seconds
-                    end = word.get('end', 0) / 1000
-                    text = word.get('text', '')
-                    speaker = word.get('speaker', None)
-                    
-                    if current_segment is None or (speaker and current_segment.get('speaker') != speaker):
-                        if current_segment:
-                            segments.append(current_segment)
-                        current_segment = {
-                            'start': start,
-                            'end': end,
-                            'text': text,
-                            'speaker': f"Speaker {speaker}" if speaker is not None else None
-                        }
-                    else:
-                        current_segment['text'] += ' ' + text
-                        current_segment['end'] = end
-                
-                if current_segment:
-                    segments.append(current_segment)
-                
-                # Get additional data
-                language = transcript_data.get('language_code', 'unknown')
-                
-                # Get duration - try audio_duration first, then calculate from segments/words
-                duration = transcript_data.get('audio_duration', 0)
-                # audio_duration might already be in seconds or in milliseconds
-                if duration > 10000:  # If it's in milliseconds (more than 10 seconds in ms)
-                    duration = duration / 1000  # Convert to seconds
-                elif duration == 0 or duration < 0.1:  # If duration is 0 or very small, calculate from words
-                    if words and len(words) > 0:
-                        # Calculate from last word's end time
-                        last_word = words[-1]
-                        if last_word and 'end' in last_word:
-                            duration = last_word.get('end', 0) / 1000
-                    elif segments and len(segments) > 0:
-                        # Calculate from last segment's end time
-                        last_segment = segments[-1]
-                        if last_segment and 'end' in last_segment:
-                            duration = last_segment['end'] / 1000 if last_segment['end'] > 100 else last_segment['end']
-                
-                # Log transcription results
-                word_count = len(words) if words else 0
-                print(f"[AUDIO] Transcription complete: {word_count} words, language: {language}, duration: {duration:.2f}s")
-                print(f"[AUDIO] Duration sources - audio_duration: {transcript_data.get('audio_duration', 0)}, calculated: {duration:.2f}s")
-                
-                return {
-                    'success': True,
-                    'transcript': transcript_text,
-                    'segments': segments,
-                    'language': language,
-                    'duration': duration,
-                    'speakers': transcript_data.get('utterances', []),
-                    'chapters': transcript_data.get('chapters', []),
-                    'sentiment': transcript_data.get('sentiment_analysis_results', []),
-                    'entities': transcript_data.get('entities', []),
-                    'word_count': word_count,
-                    'is_empty': not transcript_text and not words
-                }
-            
-            elif status == 'error':
-                return {
-                    'success': False,
-                    'error': f'Transcription failed: {transcript_data.get("error", "Unknown error")}'
-                }
-            
-            # Still processing, wait and retry
-            time.sleep(5)
-            poll_count += 1
-        
-        return {
-            'success': False,
-            'error': 'Transcription timeout - took too long to complete'
-        }
+            })
+            return result
         
+        if duration is None:
+            duration = _probe_duration(file_stream)
+        job = start_transcription_job(file_stream, duration, approval)
     except Exception as e:
-        import traceback
-        print(f"[ERROR] Audio transcription failed: {e}")
-        print(traceback.format_exc())
-        return {
-            'success': False,
-            'error': str(e)
+        result.set_result({'success': False, 'error': str(e)})
+        return result
+    
+    def _on_done(job_future):
+        try:
+            job_result = job_future.result()
+            if job_result['success']:
+                result.set_result(_build_transcription_result(job_result['transcript_data']))
+            else:
+                result.set_result(job_result)
+        except Exception as e:
+            import traceback
+            print(f"[ERROR] Audio transcription failed: {e}")
+            print(traceback.format_exc())
+            result.set_result({'success': False, 'error': str(e)})
+    
+    job.add_done_callback(_on_done)
+    return result
+
+
+def transcribe_audio(file_stream) -> Dict:
+    """
+    Transcribe audio using AssemblyAI API
+    
+    Args:
+        file_stream: Audio file stream
+        
+    Returns:
+        dict: {
+            'success': bool,
+            'transcript': str,
+            'segments': list,
+            'language': str,
+            'error': str (if failed)
         }
+    """
+    return start_transcription(file_stream).result()
 
 
 def analyze_audio_with_ai(transcript: str, metadata: Dict, transcription_data: Dict, analysis_type: str = 'overview') -> Dict:
@@ -476,29 +453,35 @@ def analyze_audio_with_ai(transcript: str, metadata: Dict, transcription_data: D
         }
 
 
-def analyze_audio_stream(file_stream, analysis_type: str = 'overview'):
+def analyze_audio_stream(file_stream, analysis_type: str = 'overview', filename: Optional[str] = None):
     """
     Analyze audio with streaming response
     
     Args:
         file_stream: Audio file stream
         analysis_type: Type of analysis
+        filename: Original file name (format detection)
         
     Yields:
         str: Analysis chunks
     """
     try:
-        # First, transcribe
-        transcription_result = transcribe_audio(file_stream)
+        # Transcription and metadata run concurrently; both are joined before the prompt
+        from services.audio_pipeline import start_audio_pipeline
+        job = start_audio_pipeline(file_stream, filename)
+        
+        # A failed metadata read also stops the transcript from being requested
+        metadata_result = job.metadata()
+        if not metadata_result['success']:
+            yield f"[ERROR] Failed to read audio: {metadata_result.get('error', 'Unknown error')}"
+            return
+        
+        transcription_result = job.transcription()
         
         if not transcription_result['success']:
             yield f"[ERROR] Transcription failed: {transcription_result.get('error', 'Unknown error')}"
             return
         
-        # Get metadata
-        file_stream.seek(0)
-        metadata_result = get_audio_metadata(file_stream)
-        
         # Build prompt
         prompt = audio_prompts.build_audio_insight_prompt(
             transcript=transcription_result.get('transcript', ''),
@@ -0,0 +1,269 @@
+"""
+Chat Service - Multi-turn conversations with server-side history
+Each turn is one generation call: the stored history is sent as the chat
+'contents' payload, trimmed to a token budget. Turns that fall out of the
+window are folded into a running summary, so long conversations keep their
+context without resending (or re-billing) every earlier message.
+"""
+
+import os
+import uuid
+import zlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from dotenv import load_dotenv
+
+from config.gemini import chat, generate_text
+from .context_budget import estimate_tokens
+
+load_dotenv(verbose=False)
+
+# Estimated tokens of history (summary + recent turns) sent with each message
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv('CHAT_HISTORY_TOKEN_BUDGET', '6000'))
+# Share of the budget the window is cut back to when it overflows
+CHAT_WINDOW_LOW_WATERMARK = float(os.getenv('CHAT_WINDOW_LOW_WATERMARK', '0.5'))
+# Turns always kept verbatim, however long they are
+CHAT_MIN_RECENT_TURNS = int(os.getenv('CHAT_MIN_RECENT_TURNS', '4'))
+# 'auto' (Mongo when connected, else memory), 'mongo' or 'memory'
+CHAT_STORE = os.getenv('CHAT_STORE', 'auto').lower()
+CHAT_MEMORY_MAX_CONVERSATIONS = int(os.getenv('CHAT_MEMORY_MAX_CONVERSATIONS', '1000'))
+# Fixed pool of conversation locks; ids hash onto it, so memory doesn't grow with conversations
+CHAT_LOCK_STRIPES = int(os.getenv('CHAT_LOCK_STRIPES', '256'))
+
+
+class _MemoryConversationStore:
+    """In-process conversations, least recently used evicted first"""
+
+    name = 'memory'
+
+    def __init__(self, max_conversations):
+        self.max_conversations = max_conversations
+        self._conversations = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, conversation_id):
+        with self._lock:
+            conversation = self._conversations.get(conversation_id)
+            if conversation is not None:
+                self._conversations.move_to_end(conversation_id)
+            return conversation
+
+    def save(self, conversation):
+        with self._lock:
+            self._conversations[conversation['conversation_id']] = conversation
+            self._conversations.move_to_end(conversation['conversation_id'])
+            while len(self._conversations) > self.max_conversations:
+                self._conversations.popitem(last=False)
+
+    def delete(self, conversation_id):
+        with self._lock:
+            return self._conversations.pop(conversation_id, None) is not None
+
+
+class _MongoConversationStore:
+    """Conversations in the 'chat_conversations' collection"""
+
+    name = 'mongo'
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def get(self, conversation_id):
+        conversation = self._collection.find_one({'_id': conversation_id})
+        if conversation:
+            conversation.pop('_id', None)
+        return conversation
+
+    def save(self, conversation):
+        self._collection.replace_one(
+            {'_id': conversation['conversation_id']},
+            {'_id': conversation['conversation_id'], **conversation},
+            upsert=True
+        )
+
+    def delete(self, conversation_id):
+        return self._collection.delete_one({'_id': conversation_id}).deleted_count > 0
+
+
+def _summarize_turns(summary, turns):
+    """Fold turns that left the window into the running summary (one call)"""
+    transcript = "\n".join(
+        f"{'Assistant' if turn['role'] == 'model' else 'User'}: {turn['content']}" for turn in turns
+    )
+    prompt = (
+        "You maintain the memory of an ongoing conversation between a user and an assistant.\n"
+        "Update the summary below with the new messages. Keep every fact, name, number, "
+        "decision, preference and open question that later turns may rely on. "
+        "Write plain prose, at most 250 words.\n\n"
+        f"CURRENT SUMMARY:\n{summary or '(none yet)'}\n\n"
+        f"NEW MESSAGES:\n{transcript}\n\n"
+        "UPDATED SUMMARY:"
+    )
+    return generate_text(prompt, temperature=0.2, max_output_tokens=512).strip()
+
+
+def build_history_window(summary, turns, token_budget=CHAT_HISTORY_TOKEN_BUDGET,
+                         min_recent_turns=CHAT_MIN_RECENT_TURNS, low_watermark=CHAT_WINDOW_LOW_WATERMARK):
+    """
+    Split turns into those sent verbatim and those to summarize
+
+    While the history fits the budget, every turn is kept. Once it overflows,
+    the window is cut back to low_watermark of the budget, so the next several
+    turns fit again before another summary is needed. The newest
+    min_recent_turns are always kept.
+
+    Returns:
+        tuple: (kept_turns, overflow_turns), both oldest first
+    """
+    available = token_budget - (estimate_tokens(summary) if summary else 0)
+    sizes = [turn.get('tokens') or estimate_tokens(turn['content']) for turn in turns]
+    if sum(sizes) <= available:
+        return turns, []
+
+    remaining = available * low_watermark
+    keep_from = len(turns)
+    for i in range(len(turns) - 1, -1, -1):
+        if remaining - sizes[i] < 0 and len(turns) - i > min_recent_turns:
+            break
+        remaining -= sizes[i]
+        keep_from = i
+    # Never start the window on a model turn - the reply would lose its question
+    while 0 < keep_from < len(turns) and turns[keep_from]['role'] == 'model':
+        keep_from += 1
+    return turns[keep_from:], turns[:keep_from]
+
+
+class ChatService:
+    """Server-side conversation state with a token-budgeted sliding window"""
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        """Singleton pattern"""
+        if cls._instance is None:
+            cls._instance = super(ChatService, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self._store = None
+        self._lock = threading.Lock()
+        # Striped per-conversation locks so two tabs can't interleave the same history
+        self._conversation_locks = [threading.Lock() for _ in range(max(1, CHAT_LOCK_STRIPES))]
+        ChatService._initialized = True
+
+    def _get_store(self):
+        with self._lock:
+            if self._store is not None:
+                return self._store
+
+            if CHAT_STORE in ('auto', 'mongo'):
+                from config import get_collection
+                collection = get_collection('chat_conversations')
+                if collection is not None:
+                    self._store = _MongoConversationStore(collection)
+                elif CHAT_STORE == 'mongo':
+                    raise RuntimeError("CHAT_STORE=mongo but the database is not connected")
+
+            if self._store is None:
+                self._store = _MemoryConversationStore(CHAT_MEMORY_MAX_CONVERSATIONS)
+
+            print(f"[OK] Chat conversation store: {self._store.name}")
+            return self._store
+
+    def _conversation_lock(self, conversation_id):
+        # crc32 rather than hash(): stable, and spreads short hex ids evenly
+        stripe = zlib.crc32(str(conversation_id).encode('utf-8')) % len(self._conversation_locks)
+        return self._conversation_locks[stripe]
+
+    def send_message(self, message, conversation_id=None, system_prompt=None, **kwargs):
+        """
+        Add a user message to a conversation and generate the reply
+
+        Args:
+            message (str): The user's message
+            conversation_id (str): Existing conversation, or None to start one
+            system_prompt (str): Optional instructions sent ahead of the history
+            **kwargs: Generation parameters (temperature, max_output_tokens, ...)
+
+        Returns:
+            dict: {'conversation_id', 'response', 'turns', 'summarized'}
+        """
+        store = self._get_store()
+        conversation_id = conversation_id or uuid.uuid4().hex
+
+        with self._conversation_lock(conversation_id):
+            conversation = store.get(conversation_id) or {
+                'conversation_id': conversation_id,
+                'summary': '',
+                'turns': [],
+                'created_at': datetime.now().isoformat()
+            }
+            turns = conversation['turns'] + [
+                {'role': 'user', 'content': message, 'tokens': estimate_tokens(message)}
+            ]
+
+            kept, overflow = build_history_window(conversation['summary'], turns)
+            summary = conversation['summary']
+            summarized = False
+            if overflow:
+                # Only turns leaving the window are summarized, so this is an
+                # occasional extra call rather than one per message
+                summary = _summarize_turns(summary, overflow)
+                summarized = True
+
+            messages = []
+            if system_prompt:
+                messages.append({'role': 'system', 'content': system_prompt})
+            if summary:
+                messages.append({'role': 'system', 'content': f"Summary of the earlier conversation:\n{summary}"})
+            messages.extend({'role': turn['role'], 'content': turn['content']} for turn in kept)
+
+            response = chat(messages, **kwargs)
+
+            # The summary and the trimmed turns change together, only once the reply
+            # exists - a failed chat() leaves the stored conversation as it was
+            conversation['summary'] = summary
+            conversation['turns'] = kept + [
+                {'role': 'model', 'content': response, 'tokens': estimate_tokens(response)}
+            ]
+            conversation['updated_at'] = datetime.now().isoformat()
+            store.save(conversation)
+
+        return {
+            'conversation_id': conversation_id,
+            'response': response,
+            'turns': len(conversation['turns']),
+            'summarized': summarized
+        }
+
+    def get_conversation(self, conversation_id):
+        """Get stored conversation state, or None"""
+        return self._get_store().get(conversation_id)
+
+    def delete_conversation(self, conversation_id):
+        """Forget a conversation"""
+        return self._get_store().delete(conversation_id)
+
+
+# Singleton instance
+chat_service = ChatService()
+
+
+def send_chat_message(message, conversation_id=None, system_prompt=None, **kwargs):
+    """Send a message in a server-side conversation"""
+    return chat_service.send_message(message, conversation_id, system_prompt, **kwargs)
+
+
+def get_conversation(conversation_id):
+    """Get a stored conversation"""
+    return chat_service.get_conversation(conversation_id)
+
+
+def delete_conversation(conversation_id):
+    """Delete a stored conversation"""
+    return chat_service.delete_conversation(conversation_id)
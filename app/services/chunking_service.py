@@ -1,11 +1,19 @@
 """
 Chunking Service - Split documents into smaller chunks for RAG
 """
+import re
+
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
 
 def chunk_text(text, chunk_size=500, overlap=50, chunk_by='tokens'):
     """
     Split text into chunks with overlap
     
+    Runs in a single pass over the sentences. Each chunk's 'start_char' /
+    'end_char' point into the original text: text[start_char:end_char]
+    spans exactly the source content of the chunk (whitespace between
+    sentences is normalised to single spaces in 'text').
+    
     Args:
         text (str): Text to chunk
         chunk_size (int): Size of each chunk (in tokens or characters)
@@ -22,59 +30,92 @@ def chunk_text(text, chunk_size=500, overlap=50, chunk_by='tokens'):
     
     if chunk_by == 'tokens':
         # Approximate token count (1 token ≈ 4 characters)
-        approximate_tokens = len(text) // 4
         char_chunk_size = chunk_size * 4
         char_overlap = overlap * 4
     else:
         char_chunk_size = chunk_size
         char_overlap = overlap
     
-    # Split by sentences first for better chunking
-    sentences = _split_into_sentences(text)
+    # Split by sentences first for better chunking, keeping source offsets
+    sentence_spans = _split_into_sentence_spans(text)
     
     current_chunk = ""
     current_size = 0
     chunk_index = 0
+    # Verbatim source pieces making up current_chunk: (chunk_pos, source_start, length)
+    pieces = []
     
-    for sentence in sentences:
+    for start, sentence in sentence_spans:
+        end = start + len(sentence)
         sentence_size = len(sentence) if chunk_by == 'characters' else len(sentence) // 4
         
         # If adding this sentence would exceed chunk size
         if current_size + sentence_size > char_chunk_size and current_chunk:
             # Save current chunk
-            chunks.append({
-                'text': current_chunk.strip(),
-                'chunk_index': chunk_index,
-                'start_char': len(''.join([c['text'] for c in chunks])) if chunks else 0,
-                'end_char': len(''.join([c['text'] for c in chunks])) + len(current_chunk.strip())
-            })
+            chunks.append(_build_chunk(current_chunk, chunk_index, pieces))
             chunk_index += 1
             
             # Start new chunk with overlap
             if overlap > 0:
                 # Get last N characters for overlap
-                overlap_text = current_chunk[-char_overlap:] if len(current_chunk) > char_overlap else current_chunk
+                overlap_start = len(current_chunk) - char_overlap if len(current_chunk) > char_overlap else 0
+                overlap_text = current_chunk[overlap_start:]
+                pieces = _tail_pieces(pieces, overlap_start)
+                pieces.append((len(overlap_text) + 1, start, end - start))
                 current_chunk = overlap_text + " " + sentence
                 current_size = len(overlap_text) + sentence_size
             else:
+                pieces = [(0, start, end - start)]
                 current_chunk = sentence
                 current_size = sentence_size
         else:
+            pieces.append((len(current_chunk) + 1 if current_chunk else 0, start, end - start))
             current_chunk += (" " if current_chunk else "") + sentence
             current_size += sentence_size
     
     # Add the last chunk
     if current_chunk.strip():
-        chunks.append({
-            'text': current_chunk.strip(),
-            'chunk_index': chunk_index,
-            'start_char': len(''.join([c['text'] for c in chunks])) if chunks else 0,
-            'end_char': len(''.join([c['text'] for c in chunks])) + len(current_chunk.strip())
-        })
+        chunks.append(_build_chunk(current_chunk, chunk_index, pieces))
     
     return chunks
 
 
+def _tail_pieces(pieces, offset):
+    """
+    Keep the parts of pieces that lie at or after offset in the chunk string,
+    re-based so the new chunk string starts at offset
+    """
+    tail = []
+    # Walk back from the end - only the overlap window is touched
+    for chunk_pos, source_start, length in reversed(pieces):
+        if chunk_pos + length <= offset:
+            break
+        skip = max(0, offset - chunk_pos)
+        tail.append((chunk_pos + skip - offset, source_start + skip, length - skip))
+    tail.reverse()
+    return tail
+
+
+def _build_chunk(chunk_string, chunk_index, pieces):
+    """Build a chunk dict, mapping the stripped chunk back to source offsets"""
+    stripped = chunk_string.strip()
+    leading = len(chunk_string) - len(chunk_string.lstrip())
+    
+    start_char = pieces[0][1] if pieces else 0
+    for chunk_pos, source_start, length in pieces:
+        if chunk_pos + length > leading:
+            start_char = source_start + max(0, leading - chunk_pos)
+            break
+    end_char = pieces[-1][1] + pieces[-1][2] if pieces else start_char
+    
+    return {
+        'text': stripped,
+        'chunk_index': chunk_index,
+        'start_char': start_char,
+        'end_char': end_char
+    }
+
+
 def chunk_document(text, metadata=None, chunk_size=500, overlap=50):
     """
     Chunk a document with metadata
@@ -98,10 +139,28 @@ def chunk_document(text, metadata=None, chunk_size=500, overlap=50):
     return chunks
 
 
-def _split_into_sentences(text):
-    """Split text into sentences"""
-    import re
+def _split_into_sentence_spans(text):
+    """
+    Split text into sentences, returning (start, sentence) pairs where start
+    is the offset of the stripped sentence in the original text
+    """
     # Simple sentence splitting (can be improved with NLTK or spaCy)
-    sentences = re.split(r'(?<=[.!?])\s+', text)
-    return [s.strip() for s in sentences if s.strip()]
+    spans = []
+    segment_start = 0
+    for match in _SENTENCE_BOUNDARY.finditer(text):
+        # The boundary swallows all whitespace around it, so inner segments need no strip
+        spans.append((segment_start, text[segment_start:match.start()]))
+        segment_start = match.end()
+    spans.append((segment_start, text[segment_start:]))
+    
+    # Only the first and last segments can carry leading/trailing whitespace
+    for i in {0, len(spans) - 1}:
+        start, segment = spans[i]
+        stripped = segment.strip()
+        spans[i] = (start + len(segment) - len(segment.lstrip()), stripped)
+    return [span for span in spans if span[1]]
+
 
+def _split_into_sentences(text):
+    """Split text into sentences"""
+    return [sentence for _, sentence in _split_into_sentence_spans(text)]
@@ -0,0 +1,220 @@
+"""
+Context Budget - Fit prompt inputs into a token budget
+Replaces fixed character slices ([:8000], segments[:20], ...) in the prompt
+builders. Token counts come from a local estimate (no count_tokens round
+trip) and are cached. When content doesn't fit, it is trimmed evenly across
+its sections / items instead of dropping everything past a cut-off, so the
+whole document or recording stays represented.
+"""
+
+import os
+import re
+import threading
+from itertools import islice
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv(verbose=False)
+
+# Context windows (tokens) by model name prefix, most specific first
+MODEL_CONTEXT_WINDOWS = [
+    ('gemini-1.5-pro', 2097152),
+    ('gemini-1.5-flash', 1048576),
+    ('gemini-2.0', 1048576),
+    ('gemini-2.5', 1048576),
+    ('gemini-1.0-pro', 32768),
+    ('gemini-pro', 32768),
+]
+DEFAULT_CONTEXT_WINDOW = 32768
+
+# Tokens given to the main content of one prompt (document text, transcript).
+# Kept well below the 1M windows: cost and latency grow with every input token.
+CONTEXT_BUDGET_TOKENS = int(os.getenv('CONTEXT_BUDGET_TOKENS', '32000'))
+# Tokens kept free for instructions and the model's answer
+CONTEXT_RESERVED_TOKENS = int(os.getenv('CONTEXT_RESERVED_TOKENS', '12000'))
+
+# Roughly one token per short word piece or punctuation mark
+_TOKEN_PATTERN = re.compile(r"\w{1,5}|[^\w\s]")
+_PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+_SENTENCE_END = re.compile(r'[.!?](?=\s)')
+_OMITTED = "\n[...]\n"
+
+
+# (length, hash) -> token count; keyed without holding on to the text itself
+_token_counts = OrderedDict()
+_token_counts_lock = threading.Lock()
+_TOKEN_CACHE_SIZE = 4096
+
+
+def estimate_tokens(text):
+    """
+    Estimate the token count of text locally (cached)
+
+    Counts word pieces of up to 5 characters plus punctuation, which tracks
+    Gemini's tokenizer more closely than len / 4 for numbers and code.
+    """
+    if not text:
+        return 0
+    key = (len(text), hash(text))
+    with _token_counts_lock:
+        count = _token_counts.get(key)
+        if count is not None:
+            _token_counts.move_to_end(key)
+            return count
+    count = sum(1 for _ in _TOKEN_PATTERN.finditer(text))
+    with _token_counts_lock:
+        _token_counts[key] = count
+        if len(_token_counts) > _TOKEN_CACHE_SIZE:
+            _token_counts.popitem(last=False)
+    return count
+
+
+def get_context_window(model_name=None):
+    """Context window in tokens for a model"""
+    model = model_name or os.getenv('GEMINI_MODEL', 'gemini-2.0-flash-exp')
+    for prefix, window in MODEL_CONTEXT_WINDOWS:
+        if model.startswith(prefix):
+            return window
+    return DEFAULT_CONTEXT_WINDOW
+
+
+def get_context_budget(share=1.0, model_name=None):
+    """
+    Token budget for one piece of prompt content
+
+    Args:
+        share (float): Fraction of the main content budget (e.g. 0.1 for a
+            list of segments next to the transcript)
+        model_name (str): Model the prompt is for (default: GEMINI_MODEL)
+
+    Returns:
+        int: Tokens available
+    """
+    usable = max(1024, get_context_window(model_name) - CONTEXT_RESERVED_TOKENS)
+    return max(64, int(min(CONTEXT_BUDGET_TOKENS, usable) * share))
+
+
+def _truncate(text, max_tokens):
+    """Cut text to about max_tokens, preferring to end on a sentence"""
+    if max_tokens <= 0:
+        return ''
+    # Start of the first token past the budget
+    past_budget = next(islice(_TOKEN_PATTERN.finditer(text), max_tokens, None), None)
+    if past_budget is None:
+        return text
+    cut = text[:past_budget.start()]
+    sentence_ends = [m.end() for m in _SENTENCE_END.finditer(cut)]
+    if sentence_ends and sentence_ends[-1] > len(cut) // 2:
+        cut = cut[:sentence_ends[-1]]
+    return cut.rstrip()
+
+
+def _allocate(sizes, budget):
+    """
+    Share budget across parts: parts smaller than an even share keep all
+    their tokens, the rest split what is left equally (water-filling)
+    """
+    allocation = [0] * len(sizes)
+    remaining = budget
+    pending = sorted(range(len(sizes)), key=lambda i: sizes[i])
+    while pending:
+        share = remaining // len(pending)
+        i = pending[0]
+        if sizes[i] <= share:
+            allocation[i] = sizes[i]
+            remaining -= sizes[i]
+            pending.pop(0)
+        else:
+            for i in pending:
+                allocation[i] = share
+            break
+    return allocation
+
+
+def _split_sections(text, headings):
+    """Split text at section headings (falls back to paragraphs)"""
+    starts = []
+    if headings:
+        position = 0
+        for heading in headings:
+            title = heading.get('title') if isinstance(heading, dict) else str(heading)
+            if not title:
+                continue
+            index = text.find(title, position)
+            if index > 0:
+                starts.append(index)
+                position = index + len(title)
+    if starts:
+        bounds = [0] + starts + [len(text)]
+        return [text[a:b] for a, b in zip(bounds, bounds[1:]) if text[a:b].strip()]
+    return [part for part in _PARAGRAPH_BREAK.split(text) if part.strip()]
+
+
+def fit_text(text, max_tokens, sections=None):
+    """
+    Fit text into max_tokens
+
+    Text that fits is returned unchanged. Otherwise every section (or
+    paragraph) keeps its opening, sized so the total fits, and omitted parts
+    are marked with [...].
+
+    Args:
+        text (str): Document text or transcript
+        max_tokens (int): Token budget
+        sections (list): Optional section/chapter headings (strings or dicts
+            with 'title') used as split points
+
+    Returns:
+        str: Text within the budget
+    """
+    if not text:
+        return text or ''
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    parts = _split_sections(text, sections)
+    marker_tokens = estimate_tokens(_OMITTED)
+    # Too many tiny parts to give each a useful share - group them
+    max_parts = max(1, max_tokens // 200)
+    if len(parts) > max_parts:
+        group = -(-len(parts) // max_parts)
+        parts = ["\n\n".join(parts[i:i + group]) for i in range(0, len(parts), group)]
+
+    budget = max_tokens - marker_tokens * len(parts)
+    sizes = [estimate_tokens(part) for part in parts]
+    allocation = _allocate(sizes, max(budget, len(parts)))
+
+    kept = []
+    for part, size, tokens in zip(parts, sizes, allocation):
+        if tokens >= size:
+            kept.append(part.strip())
+        elif tokens > 0:
+            kept.append(_truncate(part.strip(), tokens) + _OMITTED.rstrip())
+    return "\n\n".join(kept)
+
+
+def fit_items(items, max_tokens, render=str):
+    """
+    Pick list items (segments, chapters, entities) that fit max_tokens
+
+    Keeps every item if they fit; otherwise keeps items spread evenly
+    across the whole list, in their original order.
+
+    Returns:
+        list: Selected items
+    """
+    if not items:
+        return items or []
+    sizes = [estimate_tokens(render(item)) + 1 for item in items]
+    if sum(sizes) <= max_tokens:
+        return list(items)
+
+    average = sum(sizes) / len(sizes)
+    count = max(1, min(len(items), int(max_tokens // max(average, 1))))
+    while count > 1:
+        step = len(items) / count
+        indexes = sorted({int(i * step) for i in range(count)})
+        if sum(sizes[i] for i in indexes) <= max_tokens:
+            return [items[i] for i in indexes]
+        count -= 1
+    return [items[0]]
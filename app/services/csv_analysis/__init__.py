@@ -2,9 +2,10 @@
 CSV analysis helper modules used by csv_service.
 """
 
-from . import prompts
+from . import prompts, profiler
 
 __all__ = [
     "prompts",
+    "profiler",
 ]
 
@@ -0,0 +1,253 @@
+"""
+Columnar CSV ingestion - Parse a CSV stream straight into typed columns
+Rows are read incrementally and appended to compact per-column arrays, so
+the raw file and a list of row dicts are never held in memory:
+- numeric columns: float64 array (NaN for missing) plus a 1-byte null mask
+- other columns: int8/16/32 codes into a dictionary of distinct strings
+A column starts out numeric and is re-encoded as strings the first time too
+many of its values fail to parse; values that did parse keep the text they
+were written with ('007', '$1,200', '1.50'). The result has the same layout as
+profiler.encode_rows, so it can be profiled and prompted directly.
+"""
+
+import csv
+import io
+import itertools
+from array import array
+
+import numpy as np
+
+from .profiler import _NULL_STRINGS, _parse_number, type_column
+
+# Unparseable values tolerated in a numeric column (share and minimum count)
+_MAX_INVALID_SHARE = 0.05
+_MIN_INVALID_TO_DEMOTE = 50
+# Parsed values per column whose original text is kept for a demotion
+# (only those the float doesn't render back to, e.g. '007' or '1.50')
+_MAX_RAW_TEXTS = 100000
+# Bytes read to detect the delimiter
+_SNIFF_CHARS = 64 * 1024
+
+
+def _render(value):
+    """Text of a parsed float as a string column would show it"""
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class CsvLimitError(ValueError):
+    """The CSV is larger than allowed (decompressed bytes, rows or distinct values)"""
+
+
+class _Limits:
+    """Row and distinct-value caps shared by every column of one parse (None = unlimited)"""
+
+    def __init__(self, max_rows=None, max_categories=None):
+        self.max_rows = max_rows
+        self.max_categories = max_categories
+        self.categories = 0
+
+    def add_category(self):
+        self.categories += 1
+        if self.max_categories and self.categories > self.max_categories:
+            raise CsvLimitError(f"CSV has more than {self.max_categories:,} distinct text values")
+
+
+class _ColumnBuilder:
+    """Accumulates one column's values as they are parsed"""
+
+    def __init__(self, name, limits=None):
+        self.name = name
+        self.limits = limits or _Limits()
+        self.numeric = True
+        # Numeric mode: values + mask (-1 missing, 0 present)
+        self.values = array('d')
+        self.mask = array('b')
+        # Row -> raw text for values that failed to parse as numbers
+        self.invalid = {}
+        # Row -> raw text for parsed values _render doesn't reproduce
+        # (None once _MAX_RAW_TEXTS is passed - a demotion then renders them)
+        self.raw = {}
+        # String mode: codes into categories
+        self.codes = None
+        self.lookup = None
+        self.categories = None
+        self.present = 0
+
+    def append(self, text):
+        text = text.strip()
+        if not text or text.lower() in _NULL_STRINGS:
+            if self.numeric:
+                self.values.append(np.nan)
+                self.mask.append(-1)
+            else:
+                self.codes.append(-1)
+            return
+
+        self.present += 1
+        if not self.numeric:
+            self.codes.append(self._encode(text))
+            return
+
+        try:
+            value = float(text)
+        except ValueError:
+            value = _parse_number(text)
+        if value is None:
+            self.invalid[len(self.values)] = text
+            value = np.nan
+            if len(self.invalid) >= _MIN_INVALID_TO_DEMOTE and len(self.invalid) > self.present * _MAX_INVALID_SHARE:
+                self.values.append(value)
+                self.mask.append(0)
+                self._to_strings()
+                return
+        elif self.raw is not None and text != _render(value):
+            if len(self.raw) < _MAX_RAW_TEXTS:
+                self.raw[len(self.values)] = text
+            else:
+                self.raw = None
+        self.values.append(value)
+        self.mask.append(0)
+
+    def _encode(self, text):
+        code = self.lookup.get(text)
+        if code is None:
+            self.limits.add_category()
+            code = self.lookup[text] = len(self.categories)
+            self.categories.append(text)
+        return code
+
+    def _to_strings(self):
+        """Re-encode the values parsed so far as dictionary codes"""
+        self.numeric = False
+        self.codes = array('i')
+        self.lookup = {}
+        self.categories = []
+        raw = self.raw or {}
+        for row, (value, missing) in enumerate(zip(self.values, self.mask)):
+            if missing:
+                self.codes.append(-1)
+            elif row in self.invalid:
+                self.codes.append(self._encode(self.invalid[row]))
+            else:
+                self.codes.append(self._encode(raw.get(row) or _render(value)))
+        self.values = self.mask = self.invalid = self.raw = None
+
+    def finish(self):
+        """Typed column dict (see profiler.type_column)"""
+        if self.numeric and self.invalid and len(self.invalid) > self.present * _MAX_INVALID_SHARE:
+            self._to_strings()
+
+        if not self.numeric:
+            codes = np.frombuffer(self.codes, dtype=np.int32)
+            # Low-cardinality columns (the common case) fit 1- or 2-byte codes
+            for dtype in (np.int8, np.int16):
+                if len(self.categories) <= np.iinfo(dtype).max:
+                    codes = codes.astype(dtype)
+                    break
+            return type_column(self.name, codes, self.categories)
+
+        return {
+            'name': self.name,
+            'kind': 'numeric' if self.present else 'empty',
+            'codes': np.frombuffer(self.mask, dtype=np.int8),
+            'categories': [],
+            'values': np.frombuffer(self.values, dtype=np.float64),
+            'invalid': len(self.invalid)
+        }
+
+
+def _column_names(header, width):
+    """Header names with blanks filled in and duplicates suffixed"""
+    names = []
+    seen = set()
+    for i in range(width):
+        name = header[i].strip() if i < len(header) else ''
+        name = name or f"Column{i + 1}"
+        unique = name
+        suffix = 2
+        while unique in seen:
+            unique = f"{name}_{suffix}"
+            suffix += 1
+        seen.add(unique)
+        names.append(unique)
+    return names
+
+
+def parse_csv_stream(binary_stream, has_headers=True, delimiter=None, encoding='utf-8-sig',
+                     max_rows=None, max_categories=None):
+    """
+    Parse a CSV byte stream into typed columns
+
+    Args:
+        binary_stream: Readable binary file-like object (request stream, upload)
+        has_headers (bool): First row holds column names
+        delimiter (str): Field delimiter, or None to detect it
+        encoding (str): Text encoding (undecodable bytes are replaced)
+        max_rows (int): Max data rows, None for no limit
+        max_categories (int): Max distinct text values across all columns, None for no limit
+
+    Returns:
+        dict: {'columns': typed columns, 'row_count', 'malformed_rows', 'delimiter'}
+
+    Raises:
+        CsvLimitError: If max_rows or max_categories is exceeded
+    """
+    text_stream = io.TextIOWrapper(binary_stream, encoding=encoding, errors='replace', newline='')
+
+    # Read a sample (completed to a full line) to detect the delimiter, then
+    # parse it followed by the rest of the stream
+    sample = text_stream.read(_SNIFF_CHARS)
+    if len(sample) == _SNIFF_CHARS:
+        sample += text_stream.readline()
+    if not delimiter:
+        try:
+            delimiter = csv.Sniffer().sniff(sample[:_SNIFF_CHARS], delimiters=',;\t|').delimiter
+        except csv.Error:
+            delimiter = ','
+
+    reader = csv.reader(itertools.chain(io.StringIO(sample, newline=''), text_stream), delimiter=delimiter)
+    first = next(reader, None)
+    if first is None:
+        return {'columns': [], 'row_count': 0, 'malformed_rows': 0, 'delimiter': delimiter}
+
+    if has_headers:
+        names = _column_names(first, len(first))
+        pending = []
+    else:
+        names = _column_names([], len(first))
+        pending = [first]
+
+    limits = _Limits(max_rows, max_categories)
+    builders = [_ColumnBuilder(name, limits) for name in names]
+    width = len(builders)
+    row_count = 0
+    malformed = 0
+    for row in itertools.chain(pending, reader):
+        if not row:
+            continue
+        if max_rows and row_count >= max_rows:
+            raise CsvLimitError(f"CSV has more than {max_rows:,} rows")
+        if len(row) != width:
+            malformed += 1
+            row = (row + [''] * width)[:width]
+        for builder, value in zip(builders, row):
+            builder.append(value)
+        row_count += 1
+
+    return {
+        'columns': [builder.finish() for builder in builders],
+        'row_count': row_count,
+        'malformed_rows': malformed,
+        'delimiter': delimiter
+    }
+
+
+def columns_nbytes(columns):
+    """Approximate memory held by typed columns"""
+    total = 0
+    for column in columns:
+        total += column['codes'].nbytes
+        if column['values'] is not None:
+            total += column['values'].nbytes
+        total += sum(len(str(value)) + 49 for value in column['categories'])
+    return total
@@ -0,0 +1,565 @@
+"""
+CSV Profiler - Vectorized dataset statistics computed server-side
+Columns are dictionary-encoded (codes + distinct values), so type inference
+and value parsing run once per distinct value; every statistic is then a
+NumPy operation over whole columns. The profile is plain JSON-serializable
+data that prompts quote verbatim, so the model no longer has to read every
+row or do the arithmetic itself.
+"""
+
+import os
+import re
+from datetime import datetime
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv(verbose=False)
+
+# Most frequent values listed per categorical column
+CSV_PROFILE_TOP_K = int(os.getenv('CSV_PROFILE_TOP_K', '10'))
+# Categorical columns with at most this many values get per-group aggregates
+CSV_PROFILE_MAX_GROUPS = int(os.getenv('CSV_PROFILE_MAX_GROUPS', '20'))
+# Numeric columns considered for the correlation matrix
+CSV_PROFILE_MAX_CORRELATION_COLUMNS = int(os.getenv('CSV_PROFILE_MAX_CORRELATION_COLUMNS', '20'))
+# Rows quoted in the prompt next to the profile
+CSV_SAMPLE_ROWS = int(os.getenv('CSV_SAMPLE_ROWS', '30'))
+
+# Share of non-null values that must parse for a column to be numeric / datetime
+_TYPE_THRESHOLD = 0.95
+# Time periods listed in a trend before switching to a coarser granularity
+_MAX_TREND_PERIODS = 36
+# Numeric columns aggregated per group / per period
+_MAX_AGGREGATE_COLUMNS = 6
+
+_NULL_STRINGS = {'', 'na', 'n/a', 'nan', 'null', 'none', '-', '--', '#n/a'}
+_NUMBER_NOISE = re.compile(r'[\s,$€£%]')
+_DATE_FORMATS = [
+    '%m/%d/%Y', '%d/%m/%Y', '%Y/%m/%d', '%d-%m-%Y', '%m-%d-%Y', '%d.%m.%Y',
+    '%m/%d/%Y %H:%M', '%d/%m/%Y %H:%M', '%b %d, %Y', '%d %b %Y', '%B %d, %Y', '%Y-%m',
+]
+
+
+def _is_null(value):
+    if value is None:
+        return True
+    if isinstance(value, float):
+        return value != value
+    return isinstance(value, str) and value.strip().lower() in _NULL_STRINGS
+
+
+def _round(value, digits=4):
+    """Round a NumPy scalar to a JSON-friendly float"""
+    value = float(value)
+    if value != value or value in (float('inf'), float('-inf')):
+        return None
+    return round(value, digits)
+
+
+def dictionary_encode(values):
+    """
+    Dictionary-encode a sequence of raw values
+
+    Returns:
+        tuple: (int32 codes with -1 for nulls, list of distinct values)
+    """
+    lookup = {}
+    categories = []
+    codes = np.empty(len(values), dtype=np.int32)
+    for i, value in enumerate(values):
+        if _is_null(value):
+            codes[i] = -1
+            continue
+        if isinstance(value, str):
+            key = value.strip()
+        elif isinstance(value, (list, dict)):
+            key = str(value)
+        else:
+            key = value
+        code = lookup.get(key)
+        if code is None:
+            code = lookup[key] = len(categories)
+            categories.append(key)
+        codes[i] = code
+    return codes, categories
+
+
+def _parse_number(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = _NUMBER_NOISE.sub('', str(value))
+    if text.startswith('(') and text.endswith(')'):
+        # Accounting negatives: (1,234.00)
+        text = '-' + text[1:-1]
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def _parse_iso(text):
+    try:
+        return np.datetime64(text.replace(' ', 'T', 1).rstrip('Z'), 's')
+    except ValueError:
+        return np.datetime64('NaT')
+
+
+def _parse_with_format(text, date_format):
+    try:
+        return np.datetime64(datetime.strptime(text, date_format), 's')
+    except ValueError:
+        return np.datetime64('NaT')
+
+
+def _parse_dates(categories):
+    """Parse distinct values as dates; returns datetime64[s] array with NaT on failure, or None"""
+    strings = [str(value) for value in categories]
+    probe = strings[:50]
+    if not any(ch.isdigit() for ch in probe[0]):
+        return None
+
+    # Try ISO 8601 (parsed natively by NumPy) and then common formats on a
+    # probe of distinct values before parsing them all
+    parsers = [_parse_iso] + [
+        lambda text, date_format=date_format: _parse_with_format(text, date_format) for date_format in _DATE_FORMATS
+    ]
+    for parse in parsers:
+        if sum(not np.isnat(parse(text)) for text in probe) >= len(probe) * _TYPE_THRESHOLD:
+            return np.array([parse(text) for text in strings], dtype='datetime64[s]')
+    return None
+
+
+def type_column(name, codes, categories):
+    """
+    Infer a dictionary-encoded column's type and build its typed arrays
+
+    Args:
+        name (str): Column name
+        codes (np.ndarray): int32 codes, -1 for nulls
+        categories (list): Distinct raw values
+
+    Returns:
+        dict: {'name', 'kind', 'codes', 'categories', 'values', 'invalid'} where
+            kind is 'numeric' (values: float64, NaN for missing), 'datetime'
+            (values: datetime64[s], NaT for missing), 'categorical', 'text' or 'empty'
+    """
+    column = {'name': name, 'kind': 'empty', 'codes': codes, 'categories': categories, 'values': None, 'invalid': 0}
+    present = codes[codes >= 0]
+    if not len(present):
+        return column
+    counts = np.bincount(present, minlength=len(categories))
+
+    parsed = np.array([_parse_number(value) for value in categories], dtype=np.float64)
+    parsed_ok = ~np.isnan(parsed)
+    if counts[parsed_ok].sum() >= len(present) * _TYPE_THRESHOLD:
+        column['kind'] = 'numeric'
+        # Index -1 (null) lands on the trailing NaN
+        column['values'] = np.append(parsed, np.nan)[codes]
+        column['invalid'] = int(counts[~parsed_ok].sum())
+        return column
+
+    dates = _parse_dates(categories)
+    if dates is not None:
+        dates_ok = ~np.isnat(dates)
+        if counts[dates_ok].sum() >= len(present) * _TYPE_THRESHOLD:
+            column['kind'] = 'datetime'
+            column['values'] = np.append(dates, np.datetime64('NaT'))[codes]
+            column['invalid'] = int(counts[~dates_ok].sum())
+            return column
+
+    distinct = len(categories)
+    column['kind'] = 'categorical' if distinct <= 50 or distinct <= len(present) * 0.5 else 'text'
+    return column
+
+
+def encode_rows(rows, columns):
+    """
+    Convert row dicts (the JSON the UI posts) into typed columns
+
+    Returns:
+        list: Typed columns (see type_column), in column order
+    """
+    encoded = []
+    for name in columns:
+        codes, categories = dictionary_encode([row.get(name) for row in rows])
+        encoded.append(type_column(name, codes, categories))
+    return encoded
+
+
+def _numeric_stats(values):
+    valid = values[~np.isnan(values)]
+    stats = {'count': int(len(valid)), 'missing': int(len(values) - len(valid))}
+    if not len(valid):
+        return stats
+    q1, median, q3, p90, p95 = np.percentile(valid, [25, 50, 75, 90, 95])
+    mean = valid.mean()
+    std = valid.std(ddof=1) if len(valid) > 1 else 0.0
+    centered = valid - mean
+    m2 = np.mean(centered ** 2)
+    skewness = np.mean(centered ** 3) / m2 ** 1.5 if m2 > 0 else 0.0
+    uniques, unique_counts = np.unique(valid, return_counts=True)
+    iqr = q3 - q1
+    outliers = int(np.count_nonzero((valid < q1 - 1.5 * iqr) | (valid > q3 + 1.5 * iqr)))
+    stats.update({
+        'distinct': int(len(uniques)),
+        'sum': _round(valid.sum()),
+        'mean': _round(mean),
+        'median': _round(median),
+        'mode': _round(uniques[unique_counts.argmax()]) if unique_counts.max() > 1 else None,
+        'std': _round(std),
+        'variance': _round(std ** 2),
+        'min': _round(valid.min()),
+        'max': _round(valid.max()),
+        'range': _round(valid.max() - valid.min()),
+        'q1': _round(q1),
+        'q3': _round(q3),
+        'p90': _round(p90),
+        'p95': _round(p95),
+        'iqr': _round(iqr),
+        'skewness': _round(skewness),
+        'outliers_iqr': outliers,
+    })
+    return stats
+
+
+def _categorical_stats(codes, categories, top_k):
+    present = codes[codes >= 0]
+    stats = {'count': int(len(present)), 'missing': int(len(codes) - len(present)), 'distinct': len(categories)}
+    if not len(present):
+        return stats
+    counts = np.bincount(present, minlength=len(categories))
+    top = np.argsort(-counts, kind='stable')[:top_k]
+    stats['top_values'] = [
+        {'value': str(categories[i]), 'count': int(counts[i]), 'percent': _round(100.0 * counts[i] / len(present), 2)}
+        for i in top
+    ]
+    lengths = np.array([len(str(value)) for value in categories])[present]
+    stats['avg_length'] = _round(lengths.mean(), 1)
+    return stats
+
+
+def _datetime_stats(values):
+    valid = values[~np.isnat(values)]
+    stats = {'count': int(len(valid)), 'missing': int(len(values) - len(valid))}
+    if not len(valid):
+        return stats
+    first, last = valid.min(), valid.max()
+    stats.update({
+        'distinct': int(len(np.unique(valid))),
+        'min': str(first.astype('datetime64[D]')),
+        'max': str(last.astype('datetime64[D]')),
+        'span_days': int((last - first) // np.timedelta64(1, 'D')),
+    })
+    return stats
+
+
+def _correlations(numeric_columns):
+    """Pearson r for every numeric column pair, on rows where both are present"""
+    pairs = []
+    columns = numeric_columns[:CSV_PROFILE_MAX_CORRELATION_COLUMNS]
+    for i, left in enumerate(columns):
+        for right in columns[i + 1:]:
+            both = ~np.isnan(left['values']) & ~np.isnan(right['values'])
+            n = int(np.count_nonzero(both))
+            if n < 3:
+                continue
+            x = left['values'][both]
+            y = right['values'][both]
+            x = x - x.mean()
+            y = y - y.mean()
+            denominator = np.sqrt((x * x).sum() * (y * y).sum())
+            if denominator == 0:
+                continue
+            r = float((x * y).sum() / denominator)
+            strength = 'strong' if abs(r) >= 0.7 else 'moderate' if abs(r) >= 0.4 else 'weak'
+            pairs.append({
+                'columns': [left['name'], right['name']],
+                'r': _round(r),
+                'n': n,
+                'strength': strength,
+                'direction': 'positive' if r >= 0 else 'negative'
+            })
+    pairs.sort(key=lambda pair: -abs(pair['r']))
+    return pairs
+
+
+def _aggregate(group_index, group_count, numeric_columns):
+    """Per-group count, sum and mean of numeric columns via bincount"""
+    result = {}
+    for column in numeric_columns[:_MAX_AGGREGATE_COLUMNS]:
+        values = column['values']
+        present = ~np.isnan(values)
+        sums = np.bincount(group_index[present], weights=values[present], minlength=group_count)
+        counts = np.bincount(group_index[present], minlength=group_count)
+        means = np.divide(sums, counts, out=np.full(group_count, np.nan), where=counts > 0)
+        result[column['name']] = (sums, means)
+    return result
+
+
+def _group_aggregates(categorical_columns, numeric_columns):
+    groups = []
+    for column in categorical_columns:
+        if not 2 <= len(column['categories']) <= CSV_PROFILE_MAX_GROUPS:
+            continue
+        codes = column['codes']
+        present = codes >= 0
+        group_rows = np.bincount(codes[present], minlength=len(column['categories']))
+        aggregates = _aggregate(np.where(present, codes, len(column['categories'])),
+                                len(column['categories']) + 1, numeric_columns)
+        order = np.argsort(-group_rows, kind='stable')
+        groups.append({
+            'by': column['name'],
+            'groups': [
+                {
+                    'value': str(column['categories'][i]),
+                    'rows': int(group_rows[i]),
+                    **{name: {'sum': _round(sums[i], 2), 'mean': _round(means[i], 2)} for name, (sums, means) in aggregates.items()}
+                }
+                for i in order
+            ]
+        })
+    return groups[:4]
+
+
+def _trend(date_column, numeric_columns):
+    """Aggregate numeric columns per day / month / year of the first date column"""
+    values = date_column['values']
+    present = ~np.isnat(values)
+    if np.count_nonzero(present) < 2:
+        return None
+
+    for unit, label in (('D', 'day'), ('M', 'month'), ('Y', 'year')):
+        periods = values[present].astype(f'datetime64[{unit}]')
+        keys, index = np.unique(periods, return_inverse=True)
+        if len(keys) <= _MAX_TREND_PERIODS:
+            break
+    if len(keys) < 2:
+        return None
+
+    full_index = np.full(len(values), len(keys))
+    full_index[present] = index
+    rows = np.bincount(index, minlength=len(keys))
+    aggregates = _aggregate(full_index, len(keys) + 1, numeric_columns)
+
+    series = {}
+    for name, (sums, means) in aggregates.items():
+        sums = sums[:len(keys)]
+        slope = np.polyfit(np.arange(len(keys)), sums, 1)[0]
+        level = np.abs(sums).mean()
+        slope_pct = 100.0 * slope / level if level else 0.0
+        series[name] = {
+            'direction': 'upward' if slope_pct > 1 else 'downward' if slope_pct < -1 else 'stable',
+            'change_per_period_percent': _round(slope_pct, 2),
+            'first_to_last_percent': _round(100.0 * (sums[-1] - sums[0]) / abs(sums[0]), 2) if sums[0] else None,
+            'peak_period': str(keys[int(sums.argmax())]),
+            'low_period': str(keys[int(sums.argmin())]),
+        }
+
+    return {
+        'date_column': date_column['name'],
+        'granularity': label,
+        'periods': [
+            {
+                'period': str(keys[i]),
+                'rows': int(rows[i]),
+                **{name: {'sum': _round(sums[i], 2), 'mean': _round(means[i], 2)} for name, (sums, means) in aggregates.items()}
+            }
+            for i in range(len(keys))
+        ],
+        'series': series
+    }
+
+
+def _row_fingerprints(encoded):
+    """One int64 per column per row; equal rows have equal fingerprints"""
+    parts = []
+    for column in encoded:
+        if column['kind'] == 'numeric':
+            # Canonical NaN so missing values compare equal
+            parts.append(np.where(np.isnan(column['values']), np.nan, column['values']).view(np.int64))
+        elif column['kind'] == 'datetime':
+            parts.append(column['values'].view(np.int64))
+        else:
+            parts.append(column['codes'].astype(np.int64))
+    return np.column_stack(parts) if parts else None
+
+
+def profile_columns(encoded, row_count=None):
+    """
+    Compute the dataset profile from typed columns
+
+    Args:
+        encoded (list): Typed columns from encode_rows / type_column
+        row_count (int): Number of rows (default: length of the columns)
+
+    Returns:
+        dict: JSON-serializable profile
+    """
+    if row_count is None:
+        row_count = len(encoded[0]['codes']) if encoded else 0
+
+    profile = {'rows': row_count, 'columns': [], 'correlations': [], 'groups': [], 'trend': None}
+    numeric = [column for column in encoded if column['kind'] == 'numeric']
+    categorical = [column for column in encoded if column['kind'] == 'categorical']
+    dates = [column for column in encoded if column['kind'] == 'datetime']
+
+    for column in encoded:
+        if column['kind'] == 'numeric':
+            stats = _numeric_stats(column['values'])
+        elif column['kind'] == 'datetime':
+            stats = _datetime_stats(column['values'])
+        else:
+            stats = _categorical_stats(column['codes'], column['categories'],
+                                       CSV_PROFILE_TOP_K if column['kind'] == 'categorical' else 5)
+        # Unparseable values count as invalid, not missing
+        stats['missing'] = int(np.count_nonzero(column['codes'] < 0))
+        stats['invalid'] = column['invalid']
+        profile['columns'].append({'name': column['name'], 'type': column['kind'], **stats})
+
+    if row_count and encoded:
+        missing = np.zeros(row_count, dtype=bool)
+        for column in encoded:
+            missing |= column['codes'] < 0
+        fingerprints = _row_fingerprints(encoded)
+        profile['rows_with_missing'] = int(np.count_nonzero(missing))
+        profile['duplicate_rows'] = int(row_count - len(np.unique(fingerprints, axis=0)))
+        profile['missing_cells'] = int(sum(np.count_nonzero(column['codes'] < 0) for column in encoded))
+
+    profile['correlations'] = _correlations(numeric)
+    profile['groups'] = _group_aggregates(categorical, numeric)
+    if dates and numeric:
+        profile['trend'] = _trend(dates[0], numeric)
+    return profile
+
+
+def sample_rows(encoded, k=CSV_SAMPLE_ROWS):
+    """
+    Pick row indexes stratified by the lowest-cardinality categorical column
+
+    Each group gets a share proportional to its size (at least one row),
+    spread evenly through the group; without a grouping column rows are
+    spread evenly through the file.
+
+    Returns:
+        np.ndarray: Sorted row indexes
+    """
+    if not encoded:
+        return np.array([], dtype=np.int64)
+    row_count = len(encoded[0]['codes'])
+    if row_count <= k:
+        return np.arange(row_count)
+
+    strata = [
+        column for column in encoded
+        if column['kind'] == 'categorical' and 2 <= len(column['categories']) <= k
+    ]
+    if not strata:
+        return np.unique(np.linspace(0, row_count - 1, k).astype(np.int64))
+
+    codes = min(strata, key=lambda column: len(column['categories']))['codes']
+    picks = []
+    for code in np.unique(codes):
+        members = np.flatnonzero(codes == code)
+        share = max(1, int(round(k * len(members) / row_count)))
+        picks.append(members[np.linspace(0, len(members) - 1, min(share, len(members))).astype(np.int64)])
+    return np.unique(np.concatenate(picks))
+
+
+def render_row(encoded, index):
+    """Row dict with display values for one row index"""
+    row = {}
+    for column in encoded:
+        code = column['codes'][index]
+        if code < 0:
+            row[column['name']] = None
+        elif column['kind'] == 'numeric':
+            value = column['values'][index]
+            row[column['name']] = None if np.isnan(value) else (int(value) if value.is_integer() else float(value))
+        else:
+            row[column['name']] = column['categories'][code]
+    return row
+
+
+def _format_number(value):
+    if value is None:
+        return 'n/a'
+    if float(value).is_integer() and abs(value) < 1e15:
+        return f"{int(value):,}"
+    return f"{value:,.4f}".rstrip('0').rstrip('.')
+
+
+def format_profile(profile, analysis_type='overview'):
+    """
+    Render a profile as compact prompt text
+
+    Every analysis type gets the column summary; statistical, correlation
+    and trends get their full tables, the others the leading entries.
+
+    Returns:
+        str: Profile text
+    """
+    lines = [
+        f"Rows: {profile['rows']:,}",
+        f"Rows with missing values: {profile.get('rows_with_missing', 0):,}",
+        f"Missing cells: {profile.get('missing_cells', 0):,}",
+        f"Duplicate rows: {profile.get('duplicate_rows', 0):,}",
+        "",
+        "Columns:"
+    ]
+    for column in profile['columns']:
+        header = f"- {column['name']} ({column['type']}): count {column.get('count', 0):,}, missing {column.get('missing', 0):,}"
+        if column.get('invalid'):
+            header += f", unparseable {column['invalid']:,}"
+        if 'distinct' in column:
+            header += f", distinct {column['distinct']:,}"
+        lines.append(header)
+        if column['type'] == 'numeric' and column.get('count'):
+            keys = ['sum', 'mean', 'median', 'mode', 'std', 'min', 'max', 'q1', 'q3']
+            if analysis_type in ('statistical', 'quality', 'patterns'):
+                keys += ['variance', 'range', 'p90', 'p95', 'iqr', 'skewness']
+            stats = ', '.join(f"{key} {_format_number(column[key])}" for key in keys)
+            lines.append(f"  {stats}, outliers (1.5 IQR) {column['outliers_iqr']:,}")
+        elif column['type'] == 'datetime' and column.get('count'):
+            lines.append(f"  from {column['min']} to {column['max']} ({column['span_days']:,} days)")
+        elif column.get('top_values'):
+            top = '; '.join(f"{item['value']}: {item['count']:,} ({item['percent']}%)" for item in column['top_values'])
+            lines.append(f"  most frequent: {top}")
+
+    for group in profile.get('groups', []):
+        lines += ["", f"Aggregates by {group['by']}:"]
+        for item in group['groups']:
+            measures = ', '.join(
+                f"{name} sum {_format_number(value['sum'])} mean {_format_number(value['mean'])}"
+                for name, value in item.items() if isinstance(value, dict)
+            )
+            lines.append(f"- {item['value']}: rows {item['rows']:,}" + (f", {measures}" if measures else ''))
+
+    correlations = profile.get('correlations', [])
+    if correlations:
+        shown = correlations if analysis_type == 'correlation' else correlations[:5]
+        lines += ["", "Correlations (Pearson r, strongest first):"]
+        lines += [
+            f"- {pair['columns'][0]} ~ {pair['columns'][1]}: r = {pair['r']} ({pair['strength']} {pair['direction']}, n = {pair['n']:,})"
+            for pair in shown
+        ]
+
+    trend = profile.get('trend')
+    if trend:
+        lines += ["", f"Trend by {trend['granularity']} of {trend['date_column']}:"]
+        for name, series in trend['series'].items():
+            lines.append(
+                f"- {name}: {series['direction']}, {series['change_per_period_percent']}% per {trend['granularity']}, "
+                f"first to last {series['first_to_last_percent']}%, peak {series['peak_period']}, low {series['low_period']}"
+            )
+        if analysis_type in ('trends', 'overview'):
+            for period in trend['periods']:
+                measures = ', '.join(
+                    f"{name} sum {_format_number(value['sum'])}"
+                    for name, value in period.items() if isinstance(value, dict)
+                )
+                lines.append(f"  {period['period']}: rows {period['rows']:,}" + (f", {measures}" if measures else ''))
+
+    return "\n".join(lines)
+
@@ -3,6 +3,8 @@ CSV Analysis Prompts
 Contains all prompt building functions for CSV analysis types
 """
 
+from . import profiler
+
 
 def build_csv_insight_prompt(csv_data, columns, metadata, analysis_type='overview'):
     """
@@ -15,21 +17,38 @@ def build_csv_insight_prompt(csv_data, columns, metadata, analysis_type='overvie
         metadata: Dictionary with metadata about the CSV
         analysis_type: Type of analysis to perform ('overview', 'statistical', 'patterns', 'quality', 'trends', 'correlation')
     """
-    total_rows = metadata.get('totalRows', len(csv_data))
+    # Statistics are computed here; the prompt carries the profile and a
+    # stratified sample instead of every row
+    encoded = profiler.encode_rows(csv_data, columns)
+    return build_columnar_insight_prompt(encoded, len(csv_data), metadata, analysis_type)
+
+
+def build_columnar_insight_prompt(encoded, row_count, metadata, analysis_type='overview', profile=None, context_cache=None):
+    """
+    Build the insight generation prompt from typed columns
+    
+    Args:
+        encoded: Typed columns (profiler.encode_rows or a stored dataset)
+        row_count: Number of rows in the columns
+        metadata: Dictionary with metadata about the CSV
+        analysis_type: Type of analysis to perform ('overview', 'statistical', 'patterns', 'quality', 'trends', 'correlation')
+        profile: Precomputed profile (computed here if omitted)
+        context_cache: Optional dict reused across calls to skip re-formatting the data context
+    """
+    metadata = metadata or {}
+    columns = [column['name'] for column in encoded]
+    total_rows = metadata.get('totalRows', row_count)
     total_columns = metadata.get('totalColumns', len(columns))
     has_headers = metadata.get('hasHeaders', True)
     
-    # Format CSV data for analysis
-    data_context = f"CSV Data Analysis:\n"
-    data_context += f"Columns: {', '.join(columns)}\n"
-    data_context += f"Total Rows: {total_rows}\n"
-    data_context += f"Total Columns: {total_columns}\n"
-    data_context += f"Has Headers: {'Yes' if has_headers else 'No'}\n\n"
-    data_context += f"Complete Dataset:\n"
-    
-    for idx, row in enumerate(csv_data, 1):
-        row_str = ', '.join([f"{key}: {value}" for key, value in row.items()])
-        data_context += f"Row {idx}: {row_str}\n"
+    context_key = (analysis_type, total_rows, total_columns, has_headers)
+    data_context = context_cache.get(context_key) if context_cache is not None else None
+    if data_context is None:
+        if profile is None:
+            profile = profiler.profile_columns(encoded, row_count)
+        data_context = build_data_context(encoded, profile, columns, total_rows, total_columns, has_headers, analysis_type)
+        if context_cache is not None:
+            context_cache[context_key] = data_context
     
     # Build different prompts based on analysis type
     if analysis_type == 'overview':
@@ -49,6 +68,39 @@ def build_csv_insight_prompt(csv_data, columns, metadata, analysis_type='overvie
         return _build_overview_prompt(data_context, total_rows, total_columns, columns, has_headers)
 
 
+def build_data_context(encoded, profile, columns, total_rows, total_columns, has_headers, analysis_type='overview'):
+    """
+    Format the computed profile and a stratified row sample for a prompt
+    
+    Args:
+        encoded: Typed columns from profiler.encode_rows
+        profile: Profile from profiler.profile_columns
+        columns: List of column names
+        total_rows / total_columns / has_headers: Dataset metadata
+        analysis_type: Selects how much of the profile is detailed
+    
+    Returns:
+        str: Data context for the prompt
+    """
+    sample = profiler.sample_rows(encoded)
+    parts = [
+        "CSV Data Analysis:",
+        f"Columns: {', '.join(columns)}",
+        f"Total Rows: {total_rows}",
+        f"Total Columns: {total_columns}",
+        f"Has Headers: {'Yes' if has_headers else 'No'}",
+        "",
+        "COMPUTED PROFILE (exact values calculated over ALL rows):",
+        profiler.format_profile(profile, analysis_type),
+        "",
+        f"SAMPLE ROWS ({len(sample)} of {profile['rows']}, spread across the dataset):",
+    ]
+    for index in sample:
+        row = profiler.render_row(encoded, index)
+        parts.append(f"Row {index + 1}: " + ', '.join(f"{key}: {value}" for key, value in row.items()))
+    return "\n".join(parts) + "\n"
+
+
 def _build_overview_prompt(data_context, total_rows, total_columns, columns, has_headers):
     """Build overview analysis prompt"""
     prompt = f"""You are a data analyst analyzing a CSV file. Provide a COMPREHENSIVE overview analysis with detailed information.
@@ -117,7 +169,7 @@ CRITICAL REQUIREMENTS:
 2. Use colons (:) for key-value pairs, not pipes
 3. Use dashes (-) for ALL bullet points
 4. NO markdown symbols (**, |, ✅, ❌, ⚙️) - use plain text only
-5. Calculate ALL numbers from the ACTUAL data provided above - do NOT make up numbers
+5. Take ALL numbers from the COMPUTED PROFILE below - do NOT recalculate them from the sample rows or make up numbers
 6. Include ALL 6 sections - missing any section is NOT acceptable
 7. Each section must be clearly separated with blank lines
 8. Be thorough and detailed - provide comprehensive analysis
@@ -207,7 +259,7 @@ CRITICAL REQUIREMENTS:
 2. Use colons (:) for key-value pairs, not pipes
 3. Use dashes (-) for ALL bullet points
 4. NO markdown symbols (**, |, ✅, ❌, ⚙️) - use plain text only
-5. Calculate ALL numbers from the ACTUAL data provided above
+5. Take ALL numbers from the COMPUTED PROFILE below - do NOT recalculate them from the sample rows
 6. Include ALL sections
 7. Each section must be clearly separated with blank lines
 8. Keep text clean and readable for users
@@ -265,7 +317,7 @@ CRITICAL REQUIREMENTS:
 4. Include ALL sections
 5. Each section must be clearly separated with blank lines
 6. Keep text clean and readable for users
-7. Base all patterns on ACTUAL data provided above
+7. Base all patterns on the COMPUTED PROFILE and SAMPLE ROWS below
 
 {data_context}
 
@@ -335,7 +387,7 @@ CRITICAL REQUIREMENTS:
 5. Include ALL sections
 6. Each section must be clearly separated with blank lines
 7. Keep text clean and readable for users
-8. Base all assessments on ACTUAL data provided above
+8. Base all assessments on the COMPUTED PROFILE and SAMPLE ROWS below
 
 {data_context}
 
@@ -399,7 +451,7 @@ CRITICAL REQUIREMENTS:
 4. Include ALL sections
 5. Each section must be clearly separated with blank lines
 6. Keep text clean and readable for users
-7. Base all trends on ACTUAL data provided above
+7. Take trend directions, rates and period totals from the COMPUTED PROFILE below - do NOT recalculate them
 8. Include a Trends Summary section with key findings
 
 {data_context}
@@ -462,7 +514,7 @@ CRITICAL REQUIREMENTS:
 5. Include ALL sections
 6. Each section must be clearly separated with blank lines
 7. Keep text clean and readable for users
-8. Base all correlations on ACTUAL data provided above
+8. Take correlation values from the COMPUTED PROFILE below - do NOT estimate them from the sample rows
 
 {data_context}
 
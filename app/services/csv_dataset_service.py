@@ -0,0 +1,417 @@
+"""
+CSV Dataset Service - Registry of CSV datasets stored as typed columns
+Datasets are keyed by a hash of their content: files parsed by
+/api/csv/upload and rows posted to the insight endpoint both resolve to the
+same dataset when the data is the same, so it is parsed and profiled once
+and every follow-up analysis type reuses the columns, the computed profile
+and the formatted prompt context. Insight requests can reference the id
+instead of re-sending every row.
+
+Recently used datasets stay in memory (bounded by CSV_DATASET_MEMORY_MB);
+every dataset is also written to CSV_DATASET_DIR, so other workers on the
+host can load it and evicted datasets come back on demand. Files older than
+CSV_DATASET_TTL_HOURS are removed.
+"""
+
+import io
+import os
+import re
+import json
+import hashlib
+import time
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+from dotenv import load_dotenv
+
+from config.single_flight import SingleFlight
+from .csv_analysis.columnar import parse_csv_stream, columns_nbytes, CsvLimitError
+from .csv_analysis.profiler import encode_rows, profile_columns
+
+load_dotenv(verbose=False)
+
+CSV_DATASET_MEMORY_MB = int(os.getenv('CSV_DATASET_MEMORY_MB', '256'))
+CSV_DATASET_DIR = os.getenv('CSV_DATASET_DIR', os.path.join(tempfile.gettempdir(), 'ai_analytics_datasets'))
+CSV_DATASET_TTL_HOURS = float(os.getenv('CSV_DATASET_TTL_HOURS', '24'))
+# Per-upload parse limits (0 = unlimited): rows and distinct text values over all columns
+CSV_MAX_ROWS = int(os.getenv('CSV_MAX_ROWS', '5000000'))
+CSV_MAX_DISTINCT_VALUES = int(os.getenv('CSV_MAX_DISTINCT_VALUES', '1000000'))
+
+_DATASET_ID = re.compile(r'^[0-9a-f]{32}$')
+
+# Concurrent analysis types on a new dataset share one profile computation
+_profile_flight = SingleFlight('csv_profile')
+
+
+class _HashingReader(io.RawIOBase):
+    """Pass-through reader that hashes the bytes read from a stream"""
+
+    def __init__(self, stream, digest):
+        self._stream = stream
+        self.digest = digest
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._stream.read(len(buffer))
+        if not data:
+            return 0
+        buffer[:len(data)] = data
+        self.digest.update(data)
+        return len(data)
+
+
+class _LimitedReader(io.RawIOBase):
+    """Pass-through reader that raises CsvLimitError once more than max_bytes were read"""
+
+    def __init__(self, stream, max_bytes):
+        self._stream = stream
+        self.max_bytes = max_bytes
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        # Never ask for more than one byte past the cap
+        size = min(len(buffer), self.max_bytes - self.bytes_read + 1)
+        data = self._stream.read(size)
+        if not data:
+            return 0
+        self.bytes_read += len(data)
+        if self.bytes_read > self.max_bytes:
+            raise CsvLimitError(f"CSV is larger than {self.max_bytes / 1024 / 1024:.0f} MB uncompressed")
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def fingerprint_rows(rows, columns):
+    """
+    Content hash of posted rows, used as their dataset id
+
+    Returns:
+        str: 32 hex characters
+    """
+    digest = hashlib.sha256(b'rows\x00')
+    digest.update('\x1f'.join(columns).encode('utf-8'))
+    for row in rows:
+        digest.update(('\x1e' + '\x1f'.join(str(row.get(name)) for name in columns)).encode('utf-8'))
+    return digest.hexdigest()[:32]
+
+
+def _save_dataset(directory, dataset):
+    """Write meta.json + arrays.npz for one dataset (atomically via rename)"""
+    temp_directory = directory + '.tmp'
+    os.makedirs(temp_directory, exist_ok=True)
+    arrays = {}
+    columns_meta = []
+    for i, column in enumerate(dataset['columns']):
+        arrays[f'codes_{i}'] = column['codes']
+        values_dtype = None
+        if column['values'] is not None:
+            values_dtype = str(column['values'].dtype)
+            # datetime64 is stored as its int64 view
+            arrays[f'values_{i}'] = column['values'].view(np.int64) if column['kind'] == 'datetime' else column['values']
+        columns_meta.append({
+            'name': column['name'],
+            'kind': column['kind'],
+            'categories': column['categories'],
+            'invalid': column['invalid'],
+            'values_dtype': values_dtype
+        })
+    np.savez(os.path.join(temp_directory, 'arrays.npz'), **arrays)
+    meta = {key: value for key, value in dataset.items() if key not in ('columns', 'cache')}
+    meta['columns'] = columns_meta
+    with open(os.path.join(temp_directory, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(temp_directory, directory)
+
+
+def _load_dataset(directory):
+    with open(os.path.join(directory, 'meta.json'), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    columns = []
+    with np.load(os.path.join(directory, 'arrays.npz'), allow_pickle=False) as arrays:
+        for i, column_meta in enumerate(meta.pop('columns')):
+            values = None
+            if column_meta['values_dtype']:
+                values = arrays[f'values_{i}']
+                if column_meta['kind'] == 'datetime':
+                    values = values.view(column_meta['values_dtype'])
+            columns.append({
+                'name': column_meta['name'],
+                'kind': column_meta['kind'],
+                'codes': arrays[f'codes_{i}'],
+                'categories': column_meta['categories'],
+                'values': values,
+                'invalid': column_meta['invalid']
+            })
+    meta['columns'] = columns
+    return meta
+
+
+class CsvDatasetService:
+    """Upload parsing plus a memory LRU / disk store of typed datasets"""
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        """Singleton pattern"""
+        if cls._instance is None:
+            cls._instance = super(CsvDatasetService, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self.max_bytes = CSV_DATASET_MEMORY_MB * 1024 * 1024
+        self.directory = CSV_DATASET_DIR
+        self._datasets = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        CsvDatasetService._initialized = True
+
+    def _path(self, dataset_id):
+        return os.path.join(self.directory, dataset_id)
+
+    def _remember(self, dataset):
+        with self._lock:
+            if dataset['dataset_id'] in self._datasets:
+                return
+            # Profile and formatted prompt contexts, filled in on first use
+            dataset.setdefault('cache', {})
+            self._datasets[dataset['dataset_id']] = dataset
+            self._bytes += dataset['bytes']
+            while len(self._datasets) > 1 and self._bytes > self.max_bytes:
+                _, evicted = self._datasets.popitem(last=False)
+                self._bytes -= evicted['bytes']
+
+    def _purge_expired(self):
+        """Remove dataset directories older than the TTL"""
+        cutoff = time.time() - CSV_DATASET_TTL_HOURS * 3600
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    shutil.rmtree(path, ignore_errors=True)
+                    with self._lock:
+                        dataset = self._datasets.pop(name, None)
+                        if dataset:
+                            self._bytes -= dataset['bytes']
+            except OSError:
+                continue
+
+    def _store(self, dataset):
+        """Keep a new dataset in memory and persist it for other workers"""
+        self._remember(dataset)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            _save_dataset(self._path(dataset['dataset_id']), dataset)
+            self._purge_expired()
+        except Exception as e:
+            print(f"[WARN] Could not persist CSV dataset {dataset['dataset_id']}: {e}")
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def ingest(self, binary_stream, filename=None, has_headers=True, delimiter=None, max_bytes=None):
+        """
+        Parse a CSV stream and store it as a dataset
+
+        The id is a hash of the file content and parse options, so
+        uploading the same file again returns the stored dataset.
+
+        Args:
+            binary_stream: Readable binary stream with the CSV content
+            filename (str): Original file name (informational)
+            has_headers (bool): First row holds column names
+            delimiter (str): Field delimiter, or None to detect it
+            max_bytes (int): Max bytes read from the (decompressed) stream, None for no limit
+
+        Returns:
+            dict: The stored dataset (typed columns plus metadata)
+
+        Raises:
+            CsvLimitError: If the content exceeds max_bytes, CSV_MAX_ROWS or CSV_MAX_DISTINCT_VALUES
+        """
+        started = time.time()
+        if max_bytes:
+            binary_stream = _LimitedReader(binary_stream, max_bytes)
+        digest = hashlib.sha256(f"file\x00{has_headers}\x00{delimiter}\x00".encode('utf-8'))
+        reader = io.BufferedReader(_HashingReader(binary_stream, digest))
+        parsed = parse_csv_stream(reader, has_headers=has_headers, delimiter=delimiter,
+                                  max_rows=CSV_MAX_ROWS or None, max_categories=CSV_MAX_DISTINCT_VALUES or None)
+        dataset_id = digest.hexdigest()[:32]
+
+        existing = self.get(dataset_id)
+        self._count(existing is not None)
+        if existing is not None:
+            print(f"[OK] CSV upload matches stored dataset {dataset_id}")
+            return existing
+
+        dataset = {
+            'dataset_id': dataset_id,
+            'filename': filename,
+            'row_count': parsed['row_count'],
+            'malformed_rows': parsed['malformed_rows'],
+            'delimiter': parsed['delimiter'],
+            'has_headers': has_headers,
+            'bytes': columns_nbytes(parsed['columns']),
+            'created_at': datetime.now().isoformat(),
+            'columns': parsed['columns']
+        }
+        print(f"[OK] Parsed CSV dataset {dataset_id}: {dataset['row_count']} rows, "
+              f"{len(dataset['columns'])} columns, {dataset['bytes'] / 1024 / 1024:.1f} MB in {time.time() - started:.2f}s")
+        self._store(dataset)
+        return dataset
+
+    def register_rows(self, rows, columns):
+        """
+        Get the dataset for posted row dicts, encoding them only if new
+
+        Returns:
+            dict: The stored dataset
+        """
+        dataset_id = fingerprint_rows(rows, columns)
+        existing = self.get(dataset_id)
+        self._count(existing is not None)
+        if existing is not None:
+            return existing
+
+        encoded = encode_rows(rows, columns)
+        dataset = {
+            'dataset_id': dataset_id,
+            'filename': None,
+            'row_count': len(rows),
+            'malformed_rows': 0,
+            'delimiter': None,
+            'has_headers': True,
+            'bytes': columns_nbytes(encoded),
+            'created_at': datetime.now().isoformat(),
+            'columns': encoded
+        }
+        self._store(dataset)
+        return dataset
+
+    def get_profile(self, dataset):
+        """Computed profile of a dataset (calculated once, then cached)"""
+        cache = dataset.setdefault('cache', {})
+        profile = cache.get('profile')
+        if profile is None:
+            profile = _profile_flight.do(
+                dataset['dataset_id'],
+                lambda: profile_columns(dataset['columns'], dataset['row_count'])
+            )
+            cache['profile'] = profile
+        return profile
+
+    def get(self, dataset_id):
+        """Get a dataset by id (memory first, then disk), or None"""
+        if not dataset_id or not _DATASET_ID.match(dataset_id):
+            return None
+        with self._lock:
+            dataset = self._datasets.get(dataset_id)
+            if dataset is not None:
+                self._datasets.move_to_end(dataset_id)
+                return dataset
+
+        path = self._path(dataset_id)
+        if not os.path.isdir(path):
+            return None
+        try:
+            dataset = _load_dataset(path)
+        except Exception as e:
+            print(f"[WARN] Could not load CSV dataset {dataset_id}: {e}")
+            return None
+        self._remember(dataset)
+        return dataset
+
+    def delete(self, dataset_id):
+        """Remove a dataset; returns True if it existed"""
+        if not dataset_id or not _DATASET_ID.match(dataset_id):
+            return False
+        with self._lock:
+            dataset = self._datasets.pop(dataset_id, None)
+            if dataset:
+                self._bytes -= dataset['bytes']
+        path = self._path(dataset_id)
+        existed = dataset is not None or os.path.isdir(path)
+        shutil.rmtree(path, ignore_errors=True)
+        return existed
+
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'datasets_in_memory': len(self._datasets),
+                'memory_mb': round(self._bytes / 1024 / 1024, 2),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+def describe_dataset(dataset):
+    """JSON summary of a dataset (no values)"""
+    return {
+        'dataset_id': dataset['dataset_id'],
+        'filename': dataset.get('filename'),
+        'rows': dataset['row_count'],
+        'columns': [{'name': column['name'], 'type': column['kind']} for column in dataset['columns']],
+        'malformed_rows': dataset.get('malformed_rows', 0),
+        'delimiter': dataset.get('delimiter'),
+        'memory_bytes': dataset['bytes'],
+        'created_at': dataset.get('created_at')
+    }
+
+
+# Singleton instance
+csv_dataset_service = CsvDatasetService()
+
+
+def ingest_csv_stream(binary_stream, filename=None, has_headers=True, delimiter=None, max_bytes=None):
+    """Parse and store an uploaded CSV"""
+    return csv_dataset_service.ingest(binary_stream, filename, has_headers, delimiter, max_bytes)
+
+
+def register_rows(rows, columns):
+    """Get (or create) the dataset for posted rows"""
+    return csv_dataset_service.register_rows(rows, columns)
+
+
+def get_dataset_profile(dataset):
+    """Get the cached profile of a dataset"""
+    return csv_dataset_service.get_profile(dataset)
+
+
+def get_dataset(dataset_id):
+    """Get a stored CSV dataset"""
+    return csv_dataset_service.get(dataset_id)
+
+
+def delete_dataset(dataset_id):
+    """Delete a stored CSV dataset"""
+    return csv_dataset_service.delete(dataset_id)
+
+
+def get_csv_dataset_stats():
+    """Get dataset registry counters"""
+    return csv_dataset_service.get_stats()
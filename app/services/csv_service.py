@@ -2,12 +2,15 @@
 CSV Service - Handle CSV analysis using Gemini AI
 """
 from services.csv_analysis import prompts as csv_prompts
+from services.csv_dataset_service import register_rows, get_dataset, get_dataset_profile
 
 
 def build_csv_insight_prompt(csv_data, columns, metadata, analysis_type='overview'):
     """
     Build the insight generation prompt for CSV files
     This is kept on the backend for security and consistency
+    The rows are registered by content hash, so repeat analyses of the same
+    data reuse the parsed columns and computed profile
     
     Args:
         csv_data: List of dictionaries representing CSV rows
@@ -18,5 +21,56 @@ def build_csv_insight_prompt(csv_data, columns, metadata, analysis_type='overvie
     Returns:
         str: The formatted prompt for CSV analysis
     """
-    return csv_prompts.build_csv_insight_prompt(csv_data, columns, metadata, analysis_type)
+    return build_csv_prompt_for_dataset(register_csv_rows(csv_data, columns), metadata, analysis_type)
 
+
+def register_csv_rows(csv_data, columns):
+    """
+    Register posted rows in the dataset registry
+    
+    Returns:
+        dict: The stored dataset (send its 'dataset_id' as 'datasetId' next time)
+    """
+    return register_rows(csv_data, columns)
+
+
+def build_csv_dataset_prompt(dataset_id, metadata=None, analysis_type='overview'):
+    """
+    Build the insight prompt for a stored dataset (uploaded or registered rows)
+    
+    Args:
+        dataset_id: Dataset id from /api/csv/upload or register_csv_rows
+        metadata: Optional metadata overrides
+        analysis_type: Type of analysis to perform
+    
+    Returns:
+        str: The formatted prompt, or None if the dataset is unknown
+    """
+    dataset = get_dataset(dataset_id)
+    if dataset is None:
+        return None
+    return build_csv_prompt_for_dataset(dataset, metadata, analysis_type)
+
+
+def build_csv_prompt_for_dataset(dataset, metadata=None, analysis_type='overview'):
+    """
+    Build the insight prompt for a dataset already in hand (no registry lookup)
+    
+    Args:
+        dataset: Dataset dict from register_csv_rows or get_dataset
+        metadata: Optional metadata overrides
+        analysis_type: Type of analysis to perform
+    
+    Returns:
+        str: The formatted prompt
+    """
+    metadata = dict(metadata or {})
+    metadata.setdefault('hasHeaders', dataset.get('has_headers', True))
+    return csv_prompts.build_columnar_insight_prompt(
+        dataset['columns'],
+        dataset['row_count'],
+        metadata,
+        analysis_type,
+        profile=get_dataset_profile(dataset),
+        context_cache=dataset.setdefault('cache', {}).setdefault('contexts', {})
+    )
@@ -0,0 +1,308 @@
+"""
+Document Summarizer - Map-reduce condensing for documents beyond the prompt budget
+Long documents are split into chunks (chunking_service), each chunk is
+summarized concurrently on a bounded pool (map), and the partial summaries
+are combined in document order (reduce) into the text the insight prompt is
+built from. Every part of the document is covered, at roughly the wall-clock
+time of one chunk call per wave of workers.
+
+Partial summaries are cached by the hash of their chunk text. Chunk
+boundaries are anchored on content (paragraph hashes), so after a small edit
+only the chunks around the edit change and need a new summary.
+"""
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+from .chunking_service import chunk_text
+from .context_budget import estimate_tokens, get_context_budget
+
+load_dotenv(verbose=False)
+
+# 'auto' (map-reduce only when the text exceeds the budget), 'always' or 'off'
+DOC_MAP_REDUCE = os.getenv('DOC_MAP_REDUCE', 'auto').lower()
+# Target size of one map chunk (tokens)
+DOC_MAP_CHUNK_TOKENS = int(os.getenv('DOC_MAP_CHUNK_TOKENS', '3000'))
+# Concurrent per-chunk summarization calls
+DOC_MAP_WORKERS = int(os.getenv('DOC_MAP_WORKERS', '4'))
+# Output cap for one partial summary (tokens)
+DOC_MAP_SUMMARY_TOKENS = int(os.getenv('DOC_MAP_SUMMARY_TOKENS', '512'))
+# 'auto' (Mongo when connected, else memory), 'mongo' or 'memory'
+DOC_SUMMARY_CACHE = os.getenv('DOC_SUMMARY_CACHE', 'auto').lower()
+DOC_SUMMARY_CACHE_SIZE = int(os.getenv('DOC_SUMMARY_CACHE_SIZE', '5000'))
+
+# Bump when the map prompt changes so old partial summaries are not reused
+_MAP_PROMPT_VERSION = 1
+# On average one paragraph in this many closes a block (content-defined cut)
+_ANCHOR_MODULUS = 4
+
+_PARAGRAPH_BREAK = '\n\n'
+
+
+def _build_map_prompt(text):
+    """Per-chunk summary prompt; holds no position info so it caches by content"""
+    return (
+        "You are condensing one part of a longer document so it can be analysed as a whole.\n"
+        "Summarize the part below. Keep its headings, key facts, names, numbers, dates, "
+        "definitions, conclusions and any tables or lists in compact form. "
+        "Do not add commentary or refer to 'this part'. At most 300 words.\n\n"
+        f"DOCUMENT PART:\n{text}\n\n"
+        "SUMMARY:"
+    )
+
+
+def _chunk_key(text):
+    payload = f"{_MAP_PROMPT_VERSION}:{text}"
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _anchor_blocks(text, target_tokens):
+    """
+    Group paragraphs into blocks of about target_tokens
+
+    A block closes after a paragraph whose hash falls on an anchor once the
+    block has half its target size (or unconditionally at the target), so an
+    edit only moves the boundaries of the blocks next to it.
+    """
+    blocks = []
+    current = []
+    current_tokens = 0
+    for paragraph in text.split(_PARAGRAPH_BREAK):
+        if not paragraph.strip():
+            continue
+        current.append(paragraph)
+        current_tokens += estimate_tokens(paragraph)
+        anchored = int(hashlib.md5(paragraph.encode('utf-8')).hexdigest()[:8], 16) % _ANCHOR_MODULUS == 0
+        if current_tokens >= target_tokens or (anchored and current_tokens >= target_tokens // 2):
+            blocks.append(_PARAGRAPH_BREAK.join(current))
+            current = []
+            current_tokens = 0
+    if current:
+        blocks.append(_PARAGRAPH_BREAK.join(current))
+    return blocks
+
+
+def split_for_map(text, chunk_tokens=DOC_MAP_CHUNK_TOKENS):
+    """
+    Split a document into map chunks
+
+    Returns:
+        list: Chunk texts in document order
+    """
+    chunks = []
+    for block in _anchor_blocks(text, chunk_tokens):
+        if estimate_tokens(block) <= chunk_tokens * 1.5:
+            chunks.append(block)
+        else:
+            # One huge paragraph (no breaks in the extraction) - sentence chunks
+            chunks.extend(
+                chunk['text'] for chunk in chunk_text(block, chunk_size=chunk_tokens * 4, overlap=0, chunk_by='characters')
+            )
+    return chunks
+
+
+class _MemorySummaryStore:
+    """In-process LRU of partial summaries"""
+
+    name = 'memory'
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        with self._lock:
+            found = {}
+            for key in keys:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[key] = self._entries[key]
+            return found
+
+    def put(self, key, summary):
+        with self._lock:
+            self._entries[key] = summary
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class _MongoSummaryStore:
+    """Partial summaries in the 'document_chunk_summaries' collection"""
+
+    name = 'mongo'
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def get_many(self, keys):
+        return {
+            doc['_id']: doc['summary']
+            for doc in self._collection.find({'_id': {'$in': list(keys)}}, {'summary': 1})
+        }
+
+    def put(self, key, summary):
+        self._collection.replace_one({'_id': key}, {'_id': key, 'summary': summary}, upsert=True)
+
+
+class DocumentSummarizer:
+    """Map-reduce condensing with a content-addressed partial summary cache"""
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        """Singleton pattern"""
+        if cls._instance is None:
+            cls._instance = super(DocumentSummarizer, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self._store = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, DOC_MAP_WORKERS), thread_name_prefix='doc-map')
+        self.computed = 0
+        self.reused = 0
+        DocumentSummarizer._initialized = True
+
+    def _get_store(self):
+        with self._lock:
+            if self._store is not None:
+                return self._store
+
+            if DOC_SUMMARY_CACHE in ('auto', 'mongo'):
+                from config import get_collection
+                collection = get_collection('document_chunk_summaries')
+                if collection is not None:
+                    self._store = _MongoSummaryStore(collection)
+                elif DOC_SUMMARY_CACHE == 'mongo':
+                    print("[WARN] DOC_SUMMARY_CACHE=mongo but the database is not connected - using memory")
+
+            if self._store is None:
+                self._store = _MemorySummaryStore(DOC_SUMMARY_CACHE_SIZE)
+
+            print(f"[OK] Document summary cache: {self._store.name}")
+            return self._store
+
+    def _summarize_chunk(self, key, text):
+        from config.gemini import generate_text
+        # The partial summary cache is the cache here, not the response cache
+        summary = generate_text(
+            _build_map_prompt(text),
+            temperature=0.2,
+            max_output_tokens=DOC_MAP_SUMMARY_TOKENS,
+            use_cache=False
+        ).strip()
+        try:
+            self._get_store().put(key, summary)
+        except Exception as e:
+            print(f"[WARN] Document summary cache write failed: {e}")
+        return summary
+
+    def map_chunks(self, chunks):
+        """
+        Summarize chunks concurrently, reusing cached partial summaries
+
+        Returns:
+            tuple: (summaries in chunk order, number reused from cache)
+        """
+        keys = [_chunk_key(chunk) for chunk in chunks]
+        try:
+            cached = self._get_store().get_many(set(keys))
+        except Exception as e:
+            print(f"[WARN] Document summary cache read failed: {e}")
+            cached = {}
+
+        # Identical chunks (repeated boilerplate) are summarized once
+        pending = {}
+        for key, chunk in zip(keys, chunks):
+            if key not in cached and key not in pending:
+                pending[key] = self._executor.submit(self._summarize_chunk, key, chunk)
+
+        results = dict(cached)
+        for key, future in pending.items():
+            results[key] = future.result()
+
+        reused = len(chunks) - len(pending)
+        with self._lock:
+            self.computed += len(pending)
+            self.reused += reused
+        return [results[key] for key in keys], reused
+
+    def condense(self, text, max_tokens=None, chunk_tokens=DOC_MAP_CHUNK_TOKENS):
+        """
+        Condense a document to fit max_tokens
+
+        Text that already fits is returned unchanged (unless DOC_MAP_REDUCE is
+        'always'). Otherwise chunk summaries are combined in order; if even
+        they exceed the budget, they are summarized again in groups.
+
+        Args:
+            text (str): Full document text
+            max_tokens (int): Token budget (default: get_context_budget())
+            chunk_tokens (int): Target size of one map chunk
+
+        Returns:
+            dict: {'text', 'map_reduce', 'chunks', 'reused', 'levels'}
+        """
+        max_tokens = max_tokens or get_context_budget()
+        result = {'text': text or '', 'map_reduce': False, 'chunks': 0, 'reused': 0, 'levels': 0}
+        if not text or DOC_MAP_REDUCE == 'off':
+            return result
+        if DOC_MAP_REDUCE != 'always' and estimate_tokens(text) <= max_tokens:
+            return result
+
+        parts = split_for_map(text, chunk_tokens)
+        result.update(map_reduce=True, chunks=len(parts))
+        print(f"[INFO] Map-reduce over {len(parts)} chunks ({DOC_MAP_WORKERS} workers)")
+
+        while True:
+            summaries, reused = self.map_chunks(parts)
+            result['reused'] += reused
+            result['levels'] += 1
+            combined = _PARAGRAPH_BREAK.join(
+                f"[Part {i} of {len(summaries)}]\n{summary}" for i, summary in enumerate(summaries, 1)
+            )
+            if estimate_tokens(combined) <= max_tokens or len(summaries) <= 1:
+                break
+            # Reduce again: group neighbouring summaries into new chunks
+            parts = split_for_map(_PARAGRAPH_BREAK.join(summaries), chunk_tokens)
+            if len(parts) >= len(summaries):
+                break
+
+        print(f"[OK] Map-reduce done: {result['chunks']} chunks, {result['reused']} summaries reused")
+        result['text'] = (
+            f"[Condensed from the full document: {len(summaries)} consecutive part summaries, in order]\n\n"
+            f"{combined}"
+        )
+        return result
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'computed': self.computed,
+                'reused': self.reused,
+                'store': self._store.name if self._store else None
+            }
+
+
+# Singleton instance
+document_summarizer = DocumentSummarizer()
+
+
+def condense_document(text, max_tokens=None):
+    """Condense a long document with map-reduce summarization"""
+    return document_summarizer.condense(text, max_tokens)
+
+
+def get_document_summarizer_stats():
+    """Get partial summary computed/reused counters"""
+    return document_summarizer.get_stats()
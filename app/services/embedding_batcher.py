@@ -0,0 +1,167 @@
+"""
+Embedding Batcher - Pack texts into bounded requests and embed them concurrently
+Used by the embedding services so ingestion time doesn't grow with one
+round trip per chunk.
+"""
+
+import os
+import time
+import random
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+load_dotenv(verbose=False)
+
+# Request limits (text-embedding-004 accepts up to 100 inputs per batch call)
+EMBEDDING_BATCH_MAX_ITEMS = int(os.getenv('EMBEDDING_BATCH_MAX_ITEMS', '100'))
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv('EMBEDDING_BATCH_MAX_TOKENS', '20000'))
+EMBEDDING_BATCH_WORKERS = int(os.getenv('EMBEDDING_BATCH_WORKERS', '4'))
+EMBEDDING_BATCH_RETRIES = int(os.getenv('EMBEDDING_BATCH_RETRIES', '3'))
+EMBEDDING_BATCH_BACKOFF_SECONDS = float(os.getenv('EMBEDDING_BATCH_BACKOFF_SECONDS', '0.5'))
+
+
+def estimate_tokens(text):
+    """Approximate token count (1 token ≈ 4 characters), same rule as chunking_service"""
+    return max(1, len(text) // 4)
+
+
+def pack_batches(texts, max_items=EMBEDDING_BATCH_MAX_ITEMS, max_tokens=EMBEDDING_BATCH_MAX_TOKENS):
+    """
+    Greedily pack consecutive texts into batches bounded by item count and tokens
+
+    A single text larger than max_tokens gets a batch of its own.
+
+    Returns:
+        list: List of (start, end) index ranges into texts
+    """
+    batches = []
+    start = 0
+    tokens = 0
+    for i, text in enumerate(texts):
+        text_tokens = estimate_tokens(text)
+        if i > start and (i - start >= max_items or tokens + text_tokens > max_tokens):
+            batches.append((start, i))
+            start = i
+            tokens = 0
+        tokens += text_tokens
+    if start < len(texts):
+        batches.append((start, len(texts)))
+    return batches
+
+
+# Worth retrying: rate limits, server errors and timeouts
+_TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}
+# Depend on how much was sent, so halves of the batch may still succeed
+_SIZE_STATUS = {408, 413, 504}
+
+
+class _EmbeddingCountError(ValueError):
+    """The API returned a different number of embeddings than texts sent"""
+
+
+def _error_status(error):
+    """HTTP status of an SDK/HTTP error (google.api_core, pinecone, requests), or None"""
+    for attr in ('status_code', 'status', 'code'):
+        value = getattr(error, attr, None)
+        if isinstance(value, int) and not isinstance(value, bool):
+            return int(value)
+    status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status if isinstance(status, int) else None
+
+
+def _classify_error(error):
+    """
+    How a failed batch request should be handled
+
+    Returns:
+        str: 'size' (retry, then split), 'transient' (retry only) or
+            'fatal' (raise at once: auth, invalid argument, exhausted quota, unknown)
+    """
+    if isinstance(error, _EmbeddingCountError):
+        return 'size'
+    status = _error_status(error)
+    if status is not None:
+        message = str(error).lower()
+        if status == 429 and ('billing' in message or 'exceeded your current quota' in message):
+            return 'fatal'
+        if status in _SIZE_STATUS:
+            return 'size'
+        if status in _TRANSIENT_STATUS or status >= 500:
+            return 'transient'
+        return 'fatal'
+    name = type(error).__name__
+    if isinstance(error, TimeoutError) or 'Timeout' in name or 'DeadlineExceeded' in name:
+        return 'size'
+    if isinstance(error, ConnectionError) or 'Connection' in name:
+        return 'transient'
+    return 'fatal'
+
+
+def _embed_with_retry(embed_batch, texts, max_retries, backoff_seconds):
+    """
+    Embed one batch, retrying transient failures with exponential backoff
+
+    Auth, validation and quota errors are raised at once. If a size-related
+    failure (timeout, payload too large, missing embeddings) persists after
+    max_retries and the batch holds more than one text, it is split in half
+    so one bad input doesn't sink its neighbours.
+    """
+    attempt = 0
+    while True:
+        try:
+            embeddings = embed_batch(texts)
+            if len(embeddings) != len(texts):
+                raise _EmbeddingCountError(f"got {len(embeddings)} embeddings for {len(texts)} texts")
+            return embeddings
+        except Exception as e:
+            kind = _classify_error(e)
+            if kind == 'fatal':
+                raise
+            if attempt >= max_retries:
+                if kind == 'size' and len(texts) > 1:
+                    print(f"[WARN] Embedding batch of {len(texts)} failed after {attempt + 1} attempts ({e}), splitting")
+                    middle = len(texts) // 2
+                    return (_embed_with_retry(embed_batch, texts[:middle], max_retries, backoff_seconds) +
+                            _embed_with_retry(embed_batch, texts[middle:], max_retries, backoff_seconds))
+                raise
+            delay = backoff_seconds * (2 ** attempt) * (0.5 + random.random())
+            print(f"[WARN] Embedding batch of {len(texts)} failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+            attempt += 1
+
+
+def embed_in_batches(texts, embed_batch, max_items=EMBEDDING_BATCH_MAX_ITEMS,
+                     max_tokens=EMBEDDING_BATCH_MAX_TOKENS, max_workers=EMBEDDING_BATCH_WORKERS,
+                     max_retries=EMBEDDING_BATCH_RETRIES, backoff_seconds=EMBEDDING_BATCH_BACKOFF_SECONDS):
+    """
+    Embed texts as packed batches on a bounded thread pool
+
+    Args:
+        texts (list): Texts to embed
+        embed_batch (callable): Makes one API request for a list of texts and
+            returns one embedding per text (raises on failure)
+        max_items (int): Max texts per request
+        max_tokens (int): Max estimated tokens per request
+        max_workers (int): Max concurrent requests
+        max_retries (int): Retries per batch for transient errors (then size errors split it)
+
+    Returns:
+        list: Embeddings in the same order as texts
+    """
+    if not texts:
+        return []
+
+    batches = pack_batches(texts, max_items, max_tokens)
+    if len(batches) == 1 or max_workers <= 1:
+        results = [_embed_with_retry(embed_batch, texts[start:end], max_retries, backoff_seconds)
+                   for start, end in batches]
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as executor:
+            futures = [
+                executor.submit(_embed_with_retry, embed_batch, texts[start:end], max_retries, backoff_seconds)
+                for start, end in batches
+            ]
+            # Collect in submission order so embeddings line up with texts
+            results = [future.result() for future in futures]
+
+    return [embedding for batch in results for embedding in batch]
@@ -0,0 +1,374 @@
+"""
+Embedding Cache - Content-addressed cache in front of the embedding providers
+Keys are (model_name, task_type, sha256(text)), so re-ingesting an unchanged
+document or repeating a query never hits the embedding API twice.
+
+Tiers:
+- In-process LRU (always on, bounded by EMBEDDING_CACHE_SIZE entries)
+- Optional persistent tier selected with EMBEDDING_CACHE_BACKEND:
+    'disk'  - memory-mapped float32 store in EMBEDDING_CACHE_DIR (append-only index log)
+    'mongo' - capped MongoDB collection (EMBEDDING_CACHE_MONGO_MAX_MB)
+"""
+
+import os
+import json
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv(verbose=False)
+
+
+def make_cache_key(model_name, task_type, text):
+    """Build the content-addressed cache key for one text"""
+    digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    return f"{model_name}:{task_type}:{digest}"
+
+
+class _DiskEmbeddingStore:
+    """
+    Memory-mapped float32 store on local disk
+
+    One fixed-capacity matrix file per embedding dimension; slots are reused
+    in FIFO order once the file is full. The key -> slot index lives in an
+    append-only log (one JSON line per write), replayed on start and compacted
+    into a snapshot once it holds mostly superseded lines. Intended for a
+    single writer process per directory - use the 'mongo' backend when several
+    gunicorn workers share the cache.
+    """
+
+    def __init__(self, directory, capacity):
+        import numpy as np
+        self._np = np
+        self.directory = directory
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._matrices = {}
+        os.makedirs(directory, exist_ok=True)
+        self._log_path = os.path.join(directory, 'index.log')
+        self._index = {'slots': {}, 'stores': {}}
+        self._log_lines = 0
+        self._load_index()
+
+    def _load_index(self):
+        """Replay the index log (or import a legacy index.json snapshot)"""
+        legacy_path = os.path.join(self.directory, 'index.json')
+        if not os.path.exists(self._log_path):
+            if os.path.exists(legacy_path):
+                try:
+                    with open(legacy_path, 'r', encoding='utf-8') as f:
+                        self._index = json.load(f)
+                    self._compact()
+                except Exception as e:
+                    print(f"[WARN] Embedding cache index unreadable, starting empty: {e}")
+            return
+
+        with open(self._log_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # torn last line after a crash
+                self._log_lines += 1
+                if isinstance(record, dict):
+                    # Snapshot of one dimension's store (written by _compact)
+                    dim = record['dim']
+                    self._index['stores'][str(dim)] = {'next_slot': record['next_slot'], 'keys': record['keys']}
+                    for slot, key in enumerate(record['keys']):
+                        if key is not None:
+                            self._index['slots'][key] = [dim, slot]
+                else:
+                    self._assign(*record)
+
+    def _assign(self, key, dim, slot):
+        """Point key at (dim, slot), evicting whatever lived in that slot before"""
+        store = self._index['stores'].setdefault(str(dim), {'next_slot': 0, 'keys': []})
+        if slot < len(store['keys']):
+            self._index['slots'].pop(store['keys'][slot], None)
+            store['keys'][slot] = key
+        else:
+            store['keys'].append(key)
+        store['next_slot'] += 1
+        self._index['slots'][key] = [dim, slot]
+
+    def _compact(self):
+        """Rewrite the log as one snapshot line per dimension (atomic replace)"""
+        temp_path = self._log_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for dim, store in self._index['stores'].items():
+                keys = [key if self._index['slots'].get(key) == [int(dim), slot] else None
+                        for slot, key in enumerate(store['keys'])]
+                f.write(json.dumps({'dim': int(dim), 'next_slot': store['next_slot'], 'keys': keys}) + '\n')
+        os.replace(temp_path, self._log_path)
+        self._log_lines = len(self._index['stores'])
+
+    def _matrix(self, dim):
+        """Open (or create) the memory-mapped matrix for a dimension"""
+        matrix = self._matrices.get(dim)
+        if matrix is None:
+            path = os.path.join(self.directory, f'embeddings_{dim}.f32')
+            mode = 'r+' if os.path.exists(path) else 'w+'
+            matrix = self._np.memmap(path, dtype='<f4', mode=mode, shape=(self.capacity, dim))
+            self._matrices[dim] = matrix
+        return matrix
+
+    def get_many(self, keys):
+        results = {}
+        with self._lock:
+            for key in keys:
+                location = self._index['slots'].get(key)
+                if location is None:
+                    continue
+                dim, slot = location
+                results[key] = array('f', self._matrix(dim)[slot].tobytes())
+        return results
+
+    def put_many(self, items):
+        if not items:
+            return
+        with self._lock:
+            touched = set()
+            records = []
+            for key, vector in items.items():
+                if key in self._index['slots']:
+                    continue
+                dim = len(vector)
+                store = self._index['stores'].get(str(dim))
+                slot = (store['next_slot'] if store else 0) % self.capacity
+
+                matrix = self._matrix(dim)
+                matrix[slot] = self._np.frombuffer(vector.tobytes(), dtype='<f4')
+                self._assign(key, dim, slot)
+                records.append([key, dim, slot])
+                touched.add(dim)
+
+            if not records:
+                return
+            for dim in touched:
+                self._matrices[dim].flush()
+            # Vectors are flushed before their index lines, so a crash never
+            # leaves the log pointing at unwritten slots
+            with open(self._log_path, 'a', encoding='utf-8') as f:
+                f.write(''.join(json.dumps(record) + '\n' for record in records))
+            self._log_lines += len(records)
+            if self._log_lines > max(1000, 2 * len(self._index['slots'])):
+                self._compact()
+
+    def size(self):
+        return len(self._index['slots'])
+
+
+class _MongoEmbeddingStore:
+    """
+    MongoDB-backed store using a capped collection
+    The collection's byte cap gives size-based FIFO eviction for free
+    """
+
+    def __init__(self, collection_name, max_mb):
+        self.collection_name = collection_name
+        self.max_bytes = max_mb * 1024 * 1024
+        self._collection = None
+        self._lock = threading.Lock()
+
+    def _get_collection(self):
+        if self._collection is not None:
+            return self._collection
+        with self._lock:
+            if self._collection is None:
+                from config import get_db
+                db = get_db()
+                if db is None:
+                    return None
+                if self.collection_name not in db.list_collection_names():
+                    try:
+                        db.create_collection(self.collection_name, capped=True, size=self.max_bytes)
+                    except Exception as e:
+                        # Another worker may have created it first
+                        print(f"[INFO] Embedding cache collection not created: {e}")
+                self._collection = db[self.collection_name]
+        return self._collection
+
+    def get_many(self, keys):
+        collection = self._get_collection()
+        if collection is None or not keys:
+            return {}
+        results = {}
+        for doc in collection.find({'_id': {'$in': list(keys)}}, {'vector': 1}):
+            results[doc['_id']] = array('f', bytes(doc['vector']))
+        return results
+
+    def put_many(self, items):
+        collection = self._get_collection()
+        if collection is None or not items:
+            return
+        from bson.binary import Binary
+        docs = [
+            {
+                '_id': key,
+                'vector': Binary(vector.tobytes()),
+                'dimension': len(vector),
+                'created_at': datetime.now()
+            }
+            for key, vector in items.items()
+        ]
+        try:
+            collection.insert_many(docs, ordered=False)
+        except Exception as e:
+            # Duplicate keys from concurrent workers are expected and harmless
+            if 'duplicate key' not in str(e).lower():
+                print(f"[WARN] Embedding cache write failed: {e}")
+
+    def size(self):
+        collection = self._get_collection()
+        return collection.estimated_document_count() if collection is not None else 0
+
+
+class EmbeddingCache:
+    """Two-tier content-addressed embedding cache with hit/miss counters"""
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        """Singleton pattern"""
+        if cls._instance is None:
+            cls._instance = super(EmbeddingCache, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self.max_entries = int(os.getenv('EMBEDDING_CACHE_SIZE', '2000'))
+        self.backend = os.getenv('EMBEDDING_CACHE_BACKEND', 'memory').lower()
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self._store = None
+
+        try:
+            if self.backend == 'disk':
+                self._store = _DiskEmbeddingStore(
+                    os.getenv('EMBEDDING_CACHE_DIR', os.path.join(os.getcwd(), '.embedding_cache')),
+                    int(os.getenv('EMBEDDING_CACHE_DISK_ITEMS', '50000'))
+                )
+            elif self.backend == 'mongo':
+                self._store = _MongoEmbeddingStore(
+                    os.getenv('EMBEDDING_CACHE_COLLECTION', 'embedding_cache'),
+                    int(os.getenv('EMBEDDING_CACHE_MONGO_MAX_MB', '256'))
+                )
+        except Exception as e:
+            print(f"[WARN] Persistent embedding cache ({self.backend}) unavailable: {e}. Using memory only.")
+            self._store = None
+
+        print(f"[OK] Embedding cache ready (memory: {self.max_entries} entries, persistent: {self.backend if self._store else 'none'})")
+        EmbeddingCache._initialized = True
+
+    def _remember(self, key, vector):
+        """Insert into the LRU tier, evicting the least recently used entries"""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, model_name, task_type, texts):
+        """
+        Look up embeddings for texts
+
+        Returns:
+            list: Embedding (list of floats) per text, or None for misses
+        """
+        keys = [make_cache_key(model_name, task_type, text) for text in texts]
+        found = {}
+
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+
+        missing = [key for key in keys if key not in found]
+        if missing and self._store is not None:
+            try:
+                stored = self._store.get_many(missing)
+            except Exception as e:
+                print(f"[WARN] Persistent embedding cache read failed: {e}")
+                stored = {}
+            if stored:
+                with self._lock:
+                    for key, vector in stored.items():
+                        self._remember(key, vector)
+                    self.persistent_hits += len(stored)
+                found.update(stored)
+
+        results = [found[key].tolist() if key in found else None for key in keys]
+        with self._lock:
+            hit_count = sum(1 for r in results if r is not None)
+            self.hits += hit_count
+            self.misses += len(results) - hit_count
+        return results
+
+    def get(self, model_name, task_type, text):
+        """Look up a single embedding, or None"""
+        return self.get_many(model_name, task_type, [text])[0]
+
+    def put_many(self, model_name, task_type, texts, embeddings):
+        """Store embeddings for texts in both tiers"""
+        items = {}
+        for text, embedding in zip(texts, embeddings):
+            if not embedding:
+                continue
+            try:
+                items[make_cache_key(model_name, task_type, text)] = array('f', embedding)
+            except TypeError:
+                # Not a plain sequence of floats - don't cache it
+                continue
+
+        with self._lock:
+            for key, vector in items.items():
+                self._remember(key, vector)
+
+        if self._store is not None:
+            try:
+                self._store.put_many(items)
+            except Exception as e:
+                print(f"[WARN] Persistent embedding cache write failed: {e}")
+
+    def put(self, model_name, task_type, text, embedding):
+        """Store a single embedding"""
+        self.put_many(model_name, task_type, [text], [embedding])
+
+    def get_stats(self):
+        """Hit/miss counters and tier sizes"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                'hits': self.hits,
+                'persistent_hits': self.persistent_hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'memory_entries': len(self._memory),
+                'memory_max_entries': self.max_entries,
+                'persistent_backend': self.backend if self._store else None,
+            }
+        if self._store is not None:
+            try:
+                stats['persistent_entries'] = self._store.size()
+            except Exception:
+                stats['persistent_entries'] = None
+        return stats
+
+
+# Singleton instance
+embedding_cache = EmbeddingCache()
+
+
+def get_embedding_cache_stats():
+    """Get embedding cache counters"""
+    return embedding_cache.get_stats()
@@ -6,8 +6,15 @@ import os
 import google.generativeai as genai
 from dotenv import load_dotenv
 
+from config.single_flight import SingleFlight
+from .embedding_cache import embedding_cache, make_cache_key
+from .embedding_batcher import embed_in_batches
+
 load_dotenv(verbose=False)
 
+# Concurrent identical embedding requests share one API call
+_embedding_flight = SingleFlight('embedding_service')
+
 class EmbeddingService:
     """Service for generating text embeddings"""
     
@@ -27,7 +34,9 @@ class EmbeddingService:
             self.model_name = os.getenv('EMBEDDING_MODEL', 'text-embedding-004')
             
             if self.api_key:
-                genai.configure(api_key=self.api_key)
+                # Same transport as GeminiConfig - configure() replaces the global client settings
+                from config.gemini import get_genai_transport
+                genai.configure(api_key=self.api_key, transport=get_genai_transport())
                 print(f"[OK] Embedding service configured with model: {self.model_name}")
             else:
                 print("[WARNING] GEMINI_API_KEY not found for embeddings")
@@ -50,6 +59,19 @@ class EmbeddingService:
         if not text or len(text.strip()) == 0:
             raise ValueError("Text cannot be empty")
         
+        cached = embedding_cache.get(self.model_name, "retrieval_document", text)
+        if cached is not None:
+            return cached
+        
+        def call():
+            embedding = self._generate_embedding_uncached(text)
+            embedding_cache.put(self.model_name, "retrieval_document", text, embedding)
+            return embedding
+        
+        return _embedding_flight.do(make_cache_key(self.model_name, "retrieval_document", text), call)
+    
+    def _generate_embedding_uncached(self, text):
+        """Call the embedding API for a single text (no cache lookup)"""
         try:
             result = genai.embed_content(
                 model=self.model_name,
@@ -85,65 +107,90 @@ class EmbeddingService:
         if not texts:
             return []
         
+        # Only texts we have never embedded before go to the API
+        embeddings = embedding_cache.get_many(self.model_name, "retrieval_document", texts)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if not missing:
+            print(f"[INFO] Embedding cache: all {len(texts)} texts cached, skipping API call")
+            return embeddings
+        
+        missing_texts = [texts[i] for i in missing]
+        
+        def call():
+            computed = self._generate_embeddings_batch_uncached(missing_texts)
+            if len(computed) == len(missing_texts):
+                embedding_cache.put_many(self.model_name, "retrieval_document", missing_texts, computed)
+            return computed
+        
+        # Identical batches (e.g. the same document uploaded twice at once) share one run
+        batch_key = make_cache_key(self.model_name, "retrieval_document_batch", "\x00".join(missing_texts))
+        computed = _embedding_flight.do(batch_key, call)
+        
+        if len(computed) != len(missing_texts) or any(embedding is None for embedding in computed):
+            got = sum(1 for embedding in computed if embedding is not None)
+            raise ValueError(f"Failed to generate embeddings: got {got} embeddings for {len(missing_texts)} texts")
+        for i, embedding in zip(missing, computed):
+            embeddings[i] = embedding
+        if len(missing) < len(texts):
+            print(f"[INFO] Embedding cache: {len(texts) - len(missing)}/{len(texts)} texts cached")
+        # One embedding per input text, in order - callers zip these onto their chunks
+        return embeddings
+    
+    def _generate_embeddings_batch_uncached(self, texts):
+        """
+        Embed texts via packed batch requests sent concurrently (no cache lookup)
+        Failed sub-batches are retried with backoff without resending the rest
+        
+        Args:
+            texts (list): List of texts to embed
+        
+        Returns:
+            list: List of embedding vectors, in input order
+        """
         try:
-            # For batch embeddings, the API might return different structures
-            # Try batch first, fall back to individual calls if needed
-            result = genai.embed_content(
-                model=self.model_name,
-                content=texts,
-                task_type="retrieval_document"
-            )
-            
-            embeddings_list = None
-            
-            # Check response structure - could be 'embedding' (single) or 'embeddings' (batch)
-            if isinstance(result, dict):
-                if 'embeddings' in result:
-                    embeddings_list = result['embeddings']
-                elif 'embedding' in result:
-                    # Single embedding returned - this shouldn't happen for batch, but handle it
-                    # If we have multiple texts but got one embedding, we need individual calls
-                    if len(texts) > 1:
-                        print(f"[WARN] Batch API returned single embedding for {len(texts)} texts, using individual calls")
-                        return [self.generate_embedding(text) for text in texts]
-                    else:
-                        embeddings_list = [result['embedding']]
-                else:
-                    # Unknown structure - fall back to individual calls
-                    print(f"[WARN] Unexpected response structure: {list(result.keys())}, using individual calls")
-                    return [self.generate_embedding(text) for text in texts]
-            elif isinstance(result, list):
-                # Response is already a list of embeddings
-                embeddings_list = result
-            else:
-                # Unknown type - fall back to individual calls
-                print(f"[WARN] Batch embedding returned unexpected type: {type(result)}, falling back to individual calls")
-                return [self.generate_embedding(text) for text in texts]
-            
-            # Validate that we got the right number of embeddings
-            if embeddings_list and len(embeddings_list) != len(texts):
-                print(f"[WARN] Embedding count mismatch: got {len(embeddings_list)} embeddings for {len(texts)} texts, using individual calls")
-                return [self.generate_embedding(text) for text in texts]
-            
-            return embeddings_list if embeddings_list else []
-                
-        except KeyError as e:
-            # If 'embeddings' key doesn't exist, try individual calls
-            print(f"[WARN] Batch embedding key error: {e}, falling back to individual calls")
-            try:
-                return [self.generate_embedding(text) for text in texts]
-            except Exception as inner_e:
-                print(f"[ERROR] Batch embedding generation error (fallback failed): {inner_e}")
-                raise
+            return embed_in_batches(texts, self._embed_batch_request)
         except Exception as e:
             print(f"[ERROR] Batch embedding generation error: {e}")
-            # Try fallback to individual calls
-            try:
-                print("[INFO] Attempting fallback to individual embedding calls...")
-                return [self.generate_embedding(text) for text in texts]
-            except Exception as fallback_e:
-                print(f"[ERROR] Fallback also failed: {fallback_e}")
-                raise
+            raise
+    
+    def _embed_batch_request(self, texts):
+        """
+        Make a single batch embedding API call
+        
+        Args:
+            texts (list): List of texts to embed (one request)
+        
+        Returns:
+            list: List of embedding vectors
+        
+        Raises:
+            ValueError: If the response doesn't hold one embedding per text
+        """
+        result = genai.embed_content(
+            model=self.model_name,
+            content=texts,
+            task_type="retrieval_document"
+        )
+        
+        # Check response structure - could be 'embedding' (single) or 'embeddings' (batch)
+        if isinstance(result, dict):
+            if 'embeddings' in result:
+                embeddings_list = result['embeddings']
+            elif 'embedding' in result and len(texts) == 1:
+                embeddings_list = [result['embedding']]
+            else:
+                raise ValueError(f"Unexpected batch response structure: {list(result.keys())}")
+        elif isinstance(result, list):
+            # Response is already a list of embeddings
+            embeddings_list = result
+        else:
+            raise ValueError(f"Batch embedding returned unexpected type: {type(result)}")
+        
+        # Validate that we got the right number of embeddings
+        if len(embeddings_list) != len(texts):
+            raise ValueError(f"Embedding count mismatch: got {len(embeddings_list)} embeddings for {len(texts)} texts")
+        
+        return embeddings_list
     
     def generate_query_embedding(self, query):
         """
@@ -158,14 +205,21 @@ class EmbeddingService:
         if not self.api_key:
             raise ValueError("GEMINI_API_KEY not configured")
         
-        try:
+        cached = embedding_cache.get(self.model_name, "retrieval_query", query)
+        if cached is not None:
+            return cached
+        
+        def call():
             result = genai.embed_content(
                 model=self.model_name,
                 content=query,
                 task_type="retrieval_query"
             )
-            
+            embedding_cache.put(self.model_name, "retrieval_query", query, result['embedding'])
             return result['embedding']
+        
+        try:
+            return _embedding_flight.do(make_cache_key(self.model_name, "retrieval_query", query), call)
         except Exception as e:
             print(f"[ERROR] Query embedding generation error: {e}")
             raise
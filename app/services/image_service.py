@@ -4,7 +4,7 @@ Image Service - Handle image analysis using Gemini Vision and YOLO
 import json
 from PIL import Image
 
-from config.gemini import get_gemini_model
+from config.gemini import get_gemini_model, stream_slot
 from services.image_analysis import (
     common as analysis_common,
     ocr as ocr_analysis,
@@ -365,10 +365,11 @@ def analyze_image_stream(image_file, analysis_type="general", prompt_override=No
                 "- The bounding box should tightly enclose the entire object with the box starting exactly at the object's edges"
             )
             full_response = ""
-            response = model.generate_content([enhanced_prompt, image_obj], stream=True)
-            for chunk in response:
-                if chunk.text:
-                    full_response += chunk.text
+            with stream_slot():
+                response = model.generate_content([enhanced_prompt, image_obj], stream=True)
+                for chunk in response:
+                    if chunk.text:
+                        full_response += chunk.text
 
             objects_data = analysis_common.parse_json_response(full_response)
             if objects_data and isinstance(objects_data, list):
@@ -409,11 +410,12 @@ def analyze_image_stream(image_file, analysis_type="general", prompt_override=No
             return
 
         full_response = ""
-        response = model.generate_content([prompt, image_obj], stream=True)
-        for chunk in response:
-            if chunk.text:
-                full_response += chunk.text
-                yield chunk.text
+        with stream_slot():
+            response = model.generate_content([prompt, image_obj], stream=True)
+            for chunk in response:
+                if chunk.text:
+                    full_response += chunk.text
+                    yield chunk.text
 
         structured_data = _parse_structured_data(analysis_type, full_response)
         marker = STREAM_MARKERS.get(analysis_type)
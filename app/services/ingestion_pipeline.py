@@ -0,0 +1,182 @@
+"""
+Ingestion Pipeline - Stream chunk embeddings into the vector store
+Embedding batches flow into an upsert stage through a bounded queue, so the
+network time spent embedding and upserting overlaps instead of adding up.
+"""
+
+import os
+import time
+import queue
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+from .embedding_batcher import pack_batches, EMBEDDING_BATCH_MAX_TOKENS, EMBEDDING_BATCH_WORKERS
+from .vector_store import get_vector_store, build_chunk_vectors
+
+load_dotenv(verbose=False)
+
+# Chunks per embedding/upsert batch (Pinecone inference and upsert both cap near 100)
+INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', '96'))
+INGEST_EMBED_WORKERS = int(os.getenv('INGEST_EMBED_WORKERS', str(EMBEDDING_BATCH_WORKERS)))
+INGEST_UPSERT_WORKERS = int(os.getenv('INGEST_UPSERT_WORKERS', '4'))
+# Embedded batches allowed to wait for an upsert worker before embedding pauses
+INGEST_QUEUE_SIZE = int(os.getenv('INGEST_QUEUE_SIZE', '8'))
+INGEST_UPSERT_RETRIES = int(os.getenv('INGEST_UPSERT_RETRIES', '3'))
+INGEST_BACKOFF_SECONDS = float(os.getenv('INGEST_BACKOFF_SECONDS', '0.5'))
+
+_STOP = object()
+
+
+def _upsert_with_retry(vector_store, vectors, max_retries=INGEST_UPSERT_RETRIES,
+                       backoff_seconds=INGEST_BACKOFF_SECONDS):
+    """
+    Upsert one batch, retrying only that batch with exponential backoff
+    ValueErrors (e.g. dimension mismatch) are not retried
+    """
+    attempt = 0
+    while True:
+        try:
+            return vector_store.upsert_vectors(vectors)
+        except ValueError:
+            raise
+        except Exception as e:
+            if attempt >= max_retries:
+                raise
+            delay = backoff_seconds * (2 ** attempt) * (0.5 + random.random())
+            print(f"[WARN] Upsert of {len(vectors)} vectors failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+            attempt += 1
+
+
+def upsert_in_batches(vector_store, vectors, batch_size=INGEST_BATCH_SIZE, max_workers=INGEST_UPSERT_WORKERS):
+    """
+    Upsert already-embedded vectors in concurrent batches
+
+    Args:
+        vector_store: Backend exposing upsert_vectors
+        vectors (list): Records from build_chunk_vectors
+        batch_size (int): Vectors per request
+        max_workers (int): Max concurrent requests
+    """
+    batches = [vectors[i:i + batch_size] for i in range(0, len(vectors), batch_size)]
+    if len(batches) <= 1 or max_workers <= 1:
+        for batch in batches:
+            _upsert_with_retry(vector_store, batch)
+        return
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as executor:
+        futures = [executor.submit(_upsert_with_retry, vector_store, batch) for batch in batches]
+        for future in futures:
+            future.result()
+
+
+def ingest_chunks(document_id, chunks, embed_texts, vector_store=None, metadata_list=None,
+                  on_progress=None, batch_size=INGEST_BATCH_SIZE, embed_workers=INGEST_EMBED_WORKERS,
+                  upsert_workers=INGEST_UPSERT_WORKERS, queue_size=INGEST_QUEUE_SIZE):
+    """
+    Embed chunks and upsert them as a two-stage pipeline
+
+    Embedding workers push each finished batch onto a bounded queue; upsert
+    workers drain it concurrently. When the queue is full, embedding waits, so
+    memory stays bounded however large the document is. A failed batch is
+    retried on its own; the first unrecoverable error stops the pipeline.
+
+    Args:
+        document_id: Document identifier
+        chunks (list): Chunk dicts with a 'text' key
+        embed_texts (callable): Embeds a list of texts, returning one embedding per text
+        vector_store: Backend to write to (default: get_vector_store())
+        metadata_list (list): Optional extra metadata per chunk
+        on_progress (callable): Optional on_progress(stored, total) after each upsert (errors are logged, not raised)
+        batch_size (int): Max chunks per embedding/upsert batch
+        embed_workers (int): Concurrent embedding requests
+        upsert_workers (int): Concurrent upsert requests
+        queue_size (int): Embedded batches buffered ahead of the upsert stage
+
+    Returns:
+        dict: {'success', 'stored', 'document_id'}
+    """
+    if vector_store is None:
+        vector_store = get_vector_store()
+
+    total = len(chunks)
+    if not total:
+        return {"success": True, "stored": 0, "document_id": document_id}
+
+    texts = [chunk.get('text', '') if isinstance(chunk, dict) else str(chunk) for chunk in chunks]
+    batches = pack_batches(texts, max_items=batch_size, max_tokens=EMBEDDING_BATCH_MAX_TOKENS)
+
+    pending = queue.Queue(maxsize=max(1, queue_size))
+    failed = threading.Event()
+    errors = []
+    progress_lock = threading.Lock()
+    stored = [0]
+
+    def fail(error):
+        with progress_lock:
+            errors.append(error)
+        failed.set()
+
+    def embed_stage(start, end):
+        if failed.is_set():
+            return
+        try:
+            embeddings = embed_texts(texts[start:end])
+            if len(embeddings) != end - start:
+                raise ValueError(f"Failed to generate embeddings: got {len(embeddings)} embeddings for {end - start} chunks")
+            vectors = build_chunk_vectors(
+                document_id, chunks[start:end], embeddings,
+                metadata_list[start:end] if metadata_list else None,
+                start_index=start, total_chunks=total
+            )
+        except Exception as e:
+            fail(e)
+            return
+        # Blocks while the upsert stage is behind (backpressure)
+        pending.put(vectors)
+
+    def upsert_stage():
+        while True:
+            vectors = pending.get()
+            if vectors is _STOP:
+                return
+            if failed.is_set():
+                continue  # keep draining so embedding workers never block forever
+            try:
+                _upsert_with_retry(vector_store, vectors)
+            except Exception as e:
+                fail(e)
+                continue
+            with progress_lock:
+                stored[0] += len(vectors)
+                done = stored[0]
+            if on_progress:
+                # Progress is best-effort: a failing callback must not kill this
+                # thread, or embedding workers would block on pending.put() forever
+                try:
+                    on_progress(done, total)
+                except Exception as e:
+                    print(f"[WARN] Progress callback failed for doc '{document_id}': {e}")
+
+    upserters = [threading.Thread(target=upsert_stage, daemon=True)
+                 for _ in range(max(1, min(upsert_workers, len(batches))))]
+    for thread in upserters:
+        thread.start()
+
+    with ThreadPoolExecutor(max_workers=max(1, min(embed_workers, len(batches)))) as executor:
+        for start, end in batches:
+            executor.submit(embed_stage, start, end)
+
+    for _ in upserters:
+        pending.put(_STOP)
+    for thread in upserters:
+        thread.join()
+
+    if errors:
+        print(f"[ERROR] Ingestion failed for doc '{document_id}' after {stored[0]}/{total} vectors: {errors[0]}")
+        raise errors[0]
+
+    print(f"[OK] Stored {stored[0]} vectors for doc '{document_id}' ({len(batches)} pipelined batches)")
+    return {"success": True, "stored": stored[0], "document_id": document_id}
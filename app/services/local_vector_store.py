@@ -0,0 +1,432 @@
+"""
+Local Vector Store - In-process exact cosine search on a NumPy matrix
+Stand-in for Pinecone on single-tenant deployments and for offline load tests.
+
+Vectors are L2-normalised float32 rows, so cosine top-k is one matmul.
+document_id filters use an inverted document_id -> rows map instead of
+scanning metadata. The matrix lives in a memory-mapped file and metadata
+in an append-only JSON-lines log under LOCAL_VECTOR_STORE_DIR: each write
+appends one line per vector, and the log is compacted into a single snapshot
+line once it holds mostly superseded records. Other worker processes replay
+only the lines appended since their last read.
+"""
+
+import os
+import json
+import threading
+from contextlib import contextmanager
+import numpy as np
+from dotenv import load_dotenv
+
+from .vector_store import VectorStore, build_chunk_vectors
+
+try:
+    import fcntl
+except ImportError:  # Windows - single process dev server only
+    fcntl = None
+
+load_dotenv(verbose=False)
+
+_INITIAL_CAPACITY = 1024
+# Compact the metadata log once it has this many lines and twice the live vectors
+_MIN_COMPACT_LINES = 1000
+
+
+class LocalVectorStore(VectorStore):
+    """Exact top-k cosine search over a memory-mapped float32 matrix"""
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self.dimension = int(os.getenv("PINECONE_DIMENSION", "768"))
+        self.use_pinecone_embeddings = os.getenv("PINECONE_USE_EMBEDDINGS", "false").lower() == "true"
+        self.directory = os.getenv("LOCAL_VECTOR_STORE_DIR", os.path.join(os.getcwd(), ".vector_store"))
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._vectors_path = os.path.join(self.directory, f"vectors_{self.dimension}.f32")
+        self._log_path = os.path.join(self.directory, f"metadata_{self.dimension}.log")
+        self._legacy_meta_path = os.path.join(self.directory, f"metadata_{self.dimension}.json")
+        self._lock_path = os.path.join(self.directory, f"store_{self.dimension}.lock")
+        self._lock = threading.Lock()
+
+        self._reset()
+        with self._write_lock():
+            self._load()
+
+        print(f"[OK] Local vector store ready → {self.directory} ({self._count - len(self._free_rows)} vectors, {self.dimension}D)")
+        LocalVectorStore._initialized = True
+
+    # ------------------------------------------------------------------------------
+    # STATE / PERSISTENCE
+    # ------------------------------------------------------------------------------
+
+    def _reset(self):
+        self._matrix = None
+        self._capacity = 0
+        self._count = 0           # rows ever allocated (high-water mark)
+        self._ids = []            # row -> vector id (None when deleted)
+        self._metadata = []       # row -> metadata dict (None when deleted)
+        self._id_to_row = {}
+        self._doc_rows = {}       # document_id -> set of rows
+        self._free_rows = []
+        self._valid = np.zeros(0, dtype=bool)
+        self._log_inode = None    # metadata log file we have replayed
+        self._log_offset = 0      # bytes of it applied so far
+        self._log_lines = 0
+
+    def _open_matrix(self, capacity):
+        """Open (or grow) the memory-mapped matrix to hold capacity rows"""
+        if self._matrix is not None and capacity <= self._capacity:
+            return
+        old_matrix, old_count = self._matrix, self._count
+        exists = os.path.exists(self._vectors_path)
+        if exists and old_matrix is None:
+            rows = os.path.getsize(self._vectors_path) // (4 * self.dimension)
+            if rows >= capacity:
+                self._matrix = np.memmap(self._vectors_path, dtype='<f4', mode='r+', shape=(rows, self.dimension))
+                self._capacity = rows
+                return
+
+        # Grow into a new file, then swap it in
+        temp_path = self._vectors_path + '.tmp'
+        matrix = np.memmap(temp_path, dtype='<f4', mode='w+', shape=(capacity, self.dimension))
+        if old_matrix is not None and old_count:
+            matrix[:old_count] = old_matrix[:old_count]
+        elif exists:
+            rows = os.path.getsize(self._vectors_path) // (4 * self.dimension)
+            if rows:
+                previous = np.memmap(self._vectors_path, dtype='<f4', mode='r', shape=(rows, self.dimension))
+                matrix[:min(rows, capacity)] = previous[:min(rows, capacity)]
+                del previous
+        matrix.flush()
+        del matrix
+        self._matrix = None
+        os.replace(temp_path, self._vectors_path)
+        self._matrix = np.memmap(self._vectors_path, dtype='<f4', mode='r+', shape=(capacity, self.dimension))
+        self._capacity = capacity
+
+    def _load(self):
+        """Replay the metadata log and map the vector file (imports a legacy JSON sidecar once)"""
+        if not os.path.exists(self._log_path) and os.path.exists(self._legacy_meta_path):
+            try:
+                with open(self._legacy_meta_path, 'r', encoding='utf-8') as f:
+                    self._apply(json.load(f))
+                self._compact()
+            except Exception as e:
+                print(f"[WARN] Local vector store metadata unreadable, starting empty: {e}")
+                self._reset()
+        self._maybe_reload()
+        if self._count and self._matrix is None:
+            self._open_matrix(max(self._count, _INITIAL_CAPACITY))
+
+    def _maybe_reload(self):
+        """Apply log lines appended by other worker processes (full replay if it was compacted)"""
+        try:
+            stat = os.stat(self._log_path)
+        except OSError:
+            return
+        if stat.st_ino == self._log_inode and stat.st_size == self._log_offset:
+            return
+        self._replay()
+        # Another process may have grown (and so replaced) the vector file
+        self._matrix = None
+        self._capacity = 0
+        if self._count:
+            self._open_matrix(max(self._count, _INITIAL_CAPACITY))
+
+    def _replay(self):
+        """Apply every complete log line past the last offset read"""
+        with open(self._log_path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            if stat.st_ino != self._log_inode or stat.st_size < self._log_offset:
+                # Compacted (replaced) since we last read it - start over
+                self._reset()
+                self._log_inode = stat.st_ino
+            f.seek(self._log_offset)
+            data = f.read()
+
+        # A writer may be mid-line; leave the partial tail for the next read
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # torn line after a crash
+            self._apply(record)
+            self._log_lines += 1
+        self._log_offset += end
+
+    def _apply(self, record):
+        """Apply one log record: a snapshot dict, ['put', row, id, metadata] or ['del', row]"""
+        if isinstance(record, dict):
+            inode, offset, lines = self._log_inode, self._log_offset, self._log_lines
+            self._reset()
+            self._log_inode, self._log_offset, self._log_lines = inode, offset, lines
+            for row, (vector_id, metadata) in enumerate(zip(record['ids'], record['metadata'])):
+                self._append_row()
+                if vector_id is None:
+                    self._free_rows.append(row)
+                else:
+                    self._place(row, vector_id, metadata)
+        elif record[0] == 'put':
+            _, row, vector_id, metadata = record
+            while self._count <= row:
+                self._free_rows.append(self._append_row())
+            if self._ids[row] is not None:
+                self._forget_row(row)
+            previous = self._id_to_row.get(vector_id)
+            if previous is not None:
+                self._forget_row(previous)
+            self._free_rows.remove(row)
+            self._place(row, vector_id, metadata)
+        elif record[0] == 'del':
+            row = record[1]
+            if row < self._count and self._ids[row] is not None:
+                self._forget_row(row)
+
+    def _append_log(self, records):
+        """Flush vectors, then append their metadata records (caller holds the write lock)"""
+        if self._matrix is not None:
+            self._matrix.flush()
+        # Vectors are flushed before their log lines, so a crash never leaves
+        # the log pointing at unwritten rows
+        with open(self._log_path, 'a', encoding='utf-8') as f:
+            f.write(''.join(json.dumps(record) + '\n' for record in records))
+        stat = os.stat(self._log_path)
+        self._log_inode = stat.st_ino
+        self._log_offset = stat.st_size
+        self._log_lines += len(records)
+        if self._log_lines > max(_MIN_COMPACT_LINES, 2 * len(self._id_to_row)):
+            self._compact()
+
+    def _compact(self):
+        """Rewrite the log as a single snapshot line (atomic replace, caller holds the write lock)"""
+        temp_path = self._log_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'dimension': self.dimension, 'ids': self._ids, 'metadata': self._metadata}, f)
+            f.write('\n')
+        os.replace(temp_path, self._log_path)
+        stat = os.stat(self._log_path)
+        self._log_inode = stat.st_ino
+        self._log_offset = stat.st_size
+        self._log_lines = 1
+
+    @contextmanager
+    def _write_lock(self):
+        """Cross-process lock for writers (no-op where fcntl is unavailable)"""
+        with open(self._lock_path, 'a+') as handle:
+            if fcntl:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _allocate_row(self):
+        if self._free_rows:
+            return self._free_rows.pop()
+        if self._count >= self._capacity:
+            self._open_matrix(max(_INITIAL_CAPACITY, self._capacity * 2))
+        return self._append_row()
+
+    def _append_row(self):
+        """Add an empty row past the high-water mark (matrix capacity is the caller's concern)"""
+        row = self._count
+        self._count += 1
+        self._ids.append(None)
+        self._metadata.append(None)
+        if self._count > len(self._valid):
+            valid = np.zeros(max(self._capacity, 2 * len(self._valid), _INITIAL_CAPACITY), dtype=bool)
+            valid[:len(self._valid)] = self._valid
+            self._valid = valid
+        return row
+
+    def _place(self, row, vector_id, metadata):
+        """Index a vector id and its metadata at row"""
+        self._ids[row] = vector_id
+        self._metadata[row] = metadata
+        self._valid[row] = True
+        self._id_to_row[vector_id] = row
+        self._doc_rows.setdefault(metadata.get("document_id"), set()).add(row)
+
+    def _remove_row(self, row):
+        self._forget_row(row)
+        self._matrix[row] = 0.0
+
+    def _forget_row(self, row):
+        """Drop a row from the indexes and mark it free"""
+        vector_id = self._ids[row]
+        document_id = self._metadata[row].get('document_id')
+        self._id_to_row.pop(vector_id, None)
+        rows = self._doc_rows.get(document_id)
+        if rows is not None:
+            rows.discard(row)
+            if not rows:
+                del self._doc_rows[document_id]
+        self._ids[row] = None
+        self._metadata[row] = None
+        self._valid[row] = False
+        self._free_rows.append(row)
+
+    # ------------------------------------------------------------------------------
+    # VECTOR STORE API
+    # ------------------------------------------------------------------------------
+
+    def is_available(self):
+        return True
+
+    def get_index(self):
+        return self
+
+    def store_chunks(self, document_id, chunks, embeddings=None, metadata_list=None):
+        """
+        Store document chunks with embeddings (same contract as PineconeService.store_chunks)
+        """
+        if embeddings is None:
+            raise ValueError("Embeddings required - please generate embeddings that match your index dimension")
+
+        if len(chunks) != len(embeddings):
+            raise ValueError("Chunks and embeddings count mismatch.")
+
+        if not chunks:
+            return {"success": True, "stored": 0, "document_id": document_id}
+
+        self.upsert_vectors(build_chunk_vectors(document_id, chunks, embeddings, metadata_list))
+
+        print(f"[OK] Stored {len(chunks)} vectors for doc '{document_id}' (local)")
+        return {"success": True, "stored": len(chunks), "document_id": document_id}
+
+    def upsert_vectors(self, vectors):
+        """Upsert one batch of prepared vectors, replacing existing ids in place"""
+        if not vectors:
+            return
+
+        matrix = np.asarray([vector["values"] for vector in vectors], dtype=np.float32)
+        if matrix.ndim != 2 or matrix.shape[1] != self.dimension:
+            raise ValueError(
+                f"Embedding dimension mismatch: embeddings have dimension {matrix.shape[-1]}, "
+                f"but the local vector store expects {self.dimension}. "
+                f"Set PINECONE_DIMENSION={matrix.shape[-1]} in your .env file."
+            )
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.maximum(norms, 1e-12)
+
+        with self._lock, self._write_lock():
+            self._maybe_reload()
+            records = []
+            for vector, values in zip(vectors, matrix):
+                vector_id = vector["id"]
+                metadata = vector["metadata"]
+                row = self._id_to_row.get(vector_id)
+                if row is not None:
+                    # Upsert semantics - replace the existing vector in place
+                    self._remove_row(row)
+                    self._free_rows.remove(row)
+                else:
+                    row = self._allocate_row()
+
+                self._matrix[row] = values
+                self._place(row, vector_id, metadata)
+                records.append(['put', row, vector_id, metadata])
+
+            self._append_log(records)
+
+    def _filter_rows(self, filters):
+        """
+        Resolve a Pinecone-style filter to candidate rows
+        Returns None when every valid row is a candidate
+        """
+        if not filters:
+            return None
+
+        rows = None
+        for key, condition in filters.items():
+            if isinstance(condition, dict):
+                if '$eq' in condition:
+                    values = [condition['$eq']]
+                elif '$in' in condition:
+                    values = list(condition['$in'])
+                else:
+                    raise ValueError(f"Unsupported filter operator for '{key}': {list(condition.keys())}")
+            else:
+                values = [condition]
+
+            if key == 'document_id':
+                matched = set()
+                for value in values:
+                    matched |= self._doc_rows.get(value, set())
+            else:
+                candidates = rows if rows is not None else np.flatnonzero(self._valid[:self._count])
+                matched = {int(row) for row in candidates if self._metadata[row].get(key) in values}
+            rows = matched if rows is None else (set(rows) & matched)
+        return rows
+
+    def search_similar_chunks(self, embedding, top_k=5, filters=None):
+        """Exact cosine top-k"""
+        query = np.asarray(embedding, dtype=np.float32)
+        if query.shape != (self.dimension,):
+            raise ValueError(f"Query embedding has dimension {query.shape[-1]}, expected {self.dimension}")
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        with self._lock:
+            self._maybe_reload()
+            if self._count == 0 or self._matrix is None:
+                return []
+
+            rows = self._filter_rows(filters)
+            if rows is None:
+                candidate_rows = np.flatnonzero(self._valid[:self._count])
+                if len(candidate_rows) == self._count:
+                    scores = self._matrix[:self._count] @ query
+                else:
+                    scores = self._matrix[candidate_rows] @ query
+            else:
+                candidate_rows = np.fromiter(sorted(rows), dtype=np.int64, count=len(rows))
+                scores = self._matrix[candidate_rows] @ query if len(candidate_rows) else np.zeros(0, dtype=np.float32)
+
+            if len(scores) == 0:
+                return []
+
+            k = min(top_k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+
+            results = []
+            for position in top:
+                row = int(candidate_rows[position])
+                metadata = self._metadata[row]
+                results.append({
+                    "id": self._ids[row],
+                    "score": float(scores[position]),
+                    "text": metadata.get("text"),
+                    "chunk_index": metadata.get("chunk_index"),
+                    "document_id": metadata.get("document_id")
+                })
+            return results
+
+    def delete_document(self, document_id, chunk_count=None):
+        """Delete all chunks for a document (rows come from the inverted map, so chunk_count is unused)"""
+        with self._lock, self._write_lock():
+            self._maybe_reload()
+            rows = list(self._doc_rows.get(document_id, ()))
+            for row in rows:
+                self._remove_row(row)
+            if rows:
+                self._append_log([['del', row] for row in rows])
+
+        print(f"[OK] Deleted {len(rows)} chunks from doc '{document_id}' (local)")
+        return {"success": True, "deleted": len(rows)}
+
+
+# Singleton instance (created on import, like the other services)
+local_vector_store = LocalVectorStore()
@@ -3,6 +3,8 @@ PDF Analysis Prompts
 Contains all prompt building functions for PDF/document analysis types
 """
 
+from ..context_budget import fit_text, get_context_budget
+
 
 def build_document_insight_prompt(document_text, metadata, tables=None, analysis_type='overview'):
     """
@@ -17,6 +19,13 @@ def build_document_insight_prompt(document_text, metadata, tables=None, analysis
     Returns:
         str: The formatted prompt for document analysis
     """
+    # Fit the document to the token budget, trimming every section evenly
+    document_text = fit_text(
+        document_text,
+        get_context_budget(),
+        sections=(metadata or {}).get('sections')
+    )
+
     category_instruction = ""
     short_description_instruction = ""
     summary_instruction = ""
@@ -299,7 +308,7 @@ CRITICAL REQUIREMENTS:
         prompt = f"""Analyze this document in detail and provide comprehensive content analysis.
 
 {content_instruction}Document Text:
-{document_text[:10000]}
+{document_text}
 
 Generate the content analysis with all three sections (A, B, and C):"""
         return prompt
@@ -307,7 +316,7 @@ Generate the content analysis with all three sections (A, B, and C):"""
         prompt = f"""Analyze this document and provide a comprehensive executive summary.
 
 {summary_instruction}Document Text:
-{document_text[:10000]}
+{document_text}
 
 Generate the summary with all three sections (A, B, and C):"""
         return prompt
@@ -315,7 +324,7 @@ Generate the summary with all three sections (A, B, and C):"""
         prompt = f"""Analyze this document's structure, layout, and formatting.
 
 {structure_instruction}Document Text:
-{document_text[:10000]}
+{document_text}
 
 Metadata:
 - Total Pages: {metadata.get('totalPages', 'N/A')}
@@ -348,7 +357,7 @@ Generate the structure analysis with all three sections (A, B, and C):"""
         prompt = f"""Extract and analyze keywords, key terms, and concepts from this document.
 
 {keywords_instruction}Document Text:
-{document_text[:10000]}
+{document_text}
 
 Generate the keywords extraction with all three sections (A, B, and C):"""
         return prompt
@@ -396,7 +405,7 @@ For each key-value pair, use the format: key | value | description
 Use "N/A" if a value cannot be determined. Be specific with numbers, percentages, and quantifiable data.
 
 Document Text:
-{document_text[:10000]}
+{document_text}
 
 Generate structured insights:"""
     
@@ -2,12 +2,15 @@
 PDF Analysis Service - Handle PDF/document analysis using Gemini AI
 """
 from services.pdf_analysis import prompts as pdf_prompts
+from services.document_summarizer import condense_document
 
 
 def build_document_insight_prompt(document_text, metadata, tables=None, analysis_type='overview'):
     """
     Build the insight generation prompt for PDF/other documents
     This is kept on the backend for security and consistency
+    Documents beyond the prompt budget are condensed with map-reduce
+    summarization first, so the analysis covers the whole document
     
     Args:
         document_text: Extracted text from the document
@@ -18,5 +21,10 @@ def build_document_insight_prompt(document_text, metadata, tables=None, analysis
     Returns:
         str: The formatted prompt for document analysis
     """
+    try:
+        document_text = condense_document(document_text)['text']
+    except Exception as e:
+        # Fall back to the token-fitted excerpt the prompt builder makes
+        print(f"[WARN] Map-reduce summarization failed, using excerpts: {e}")
     return pdf_prompts.build_document_insight_prompt(document_text, metadata, tables, analysis_type)
 
@@ -4,6 +4,12 @@ Uses PyMuPDF (fitz) - faster and more reliable than PyPDF2
 """
 import fitz  # PyMuPDF
 import io
+import os
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 
 # Beta limits for PDF processing
@@ -11,48 +17,237 @@ MAX_PAGES_BETA = 30
 MAX_FILE_SIZE_MB = 10
 MAX_WORDS_BETA = 50000
 
-def _get_page_size(pdf_document):
-    """Get page size from the first page"""
+# Page-sharded extraction: documents with at least PDF_PARALLEL_MIN_PAGES pages
+# are split across a shared process pool. PDF_PARALLEL_WORKERS=0 means min(4, CPU count),
+# and 1 disables parallel extraction entirely.
+PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', '12'))
+PDF_PARALLEL_WORKERS = int(os.getenv('PDF_PARALLEL_WORKERS', '0'))
+
+# One page-extraction pool per server process, reused across uploads
+_page_pool = None
+_page_pool_pid = None
+_page_pool_lock = threading.Lock()
+
+def _describe_page_size(width, height):
+    """Map a page size in points to a standard paper name"""
+    # Common sizes in points: A4 = 595x842, Letter = 612x792
+    if abs(width - 595) < 10 and abs(height - 842) < 10:
+        return "A4"
+    elif abs(width - 842) < 10 and abs(height - 595) < 10:
+        return "A4 (Landscape)"
+    elif abs(width - 612) < 10 and abs(height - 792) < 10:
+        return "Letter"
+    elif abs(width - 792) < 10 and abs(height - 612) < 10:
+        return "Letter (Landscape)"
+    return f"{width:.0f} x {height:.0f} pt"
+
+
+def _get_page_image_xrefs(page):
+    """Get the xrefs of all images referenced by a page"""
     try:
-        if pdf_document.page_count > 0:
-            page = pdf_document[0]
-            rect = page.rect
-            width = rect.width
-            height = rect.height
-            
-            # Convert to points and determine standard size
-            # Common sizes in points: A4 = 595x842, Letter = 612x792
-            if abs(width - 595) < 10 and abs(height - 842) < 10:
-                return "A4"
-            elif abs(width - 842) < 10 and abs(height - 595) < 10:
-                return "A4 (Landscape)"
-            elif abs(width - 612) < 10 and abs(height - 792) < 10:
-                return "Letter"
-            elif abs(width - 792) < 10 and abs(height - 612) < 10:
-                return "Letter (Landscape)"
-            else:
-                return f"{width:.0f} x {height:.0f} pt"
-    except:
-        pass
-    return "Unknown"
+        # full=True includes images in XObjects and other embedded resources
+        return [img[0] for img in page.get_images(full=True)]
+    except Exception:
+        # Fallback to basic get_images() if full=True fails
+        try:
+            return [img[0] for img in page.get_images()]
+        except:
+            return []
 
-def extract_text_from_pdf(file_stream):
+
+def _get_page_tables(page, page_num):
+    """Extract tables from a page using PyMuPDF's find_tables"""
+    page_tables = []
+    try:
+        tables = page.find_tables()
+    except AttributeError:
+        # find_tables not available, AI detection is used instead
+        return page_tables
+    except Exception as e:
+        # A table failure only costs this page's tables, never the text extraction
+        print(f"[WARN] Table detection failed on page {page_num + 1}: {e}")
+        return page_tables
+    
+    for table in tables:
+        try:
+            table_data = table.extract()
+            if table_data and len(table_data) > 1:  # At least header + 1 row
+                page_tables.append({
+                    'page': page_num + 1,
+                    'data': table_data,
+                    'rows': len(table_data),
+                    'columns': len(table_data[0]) if table_data else 0
+                })
+        except Exception:
+            continue
+    return page_tables
+
+
+def _analyze_page(page, page_num, extract_tables=True):
     """
-    Extract text from PDF file
+    Collect everything we need from a single page in one visit
     
-    Args:
-        file_stream: File stream from Flask request.files
-        
     Returns:
-        dict: {
-            'text': str,
-            'page_count': int,
-            'metadata': dict,
-            'success': bool,
-            'error': str (if failed)
-        }
+        dict: {'page', 'text', 'word_count', 'image_xrefs', 'tables', 'width', 'height'}
+    """
+    text = page.get_text().strip()
+    rect = page.rect
+    return {
+        'page': page_num + 1,
+        'text': text,
+        'word_count': len(text.split()) if text else 0,
+        'image_xrefs': _get_page_image_xrefs(page),
+        'tables': _get_page_tables(page, page_num) if extract_tables else [],
+        'width': rect.width,
+        'height': rect.height,
+    }
+
+
+def _analyze_page_range(pdf_path, start, end, extract_tables=True):
+    """
+    Process-pool worker: open the shared temp file and analyze pages [start, end)
+    """
+    pdf_document = fitz.open(pdf_path)
+    try:
+        return [
+            _analyze_page(pdf_document[page_num], page_num, extract_tables)
+            for page_num in range(start, end)
+        ]
+    finally:
+        pdf_document.close()
+
+
+def _get_parallel_workers():
+    """Number of worker processes to use for page-sharded extraction"""
+    if PDF_PARALLEL_WORKERS > 0:
+        return PDF_PARALLEL_WORKERS
+    return min(4, os.cpu_count() or 1)
+
+
+def _gevent_patched():
+    """Whether the process runs under gevent monkey-patching (gunicorn -k gevent)"""
+    try:
+        from gevent import monkey
+        return monkey.is_module_patched('thread')
+    except ImportError:
+        return False
+
+
+def _should_parallelize(page_count):
+    """
+    Small documents stay on the serial path - shipping shards to workers would dominate
+    gevent workers stay serial too: the pool's feeder thread and pipes don't mix with monkey-patching
+    """
+    return page_count >= PDF_PARALLEL_MIN_PAGES and _get_parallel_workers() > 1 and not _gevent_patched()
+
+
+def _get_page_pool():
+    """
+    Process pool for page-sharded extraction, created once per server process
+    
+    Workers come from forkserver (or spawn) rather than fork: this process
+    already runs Mongo monitor threads and worker pools, and a forked child
+    can deadlock on a lock one of them held at fork time.
+    """
+    global _page_pool, _page_pool_pid
+    with _page_pool_lock:
+        if _page_pool is None or _page_pool_pid != os.getpid():
+            methods = multiprocessing.get_all_start_methods()
+            mp_context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            # Worker processes start on first use and stay for later uploads
+            _page_pool = ProcessPoolExecutor(max_workers=_get_parallel_workers(), mp_context=mp_context)
+            _page_pool_pid = os.getpid()
+        return _page_pool
+
+
+def _reset_page_pool(pool):
+    """Drop a broken pool so the next upload starts a fresh one"""
+    global _page_pool
+    with _page_pool_lock:
+        if _page_pool is pool:
+            _page_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _analyze_pages_parallel(pdf_bytes, page_count, extract_tables=True):
+    """
+    Split the page range across the shared process pool
+    
+    The document is written once to a temp file that every worker opens
+    read-only; results are merged back in page order.
+    
+    Returns:
+        list: Per-page dicts from _analyze_page, ordered by page number
     """
+    workers = min(_get_parallel_workers(), page_count)
+    # Use more shards than workers so one table-heavy range doesn't stall the pool
+    shard_size = max(1, -(-page_count // (workers * 2)))
+    ranges = [(start, min(start + shard_size, page_count)) for start in range(0, page_count, shard_size)]
+    
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
+        temp_file.write(pdf_bytes)
+        temp_path = temp_file.name
+    
+    pool = _get_page_pool()
     try:
+        shard_results = pool.map(
+            _analyze_page_range,
+            [temp_path] * len(ranges),
+            [start for start, _ in ranges],
+            [end for _, end in ranges],
+            [extract_tables] * len(ranges)
+        )
+        return [page_info for shard in shard_results for page_info in shard]
+    except BrokenProcessPool:
+        _reset_page_pool(pool)
+        raise
+    finally:
+        try:
+            os.unlink(temp_path)
+        except:
+            pass
+
+
+class PdfDocumentAnalysis:
+    """
+    Single-parse view of a PDF document
+    
+    Opens the document once and visits every page once to collect text,
+    image xrefs, tables and page size. Text, table and metadata consumers
+    all read from this object instead of re-opening the file.
+    """
+    
+    def __init__(self, pdf_bytes, extract_tables=True, error=None, tables_only=False):
+        self.file_size = len(pdf_bytes)
+        self.extract_tables = extract_tables
+        # Only tables are wanted, so the word limit doesn't end the page walk
+        self.tables_only = tables_only
+        self.success = False
+        self.error = error
+        self.page_count = 0
+        self.pages = []
+        self.raw_metadata = {}
+        self.pdf_version = 'Unknown'
+        self.text = ''
+        self.word_count = 0
+        # True once every page was visited for tables (past the word limit only when tables_only)
+        self.tables_complete = False
+        self._late_tables = []
+        self._tables_result = None
+        
+        if error is None:
+            self._parse(pdf_bytes)
+    
+    @classmethod
+    def from_stream(cls, file_stream, extract_tables=True, tables_only=False):
+        """
+        Build an analysis from a Flask upload stream, enforcing the beta size limit
+        
+        Args:
+            file_stream: File stream from Flask request.files
+            extract_tables: Whether to run find_tables on each page
+            tables_only: Keep collecting tables after the word limit is hit
+        """
         # Check file size limit
         file_stream.seek(0, 2)  # Seek to end
         file_size = file_stream.tell()
@@ -60,68 +255,163 @@ def extract_text_from_pdf(file_stream):
         
         file_size_mb = file_size / (1024 * 1024)
         if file_size_mb > MAX_FILE_SIZE_MB:
-            return {
-                'success': False,
-                'error': f'File size ({file_size_mb:.1f}MB) exceeds the maximum allowed size of {MAX_FILE_SIZE_MB}MB for beta testing.'
-            }
+            return cls(
+                b'',
+                extract_tables=extract_tables,
+                tables_only=tables_only,
+                error=f'File size ({file_size_mb:.1f}MB) exceeds the maximum allowed size of {MAX_FILE_SIZE_MB}MB for beta testing.'
+            )
         
-        # Read file into memory
         pdf_bytes = file_stream.read()
+        file_stream.seek(0)
+        return cls(pdf_bytes, extract_tables=extract_tables, tables_only=tables_only)
+    
+    def _parse(self, pdf_bytes):
+        """Open the document once and walk every page a single time"""
+        try:
+            pdf_document = fitz.open(stream=pdf_bytes, filetype="pdf")
+        except Exception as e:
+            self._set_exception(e)
+            return
         
-        # Open PDF from bytes
-        pdf_document = fitz.open(stream=pdf_bytes, filetype="pdf")
-        
-        # Get metadata first (before processing)
-        metadata = pdf_document.metadata
-        
-        # Extract text incrementally and check word count as we go
-        # This allows us to stop early if word limit is exceeded
-        text_content = []
-        accumulated_text = ""
-        word_count = 0
-        pages_processed = 0
-        
-        # Get total page count early (before processing)
-        total_page_count = pdf_document.page_count
-        
-        for page_num in range(pdf_document.page_count):
-            page = pdf_document[page_num]
-            text = page.get_text()
+        try:
+            self.raw_metadata = pdf_document.metadata or {}
+            self.page_count = pdf_document.page_count
+            if hasattr(pdf_document, 'pdf_version'):
+                try:
+                    self.pdf_version = f"{pdf_document.pdf_version() / 10.0:.1f}"
+                except Exception:
+                    pass
             
-            # Clean the text
-            cleaned_text = text.strip()
-            if cleaned_text:
-                text_content.append({
-                    'page': page_num + 1,
-                    'text': cleaned_text
-                })
-                accumulated_text += cleaned_text + "\n\n"
-                
-                # Count words incrementally
-                page_words = len(cleaned_text.split())
-                word_count += page_words
-                pages_processed = page_num + 1
+            page_results = None
+            parallel = False
+            if _should_parallelize(self.page_count):
+                try:
+                    page_results = _analyze_pages_parallel(pdf_bytes, self.page_count, self.extract_tables)
+                    parallel = True
+                except Exception as e:
+                    print(f"[WARN] Parallel PDF extraction failed, falling back to serial: {e}")
+                    page_results = None
+            
+            if page_results is None:
+                # Serial path - a generator so the word limit can stop the walk early
+                page_results = (
+                    _analyze_page(pdf_document[page_num], page_num, self.extract_tables)
+                    for page_num in range(self.page_count)
+                )
+            
+            word_count = 0
+            page_results = iter(page_results)
+            for page_info in page_results:
+                self.pages.append(page_info)
                 
                 # Check word count limit after each page (early exit)
+                word_count += page_info['word_count']
                 if word_count > MAX_WORDS_BETA:
-                    pdf_document.close()
-                    return {
-                        'success': False,
-                        'error': f'PDF contains {word_count:,} words (after {pages_processed} pages), which exceeds the beta limit of {MAX_WORDS_BETA:,} words. Please use a smaller document or split it into multiple files.'
-                    }
-        
-        # Final word count check (shouldn't be needed, but safety check)
-        full_text = accumulated_text.strip()
-        final_word_count = len(full_text.split())
-        if final_word_count > MAX_WORDS_BETA:
+                    self.error = f'PDF contains {word_count:,} words (after {page_info["page"]} pages), which exceeds the beta limit of {MAX_WORDS_BETA:,} words. Please use a smaller document or split it into multiple files.'
+                    # The word limit applies to text only - a tables-only caller gets
+                    # the rest of the walk, everyone else is rejected here anyway
+                    if self.extract_tables and self.tables_only:
+                        self._collect_remaining_tables(
+                            pdf_document, page_info['page'], page_results if parallel else None
+                        )
+                        self.tables_complete = True
+                    return
+            
+            self.text = "\n\n".join(p['text'] for p in self.pages if p['text'])
+            self.word_count = len(self.text.split())
+            
+            # Final word count check (shouldn't be needed, but safety check)
+            if self.word_count > MAX_WORDS_BETA:
+                self.error = f'PDF contains {self.word_count:,} words, which exceeds the beta limit of {MAX_WORDS_BETA:,} words. Please use a smaller document or split it into multiple files.'
+                self.tables_complete = self.tables_only
+                return
+            
+            self.success = True
+            self.tables_complete = True
+        except Exception as e:
+            self._set_exception(e)
+        finally:
             pdf_document.close()
+    
+    def _collect_remaining_tables(self, pdf_document, next_page, analyzed_pages=None):
+        """
+        Tables of the pages after the word limit was hit (no text is kept)
+        
+        Args:
+            next_page: Index of the first page not visited yet
+            analyzed_pages: Remaining per-page results when the pool already
+                analyzed every page, else None (tables are found here)
+        """
+        if analyzed_pages is not None:
+            for page_info in analyzed_pages:
+                self._late_tables.extend(page_info['tables'])
+            return
+        for page_num in range(next_page, self.page_count):
+            self._late_tables.extend(_get_page_tables(pdf_document[page_num], page_num))
+    
+    def _set_exception(self, e):
+        """Record a parse failure with a user-friendly message"""
+        error_msg = str(e)
+        import traceback
+        print(f"PDF Extraction Error: {error_msg}")
+        print(traceback.format_exc())
+        
+        if 'document closed' in error_msg.lower() or 'invalid' in error_msg.lower():
+            self.error = 'Unable to process this PDF file. The file may be corrupted, password-protected, or exceed processing limits. Please try a different file or ensure it contains less than 50,000 words and is under 10MB.'
+        else:
+            self.error = f'Failed to extract PDF: {error_msg}. Please ensure the file is a valid PDF and does not exceed beta limits (50,000 words or 10MB).'
+        self.success = False
+    
+    @property
+    def image_count(self):
+        """Number of unique images (by xref) across all pages"""
+        image_xrefs = set()
+        for page_info in self.pages:
+            image_xrefs.update(page_info['image_xrefs'])
+        return len(image_xrefs)
+    
+    @property
+    def page_size(self):
+        """Standard name for the first page size"""
+        if not self.pages:
+            return "Unknown"
+        return _describe_page_size(self.pages[0]['width'], self.pages[0]['height'])
+    
+    @property
+    def tables(self):
+        """Tables found by find_tables, in page order"""
+        return [table for page_info in self.pages for table in page_info['tables']] + self._late_tables
+    
+    def get_metadata(self):
+        """Document metadata in the shape returned by the upload endpoint"""
+        metadata = self.raw_metadata
+        return {
+            'title': metadata.get('title', 'Unknown'),
+            'author': metadata.get('author', 'Unknown'),
+            'subject': metadata.get('subject', ''),
+            'creator': metadata.get('creator', ''),
+            'producer': metadata.get('producer', ''),
+            'creation_date': metadata.get('creationDate', ''),
+            'modification_date': metadata.get('modDate', ''),
+            'keywords': metadata.get('keywords', ''),
+            'pdf_version': self.pdf_version,
+            'page_size': self.page_size,
+        }
+    
+    def text_result(self):
+        """
+        Text extraction result (same shape as extract_text_from_pdf)
+        """
+        if not self.success:
             return {
                 'success': False,
-                'error': f'PDF contains {final_word_count:,} words, which exceeds the beta limit of {MAX_WORDS_BETA:,} words. Please use a smaller document or split it into multiple files.'
+                'error': self.error,
+                'text': '',
+                'page_count': 0
             }
         
-        # Use final word count
-        word_count = final_word_count
+        full_text = self.text
         
         # Count paragraphs (split by double newlines or single newline after sentence)
         paragraphs = [p.strip() for p in full_text.split('\n\n') if p.strip()]
@@ -129,34 +419,6 @@ def extract_text_from_pdf(file_stream):
             paragraphs = [p.strip() for p in full_text.split('\n') if p.strip()]
         paragraph_count = len(paragraphs)
         
-        # Count images across all pages (before closing document)
-        # Use get_images() with full=True to get all image references
-        # Count unique images by xref to avoid counting the same image multiple times
-        image_count = 0
-        image_xrefs = set()  # Track unique images by xref to avoid duplicates
-        
-        for page_num in range(pdf_document.page_count):
-            page = pdf_document[page_num]
-            try:
-                # Get all images (full=True includes images in XObjects and other embedded resources)
-                image_list = page.get_images(full=True)
-                for img in image_list:
-                    xref = img[0]  # xref is the first element in the tuple
-                    if xref not in image_xrefs:
-                        image_xrefs.add(xref)
-                        image_count += 1
-            except Exception as e:
-                # Fallback to basic get_images() if full=True fails
-                try:
-                    image_list = page.get_images()
-                    for img in image_list:
-                        xref = img[0]
-                        if xref not in image_xrefs:
-                            image_xrefs.add(xref)
-                            image_count += 1
-                except:
-                    pass
-        
         # Detect sections (headers/titles - lines that are short and often capitalized)
         sections = []
         lines = full_text.split('\n')
@@ -179,8 +441,6 @@ def extract_text_from_pdf(file_stream):
                 seen.add(section_lower)
                 unique_sections.append(section)
         
-        section_count = len(unique_sections)
-        
         # Simple language detection (basic - can be enhanced)
         # Check for common English words
         common_english_words = ['the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by']
@@ -188,57 +448,87 @@ def extract_text_from_pdf(file_stream):
         english_word_count = sum(1 for word in common_english_words if word in text_lower)
         detected_language = 'English' if english_word_count >= 3 else 'Unknown'
         
-        # Get total page count before closing document
-        total_page_count = pdf_document.page_count
-        
-        # Close document
-        pdf_document.close()
-        
         return {
             'success': True,
             'text': full_text,
-            'page_count': total_page_count,  # Use actual PDF page count, not just pages with text
-            'word_count': word_count,  # Include word count in response
-            'pages': text_content,  # Detailed page-by-page text
+            'page_count': self.page_count,  # Use actual PDF page count, not just pages with text
+            'word_count': self.word_count,
+            'pages': [{'page': p['page'], 'text': p['text']} for p in self.pages if p['text']],
             'paragraph_count': paragraph_count,
-            'image_count': image_count,
-            'section_count': section_count,
+            'image_count': self.image_count,
+            'section_count': len(unique_sections),
             'sections': unique_sections[:20],  # Limit to first 20 sections
             'detected_language': detected_language,
-            'metadata': {
-                'title': metadata.get('title', 'Unknown'),
-                'author': metadata.get('author', 'Unknown'),
-                'subject': metadata.get('subject', ''),
-                'creator': metadata.get('creator', ''),
-                'producer': metadata.get('producer', ''),
-                'creation_date': metadata.get('creationDate', ''),
-                'modification_date': metadata.get('modDate', ''),
-                'keywords': metadata.get('keywords', ''),
-                'pdf_version': f"{pdf_document.pdf_version() / 10.0:.1f}" if hasattr(pdf_document, 'pdf_version') else 'Unknown',
-                'page_size': _get_page_size(pdf_document),
-            }
+            'metadata': self.get_metadata()
         }
-        
-    except Exception as e:
-        error_msg = str(e)
-        import traceback
-        print(f"PDF Extraction Error: {error_msg}")
-        print(traceback.format_exc())
-        
-        # Provide more user-friendly error messages
-        if 'document closed' in error_msg.lower() or 'invalid' in error_msg.lower():
+    
+    def tables_result(self):
+        """
+        Table extraction result (same shape as extract_tables_from_pdf)
+        Falls back to AI detection on the already-extracted text when no tables are found
+        """
+        if self._tables_result is not None:
+            return self._tables_result
+        
+        # For tables-only callers the word limit doesn't fail tables, only a failed parse does
+        if not self.tables_complete:
             return {
                 'success': False,
-                'error': 'Unable to process this PDF file. The file may be corrupted, password-protected, or exceed processing limits. Please try a different file or ensure it contains less than 50,000 words and is under 10MB.',
-                'text': '',
-                'page_count': 0
+                'error': self.error,
+                'tables': [],
+                'has_tables': False
             }
-        return {
-            'success': False,
-            'error': f'Failed to extract PDF: {error_msg}. Please ensure the file is a valid PDF and does not exceed beta limits (50,000 words or 10MB).',
-            'text': '',
-            'page_count': 0
+        
+        all_tables = self.tables
+        
+        # If no tables found with PyMuPDF, use AI to detect tables from text
+        if not all_tables and self.text:
+            tables_from_ai = detect_tables_with_ai(self.text)
+            if tables_from_ai:
+                all_tables = tables_from_ai
+        
+        self._tables_result = {
+            'success': True,
+            'tables': all_tables,
+            'has_tables': len(all_tables) > 0,
+            'table_count': len(all_tables)
         }
+        return self._tables_result
+
+
+def analyze_pdf_document(file_stream, extract_tables=True, tables_only=False):
+    """
+    Parse a PDF once for text, images, tables and metadata
+    
+    Args:
+        file_stream: File stream from Flask request.files
+        extract_tables: Whether to run find_tables on each page
+        tables_only: Keep collecting tables after the word limit is hit
+            (the text is rejected then, so only table callers want this)
+        
+    Returns:
+        PdfDocumentAnalysis: check .success / .error before use
+    """
+    return PdfDocumentAnalysis.from_stream(file_stream, extract_tables=extract_tables, tables_only=tables_only)
+
+
+def extract_text_from_pdf(file_stream):
+    """
+    Extract text from PDF file
+    
+    Args:
+        file_stream: File stream from Flask request.files
+        
+    Returns:
+        dict: {
+            'text': str,
+            'page_count': int,
+            'metadata': dict,
+            'success': bool,
+            'error': str (if failed)
+        }
+    """
+    return analyze_pdf_document(file_stream, extract_tables=False).text_result()
 
 
 def extract_pdf_metadata(file_stream):
@@ -306,64 +596,7 @@ def extract_tables_from_pdf(file_stream):
             'error': str (if failed)
         }
     """
-    try:
-        # Read file into memory
-        pdf_bytes = file_stream.read()
-        file_stream.seek(0)  # Reset stream position
-        
-        # Open PDF from bytes
-        pdf_document = fitz.open(stream=pdf_bytes, filetype="pdf")
-        
-        all_tables = []
-        
-        # Try to extract tables using PyMuPDF's find_tables method
-        for page_num in range(pdf_document.page_count):
-            page = pdf_document[page_num]
-            
-            # Try to find tables using find_tables (available in newer PyMuPDF versions)
-            try:
-                tables = page.find_tables()
-                for table in tables:
-                    try:
-                        # Extract table data
-                        table_data = table.extract()
-                        if table_data and len(table_data) > 1:  # At least header + 1 row
-                            all_tables.append({
-                                'page': page_num + 1,
-                                'data': table_data,
-                                'rows': len(table_data),
-                                'columns': len(table_data[0]) if table_data else 0
-                            })
-                    except Exception as e:
-                        continue
-            except AttributeError:
-                # find_tables not available, will use AI detection instead
-                pass
-        
-        pdf_document.close()
-        
-        # If no tables found with PyMuPDF, use AI to detect tables from text
-        if not all_tables:
-            extraction_result = extract_text_from_pdf(file_stream)
-            if extraction_result['success'] and extraction_result['text']:
-                tables_from_ai = detect_tables_with_ai(extraction_result['text'])
-                if tables_from_ai:
-                    all_tables = tables_from_ai
-        
-        return {
-            'success': True,
-            'tables': all_tables,
-            'has_tables': len(all_tables) > 0,
-            'table_count': len(all_tables)
-        }
-        
-    except Exception as e:
-        return {
-            'success': False,
-            'error': str(e),
-            'tables': [],
-            'has_tables': False
-        }
+    return analyze_pdf_document(file_stream, extract_tables=True, tables_only=True).tables_result()
 
 
 def detect_tables_with_ai(pdf_text):
@@ -378,6 +611,7 @@ def detect_tables_with_ai(pdf_text):
     """
     try:
         from config.gemini import generate_text
+        from .context_budget import fit_text, get_context_budget
         
         # Create prompt for AI to detect and extract tables
         prompt = f"""Analyze the following PDF text and extract ALL tables you find.
@@ -404,10 +638,11 @@ If you find tables, return ONLY valid JSON in this format:
 If no tables are found, return: {{"tables": []}}
 
 PDF Text:
-{pdf_text[:10000]}  # Limit to first 10000 chars to avoid token limits
+{fit_text(pdf_text, get_context_budget())}
 """
         
-        ai_response = generate_text(prompt, temperature=0.3)
+        # Same text, same tables - safe to answer from the response cache
+        ai_response = generate_text(prompt, temperature=0.3, use_cache=True)
         
         # Try to parse JSON from AI response
         import json
@@ -472,19 +707,30 @@ PDF Text:
         return []
 
 
-def analyze_pdf_with_ai(pdf_text, analysis_type='summary'):
+def analyze_pdf_with_ai(pdf_text, analysis_type='summary', regenerate=False):
     """
     Analyze PDF text using Gemini AI
     
     Args:
         pdf_text: Extracted PDF text
         analysis_type: 'summary', 'keywords', 'insights', 'table_extraction'
+        regenerate: Skip the cached analysis of the same text and ask again
         
     Returns:
         str: AI analysis result
     """
     from config import analyze_content
+    from .document_summarizer import condense_document
+    from .context_budget import fit_text, get_context_budget
+    
+    # Long documents are condensed chunk by chunk so nothing is dropped
+    try:
+        pdf_text = condense_document(pdf_text)['text']
+    except Exception as e:
+        # Fall back to token-fitted excerpts, like build_document_insight_prompt
+        print(f"[WARN] Map-reduce summarization failed, using excerpts: {e}")
+        pdf_text = fit_text(pdf_text, get_context_budget())
     
     # Use the existing Gemini integration
-    return analyze_content(pdf_text, analysis_type)
+    return analyze_content(pdf_text, analysis_type, use_cache=True, regenerate=regenerate)
 
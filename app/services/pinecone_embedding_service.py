@@ -6,8 +6,14 @@ import os
 from pinecone import Pinecone
 from dotenv import load_dotenv
 
+from .embedding_cache import embedding_cache
+from .embedding_batcher import embed_in_batches
+
 load_dotenv(verbose=False)
 
+# llama-text-embed-v2 accepts at most 96 inputs per request
+PINECONE_EMBED_MAX_ITEMS = int(os.getenv('PINECONE_EMBED_MAX_ITEMS', '96'))
+
 class PineconeEmbeddingService:
     """Service for generating embeddings using Pinecone's Inference API"""
     
@@ -57,6 +63,16 @@ class PineconeEmbeddingService:
         if not text or len(text.strip()) == 0:
             raise ValueError("Text cannot be empty")
         
+        cached = embedding_cache.get(self.model_name, "passage", text)
+        if cached is not None:
+            return cached
+        
+        embedding = self._generate_embedding_uncached(text)
+        embedding_cache.put(self.model_name, "passage", text, embedding)
+        return embedding
+    
+    def _generate_embedding_uncached(self, text):
+        """Call the Pinecone Inference API for a single passage (no cache lookup)"""
         try:
             # Check if inference API is available
             if not hasattr(self.pc, 'inference'):
@@ -129,60 +145,88 @@ class PineconeEmbeddingService:
         if not texts:
             return []
         
-        try:
-            # Check if inference API is available
-            if not hasattr(self.pc, 'inference'):
-                raise AttributeError(
-                    "Pinecone SDK inference API not available. "
-                    "Please ensure you're using pinecone-client>=3.0.0 with inference support, "
-                    "or use Google's text-embedding-004 (768 dimensions) instead."
-                )
-            
-            # Use Pinecone SDK's inference API for batch
-            result = self.pc.inference.embed(
-                model=self.model_name,
-                inputs=texts,  # Batch input (list of texts)
-                parameters={
-                    "input_type": "passage",
-                    "truncate": "END"
-                }
-            )
-            
-            # Extract embeddings from result
-            if hasattr(result, 'embeddings') and result.embeddings:
-                embeddings = result.embeddings
-            elif hasattr(result, 'data') and result.data:
-                embeddings = [item.get('values', []) for item in result.data]
-            elif isinstance(result, list):
-                embeddings = [item if isinstance(item, list) else item.get('values', []) for item in result]
-            else:
-                # Try to access as dict
-                if isinstance(result, dict):
-                    if 'data' in result:
-                        embeddings = [item.get('values', []) for item in result.get('data', [])]
-                    elif 'embeddings' in result:
-                        embeddings = result['embeddings']
-                    else:
-                        raise ValueError(f"Unexpected batch response format: {list(result.keys())}")
-                else:
-                    raise ValueError(f"Unexpected response type: {type(result)}")
-            
-            if len(embeddings) != len(texts):
-                print(f"[WARN] Expected {len(texts)} embeddings, got {len(embeddings)}, falling back to individual calls")
-                return [self.generate_embedding(text) for text in texts]
-            
+        # Only texts we have never embedded before go to the API
+        embeddings = embedding_cache.get_many(self.model_name, "passage", texts)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if not missing:
+            print(f"[INFO] Embedding cache: all {len(texts)} texts cached, skipping API call")
             return embeddings
-            
+        
+        missing_texts = [texts[i] for i in missing]
+        computed = self._generate_embeddings_batch_uncached(missing_texts)
+        if len(computed) == len(missing_texts):
+            embedding_cache.put_many(self.model_name, "passage", missing_texts, computed)
+        
+        if len(computed) != len(missing_texts) or any(embedding is None for embedding in computed):
+            got = sum(1 for embedding in computed if embedding is not None)
+            raise ValueError(f"Failed to generate embeddings: got {got} embeddings for {len(missing_texts)} texts")
+        for i, embedding in zip(missing, computed):
+            embeddings[i] = embedding
+        # One embedding per input text, in order - callers zip these onto their chunks
+        return embeddings
+    
+    def _generate_embeddings_batch_uncached(self, texts):
+        """
+        Embed passages via packed Inference API requests sent concurrently (no cache lookup)
+        
+        Args:
+            texts (list): List of texts to embed
+        
+        Returns:
+            list: List of embedding vectors, in input order
+        """
+        # Check if inference API is available (not worth retrying)
+        if not hasattr(self.pc, 'inference'):
+            raise AttributeError(
+                "Pinecone SDK inference API not available. "
+                "Please ensure you're using pinecone-client>=3.0.0 with inference support, "
+                "or use Google's text-embedding-004 (768 dimensions) instead."
+            )
+        
+        try:
+            return embed_in_batches(texts, self._embed_batch_request, max_items=PINECONE_EMBED_MAX_ITEMS)
         except Exception as e:
             print(f"[ERROR] Pinecone batch embedding generation error: {e}")
             print(f"[DEBUG] Error type: {type(e).__name__}")
-            # Fallback to individual calls
-            print("[INFO] Falling back to individual embedding calls...")
-            try:
-                return [self.generate_embedding(text) for text in texts]
-            except Exception as fallback_error:
-                print(f"[ERROR] Fallback also failed: {fallback_error}")
-                raise
+            raise
+    
+    def _embed_batch_request(self, texts):
+        """
+        Make a single Inference API call for a batch of passages
+        
+        Raises:
+            ValueError: If the response doesn't hold one embedding per text
+        """
+        result = self.pc.inference.embed(
+            model=self.model_name,
+            inputs=texts,  # Batch input (list of texts)
+            parameters={
+                "input_type": "passage",
+                "truncate": "END"
+            }
+        )
+        
+        # Extract embeddings from result
+        if hasattr(result, 'embeddings') and result.embeddings:
+            embeddings = result.embeddings
+        elif hasattr(result, 'data') and result.data:
+            embeddings = [item.get('values', []) for item in result.data]
+        elif isinstance(result, list):
+            embeddings = [item if isinstance(item, list) else item.get('values', []) for item in result]
+        elif isinstance(result, dict):
+            if 'data' in result:
+                embeddings = [item.get('values', []) for item in result.get('data', [])]
+            elif 'embeddings' in result:
+                embeddings = result['embeddings']
+            else:
+                raise ValueError(f"Unexpected batch response format: {list(result.keys())}")
+        else:
+            raise ValueError(f"Unexpected response type: {type(result)}")
+        
+        if len(embeddings) != len(texts):
+            raise ValueError(f"Expected {len(texts)} embeddings, got {len(embeddings)}")
+        
+        return embeddings
     
     def generate_query_embedding(self, query):
         """
@@ -197,6 +241,10 @@ class PineconeEmbeddingService:
         if not self.pc:
             raise ValueError("Pinecone client not initialized. Check PINECONE_API_KEY.")
         
+        cached = embedding_cache.get(self.model_name, "query", query)
+        if cached is not None:
+            return cached
+        
         try:
             # Check if inference API is available
             if not hasattr(self.pc, 'inference'):
@@ -237,6 +285,7 @@ class PineconeEmbeddingService:
             if not embedding:
                 raise ValueError("No embedding returned from Pinecone Inference API")
             
+            embedding_cache.put(self.model_name, "query", query, embedding)
             return embedding
             
         except Exception as e:
@@ -3,13 +3,16 @@ Optimized Pinecone Service for RAG (Serverless Ready)
 """
 
 import os
+from concurrent.futures import ThreadPoolExecutor
 from pinecone import Pinecone, ServerlessSpec
 from dotenv import load_dotenv
 
+from .vector_store import VectorStore, build_chunk_vectors
+
 load_dotenv(verbose=False)
 
 
-class PineconeService:
+class PineconeService(VectorStore):
     """Optimized Pinecone vector DB handler"""
 
     _instance = None
@@ -38,6 +41,12 @@ class PineconeService:
         self.cloud = os.getenv("PINECONE_CLOUD", "aws")
         self.region = os.getenv("PINECONE_REGION", "us-east-1")
 
+        # Deletes: ids per request (Pinecone accepts up to 1000) and concurrent requests
+        self.delete_batch_size = int(os.getenv("PINECONE_DELETE_BATCH_SIZE", "1000"))
+        self.delete_workers = int(os.getenv("PINECONE_DELETE_WORKERS", "4"))
+        # document_id -> chunks stored by this process, used when ids can't be listed
+        self._chunk_counts = {}
+
         # Check if Pinecone is configured - if not, allow app to continue without RAG
         if not self.api_key or not self.index_name:
             print("[WARN] Pinecone not configured (PINECONE_API_KEY or PINECONE_INDEX_NAME missing). RAG features will be disabled.")
@@ -109,6 +118,9 @@ class PineconeService:
     def get_index(self):
         return self._index
 
+    def is_available(self):
+        return self._index is not None
+
     # ------------------------------------------------------------------------------
     # STORE CHUNKS
     # ------------------------------------------------------------------------------
@@ -147,41 +159,38 @@ class PineconeService:
                     f"or set PINECONE_DIMENSION={embedding_dim} in your .env file and recreate the index."
                 )
 
-        vectors = []
-
-        for i, chunk in enumerate(chunks):
-            # Extract text from chunk (could be dict with 'text' key or just a string)
-            if isinstance(chunk, dict):
-                chunk_text = chunk.get('text', '')
-            else:
-                chunk_text = str(chunk)
-            
-            metadata = {
-                "document_id": document_id,
-                "chunk_index": i,
-                "text": chunk_text,
-                "total_chunks": len(chunks)
-            }
+        vectors = build_chunk_vectors(document_id, chunks, embeddings, metadata_list)
+
+        # Upsert in batches, concurrently, retrying failed batches on their own
+        from .ingestion_pipeline import upsert_in_batches
+        upsert_in_batches(self, vectors)
 
-            if metadata_list and i < len(metadata_list):
-                metadata.update(metadata_list[i])
+        self._chunk_counts[document_id] = len(vectors)
+        print(f"[OK] Stored {len(vectors)} vectors for doc '{document_id}'")
+
+        return {"success": True, "stored": len(vectors), "document_id": document_id}
+
+    def upsert_vectors(self, vectors):
+        """Upsert one batch of prepared vectors (at most 100 per request)"""
+
+        if not self._index:
+            raise ValueError("Pinecone not initialized. Check PINECONE_API_KEY and PINECONE_INDEX_NAME.")
 
-            # Store vectors with embeddings (always use values field)
-            vectors.append({
-                "id": f"{document_id}_chunk_{i}",
-                "values": embeddings[i],
-                "metadata": metadata
-            })
+        for vector in vectors:
+            if len(vector["values"]) != self.dimension:
+                raise ValueError(
+                    f"Embedding dimension mismatch: embeddings have dimension {len(vector['values'])}, "
+                    f"but Pinecone index expects {self.dimension}."
+                )
 
-        # Upsert in batches (fast + safe)
         batch_size = 100
         for i in range(0, len(vectors), batch_size):
-            batch = vectors[i:i + batch_size]
-            self._index.upsert(vectors=batch)
+            self._index.upsert(vectors=vectors[i:i + batch_size])
 
-        print(f"[OK] Stored {len(vectors)} vectors for doc '{document_id}'")
-
-        return {"success": True, "stored": len(vectors), "document_id": document_id}
+        for vector in vectors:
+            document_id = vector["metadata"]["document_id"]
+            self._chunk_counts[document_id] = max(self._chunk_counts.get(document_id, 0),
+                                                  vector["metadata"]["total_chunks"])
 
     # ------------------------------------------------------------------------------
     # SEARCH
@@ -215,27 +224,106 @@ class PineconeService:
     # DELETE DOCUMENT
     # ------------------------------------------------------------------------------
 
-    def delete_document(self, document_id):
-        """Delete all chunks for a document"""
+    def delete_document(self, document_id, chunk_count=None):
+        """
+        Delete all chunks for a document
+
+        Chunk ids are deterministic ({document_id}_chunk_{i}), so ids are
+        enumerated instead of queried - no metadata or vector values are
+        fetched and the cost is O(chunks), independent of dimension.
+
+        Args:
+            document_id: Document identifier
+            chunk_count: Optional number of chunks stored for the document.
+                When omitted, ids are listed by prefix (serverless indexes),
+                falling back to the recorded chunk count.
+        """
 
         if not self._index:
             raise ValueError("Pinecone not initialized. Check PINECONE_API_KEY and PINECONE_INDEX_NAME.")
 
-        result = self._index.query(
-            vector=[0.0] * self.dimension,
-            top_k=10000,
-            include_metadata=True,
-            filter={"document_id": document_id}
-        )
+        if chunk_count is not None:
+            id_pages = [self._chunk_ids(document_id, chunk_count)]
+        else:
+            id_pages = self._list_chunk_ids(document_id)
+
+        deleted = self._delete_ids_in_batches(id_pages)
+        self._chunk_counts.pop(document_id, None)
 
-        ids = [m.id for m in result.matches]
+        print(f"[OK] Deleted {deleted} chunks from doc '{document_id}'")
 
-        if ids:
-            self._index.delete(ids=ids)
+        return {"success": True, "deleted": deleted}
 
-        print(f"[OK] Deleted {len(ids)} chunks from doc '{document_id}'")
+    @staticmethod
+    def _chunk_ids(document_id, chunk_count):
+        return [f"{document_id}_chunk_{i}" for i in range(chunk_count)]
 
-        return {"success": True, "deleted": len(ids)}
+    def _list_chunk_ids(self, document_id):
+        """
+        Yield pages of chunk ids for a document
+
+        Uses the index's id listing by prefix; pod-based indexes don't support
+        it, so fall back to the chunk count recorded at store time (in-process,
+        or the total_chunks metadata on the document's first chunk). Ids already
+        yielded before a listing failure are not yielded again.
+        """
+        prefix = f"{document_id}_chunk_"
+        listed = set()
+        try:
+            for page in self._index.list(prefix=prefix):
+                # Newer SDKs yield ListResponse pages, older ones plain id lists
+                items = page.vectors if hasattr(page, 'vectors') else page
+                ids = [item if isinstance(item, str) else item.id for item in items]
+                listed.update(ids)
+                yield ids
+            return
+        except Exception as e:
+            print(f"[INFO] Listing ids by prefix unavailable ({e}), using recorded chunk count")
+
+        chunk_count = self._get_recorded_chunk_count(document_id)
+        if chunk_count:
+            yield [vector_id for vector_id in self._chunk_ids(document_id, chunk_count) if vector_id not in listed]
+
+    def _get_recorded_chunk_count(self, document_id):
+        chunk_count = self._chunk_counts.get(document_id)
+        if chunk_count is not None:
+            return chunk_count
+
+        first_id = f"{document_id}_chunk_0"
+        try:
+            fetched = self._index.fetch(ids=[first_id])
+            vector = fetched.vectors.get(first_id)
+        except Exception as e:
+            print(f"[WARN] Couldn't fetch chunk count for doc '{document_id}': {e}")
+            return 0
+        if vector is None or not vector.metadata:
+            return 0
+        return int(vector.metadata.get("total_chunks", 1))
+
+    def _delete_ids_in_batches(self, id_pages):
+        """
+        Delete ids in parallel batches as pages of ids arrive
+
+        Returns:
+            int: Number of ids deleted
+        """
+        deleted = 0
+        futures = []
+        batch = []
+        with ThreadPoolExecutor(max_workers=self.delete_workers) as executor:
+            for ids in id_pages:
+                batch.extend(ids)
+                while len(batch) >= self.delete_batch_size:
+                    futures.append(executor.submit(self._index.delete, ids=batch[:self.delete_batch_size]))
+                    deleted += self.delete_batch_size
+                    batch = batch[self.delete_batch_size:]
+            if batch:
+                futures.append(executor.submit(self._index.delete, ids=batch))
+                deleted += len(batch)
+            # Surface the first failure
+            for future in futures:
+                future.result()
+        return deleted
 
 
 # ------------------------------------------------------------------------------
@@ -254,5 +342,5 @@ def store_chunks(document_id, chunks, embeddings, metadata_list=None):
 def search_similar_chunks(embedding, top_k=5, filters=None):
     return pinecone_service.search_similar_chunks(embedding, top_k, filters)
 
-def delete_document(document_id):
-    return pinecone_service.delete_document(document_id)
+def delete_document(document_id, chunk_count=None):
+    return pinecone_service.delete_document(document_id, chunk_count)
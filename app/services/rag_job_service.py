@@ -0,0 +1,325 @@
+"""
+RAG Job Service - Background indexing of uploaded documents for RAG
+Chunking, embedding and vector upserts run on a local worker pool so the
+upload request returns as soon as text is extracted. Job records are kept
+in MongoDB (collection 'rag_jobs') or, when Mongo isn't connected, in a
+local SQLite file, and are polled through GET /api/rag/jobs/<job_id>.
+Jobs only run in the worker that accepted them; each record carries its
+owner (host, pid) and a heartbeat so jobs orphaned by a restart are failed.
+"""
+
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+load_dotenv(verbose=False)
+
+RAG_JOB_WORKERS = int(os.getenv('RAG_JOB_WORKERS', '2'))
+# 'auto' (Mongo when connected, else SQLite), 'mongo' or 'sqlite'
+RAG_JOB_STORE = os.getenv('RAG_JOB_STORE', 'auto').lower()
+RAG_JOB_SQLITE_PATH = os.getenv('RAG_JOB_SQLITE_PATH', os.path.join(os.getcwd(), 'rag_jobs.sqlite3'))
+# The owning worker refreshes heartbeat_at of its unfinished jobs this often;
+# a queued/running job without a heartbeat for RAG_JOB_STALE_SECONDS is failed on read
+RAG_JOB_HEARTBEAT_SECONDS = float(os.getenv('RAG_JOB_HEARTBEAT_SECONDS', '30'))
+RAG_JOB_STALE_SECONDS = float(os.getenv('RAG_JOB_STALE_SECONDS', '150'))
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+
+
+class _MongoJobStore:
+    """Job records in the 'rag_jobs' collection, keyed by job_id"""
+
+    name = 'mongo'
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def create(self, job):
+        self._collection.insert_one({'_id': job['job_id'], **job})
+
+    def update(self, job_id, fields):
+        self._collection.update_one({'_id': job_id}, {'$set': fields})
+
+    def get(self, job_id):
+        job = self._collection.find_one({'_id': job_id})
+        if job:
+            job.pop('_id', None)
+        return job
+
+
+class _SqliteJobStore:
+    """Job records as JSON rows in a local SQLite file (one connection per call)"""
+
+    name = 'sqlite'
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS rag_jobs (job_id TEXT PRIMARY KEY, data TEXT NOT NULL)')
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def create(self, job):
+        with self._lock, self._connect() as conn:
+            conn.execute('INSERT INTO rag_jobs (job_id, data) VALUES (?, ?)', (job['job_id'], json.dumps(job)))
+
+    def update(self, job_id, fields):
+        with self._lock, self._connect() as conn:
+            row = conn.execute('SELECT data FROM rag_jobs WHERE job_id = ?', (job_id,)).fetchone()
+            if row is None:
+                return
+            job = json.loads(row[0])
+            job.update(fields)
+            conn.execute('UPDATE rag_jobs SET data = ? WHERE job_id = ?', (json.dumps(job), job_id))
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute('SELECT data FROM rag_jobs WHERE job_id = ?', (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+
+def _now():
+    return datetime.now().isoformat()
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+def _get_embed_texts(vector_store):
+    """Pick the embedding function that matches the vector store's dimension"""
+    if vector_store.use_pinecone_embeddings and vector_store.dimension == 1024:
+        # Use Pinecone Inference API to generate 1024-dim embeddings
+        from .pinecone_embedding_service import generate_pinecone_embeddings_batch
+        print("[INFO] Using Pinecone Inference API for embeddings (1024 dimensions)")
+        return generate_pinecone_embeddings_batch
+
+    # Use Google embeddings (768 dimensions) - default
+    from .embedding_service import generate_embeddings_batch
+    print(f"[INFO] Using Google text-embedding-004 for embeddings ({vector_store.dimension} dimensions)")
+    return generate_embeddings_batch
+
+
+class RagJobService:
+    """Background worker pool and job records for RAG indexing"""
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        """Singleton pattern"""
+        if cls._instance is None:
+            cls._instance = super(RagJobService, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self._executor = None
+        self._store = None
+        self._lock = threading.Lock()
+        self._active = set()
+        self._heartbeat = None
+        self._host = socket.gethostname()
+        RagJobService._initialized = True
+
+    def _get_executor(self):
+        # Created lazily so forked gunicorn workers each get their own threads
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=RAG_JOB_WORKERS, thread_name_prefix='rag-job')
+            if self._heartbeat is None or not self._heartbeat.is_alive():
+                self._heartbeat = threading.Thread(target=self._heartbeat_loop, name='rag-job-heartbeat', daemon=True)
+                self._heartbeat.start()
+            return self._executor
+
+    def _heartbeat_loop(self):
+        """Keep this worker's queued and running jobs from looking abandoned"""
+        while True:
+            time.sleep(RAG_JOB_HEARTBEAT_SECONDS)
+            with self._lock:
+                job_ids = list(self._active)
+            for job_id in job_ids:
+                self._safe_update(job_id, {'heartbeat_at': _now()})
+
+    def _safe_update(self, job_id, fields):
+        """Best-effort record update: a store error is logged, never raised"""
+        try:
+            self._get_store().update(job_id, fields)
+        except Exception as e:
+            print(f"[WARN] Couldn't update RAG job {job_id}: {e}")
+
+    def _is_stale(self, job):
+        """True if a queued/running job's owning worker is gone"""
+        if job.get('status') not in (JOB_QUEUED, JOB_RUNNING):
+            return False
+        pid = job.get('owner_pid')
+        if job.get('owner_host') == self._host and pid is not None:
+            if pid == os.getpid():
+                with self._lock:
+                    return job['job_id'] not in self._active
+            if not _pid_alive(pid):
+                return True
+        heartbeat = job.get('heartbeat_at') or job.get('created_at')
+        try:
+            age = (datetime.now() - datetime.fromisoformat(heartbeat)).total_seconds()
+        except (TypeError, ValueError):
+            return False
+        return age > RAG_JOB_STALE_SECONDS
+
+    def _get_store(self):
+        with self._lock:
+            if self._store is not None:
+                return self._store
+
+            if RAG_JOB_STORE in ('auto', 'mongo'):
+                from config import get_collection
+                collection = get_collection('rag_jobs')
+                if collection is not None:
+                    self._store = _MongoJobStore(collection)
+                elif RAG_JOB_STORE == 'mongo':
+                    raise RuntimeError("RAG_JOB_STORE=mongo but the database is not connected")
+
+            if self._store is None:
+                self._store = _SqliteJobStore(RAG_JOB_SQLITE_PATH)
+
+            print(f"[OK] RAG job store: {self._store.name}")
+            return self._store
+
+    def submit(self, document_id, text, metadata=None, chunk_size=500, overlap=50):
+        """
+        Queue a document for chunking, embedding and vector storage
+
+        Args:
+            document_id (str): Document identifier used for the chunk ids
+            text (str): Extracted document text
+            metadata (dict): Document metadata copied onto every chunk
+            chunk_size (int): Target chunk size in tokens
+            overlap (int): Overlap between chunks in tokens
+
+        Returns:
+            dict: The new job record
+        """
+        job = {
+            'job_id': uuid.uuid4().hex,
+            'document_id': document_id,
+            'filename': (metadata or {}).get('filename'),
+            'status': JOB_QUEUED,
+            'stage': 'queued',
+            'chunks_total': None,
+            'chunks_stored': 0,
+            'progress': 0.0,
+            'error': None,
+            'created_at': _now(),
+            'started_at': None,
+            'finished_at': None,
+            'owner_host': self._host,
+            'owner_pid': os.getpid(),
+            'heartbeat_at': _now()
+        }
+        store = self._get_store()
+        store.create(dict(job))
+        with self._lock:
+            self._active.add(job['job_id'])
+        self._get_executor().submit(self._run, job['job_id'], document_id, text, metadata or {}, chunk_size, overlap)
+        return job
+
+    def _run(self, job_id, document_id, text, metadata, chunk_size, overlap):
+        store = self._get_store()
+        try:
+            store.update(job_id, {'status': JOB_RUNNING, 'stage': 'chunking', 'started_at': _now(), 'heartbeat_at': _now()})
+
+            from .chunking_service import chunk_document
+            from .vector_store import get_vector_store
+            from .ingestion_pipeline import ingest_chunks
+
+            chunks = chunk_document(text=text, metadata=metadata, chunk_size=chunk_size, overlap=overlap)
+            store.update(job_id, {'stage': 'embedding', 'chunks_total': len(chunks)})
+
+            vector_store = get_vector_store()
+
+            def on_progress(stored, total):
+                self._safe_update(job_id, {
+                    'chunks_stored': stored,
+                    'progress': round(stored / total, 4) if total else 1.0,
+                    'heartbeat_at': _now()
+                })
+
+            result = ingest_chunks(
+                document_id=document_id,
+                chunks=chunks,
+                embed_texts=_get_embed_texts(vector_store),
+                vector_store=vector_store,
+                on_progress=on_progress
+            )
+
+            store.update(job_id, {
+                'status': JOB_COMPLETED,
+                'stage': 'done',
+                'chunks_stored': result.get('stored', 0),
+                'progress': 1.0,
+                'finished_at': _now()
+            })
+            print(f"[OK] RAG job {job_id} completed ({result.get('stored', 0)} vectors for doc '{document_id}')")
+        except Exception as e:
+            print(f"[ERROR] RAG job {job_id} failed: {e}")
+            try:
+                store.update(job_id, {'status': JOB_FAILED, 'error': str(e), 'finished_at': _now()})
+            except Exception as update_error:
+                print(f"[WARN] Couldn't record failure for RAG job {job_id}: {update_error}")
+        finally:
+            with self._lock:
+                self._active.discard(job_id)
+
+    def get(self, job_id):
+        """
+        Get a job record, or None if it doesn't exist
+
+        A queued/running job whose worker died (restart, crash) is marked
+        failed here, so pollers don't wait on it forever.
+        """
+        store = self._get_store()
+        job = store.get(job_id)
+        if job and self._is_stale(job):
+            fields = {
+                'status': JOB_FAILED,
+                'error': 'Indexing worker stopped before the job finished - upload the document again',
+                'finished_at': _now()
+            }
+            print(f"[WARN] RAG job {job_id} was abandoned by worker {job.get('owner_host')}:{job.get('owner_pid')}")
+            self._safe_update(job_id, fields)
+            job.update(fields)
+        return job
+
+
+# Singleton instance
+rag_job_service = RagJobService()
+
+
+def submit_rag_job(document_id, text, metadata=None, chunk_size=500, overlap=50):
+    """Queue a document for background RAG indexing"""
+    return rag_job_service.submit(document_id, text, metadata, chunk_size, overlap)
+
+
+def get_rag_job(job_id):
+    """Get a RAG indexing job record"""
+    return rag_job_service.get(job_id)
@@ -3,7 +3,7 @@ RAG Service - Retrieval-Augmented Generation orchestration
 """
 
 from .embedding_service import generate_query_embedding
-from .pinecone_service import search_similar_chunks
+from .vector_store import get_vector_store, search_similar_chunks
 from config.gemini import generate_text_stream
 
 def rag_query(user_query, document_id=None, top_k=5, temperature=0.7, max_tokens=2048):
@@ -22,9 +22,9 @@ def rag_query(user_query, document_id=None, top_k=5, temperature=0.7, max_tokens
     """
     try:
         # Step 1: Check if using integrated embeddings
-        from .pinecone_service import pinecone_service
-        use_pinecone_embeddings = pinecone_service.use_pinecone_embeddings
-        index_dimension = pinecone_service.dimension
+        vector_store = get_vector_store()
+        use_pinecone_embeddings = vector_store.use_pinecone_embeddings
+        index_dimension = vector_store.dimension
         
         # Step 2: Search for similar chunks
         filters = {"document_id": document_id} if document_id else None
@@ -103,9 +103,9 @@ def rag_query_sync(user_query, document_id=None, top_k=5, temperature=0.7, max_t
     """
     try:
         # Step 1: Check if using integrated embeddings
-        from .pinecone_service import pinecone_service
-        use_pinecone_embeddings = pinecone_service.use_pinecone_embeddings
-        index_dimension = pinecone_service.dimension
+        vector_store = get_vector_store()
+        use_pinecone_embeddings = vector_store.use_pinecone_embeddings
+        index_dimension = vector_store.dimension
         
         # Step 2: Search for similar chunks
         filters = {"document_id": document_id} if document_id else None
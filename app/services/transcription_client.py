@@ -0,0 +1,377 @@
+"""
+Transcription Client - AssemblyAI transcripts without a thread blocked per job
+An upload is sent to AssemblyAI on a small pool, then the job is handed to
+a single poller thread and the caller gets a Future. Completion comes from:
+- polling with backoff: the first poll is seeded from the audio duration
+  (short clips are checked after about a second), later polls back off
+  exponentially up to ASSEMBLYAI_POLL_MAX_SECONDS
+- a webhook (optional): with ASSEMBLYAI_WEBHOOK_URL set, AssemblyAI calls
+  the /api/audio/transcription-webhook endpoint, which completes the Future
+  right away. Polling then only runs slowly as a fallback, e.g. for a
+  callback that reached another worker process.
+"""
+
+import os
+import hmac
+import heapq
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+import requests
+from dotenv import load_dotenv
+
+load_dotenv(verbose=False)
+
+ASSEMBLYAI_API_KEY = os.getenv('ASSEMBLYAI_API_KEY', '').strip()
+ASSEMBLYAI_BASE_URL = os.getenv('ASSEMBLYAI_BASE_URL', 'https://api.assemblyai.com/v2').rstrip('/')
+
+# Poll interval bounds (seconds) and growth factor between polls
+ASSEMBLYAI_POLL_MIN_SECONDS = float(os.getenv('ASSEMBLYAI_POLL_MIN_SECONDS', '1'))
+ASSEMBLYAI_POLL_MAX_SECONDS = float(os.getenv('ASSEMBLYAI_POLL_MAX_SECONDS', '15'))
+ASSEMBLYAI_POLL_BACKOFF = float(os.getenv('ASSEMBLYAI_POLL_BACKOFF', '1.5'))
+# Expected processing time as a share of the audio duration (seeds the first poll)
+ASSEMBLYAI_POLL_SEED_RATIO = float(os.getenv('ASSEMBLYAI_POLL_SEED_RATIO', '0.15'))
+# Give up after this long (or the audio duration, if longer)
+ASSEMBLYAI_TIMEOUT_SECONDS = float(os.getenv('ASSEMBLYAI_TIMEOUT_SECONDS', '300'))
+# Concurrent uploads to AssemblyAI
+ASSEMBLYAI_UPLOAD_WORKERS = int(os.getenv('ASSEMBLYAI_UPLOAD_WORKERS', '4'))
+
+# Public URL of the webhook endpoint (empty: polling only)
+ASSEMBLYAI_WEBHOOK_URL = os.getenv('ASSEMBLYAI_WEBHOOK_URL', '').strip()
+# Sent back by AssemblyAI in ASSEMBLYAI_WEBHOOK_HEADER; callbacks without it are rejected
+ASSEMBLYAI_WEBHOOK_SECRET = os.getenv('ASSEMBLYAI_WEBHOOK_SECRET', '').strip()
+ASSEMBLYAI_WEBHOOK_HEADER = 'X-Transcription-Webhook-Secret'
+# Fallback poll interval while a webhook is expected
+ASSEMBLYAI_WEBHOOK_POLL_SECONDS = float(os.getenv('ASSEMBLYAI_WEBHOOK_POLL_SECONDS', '30'))
+
+# Per-request HTTP timeouts (seconds)
+_UPLOAD_TIMEOUT = 120
+_API_TIMEOUT = 30
+
+# Transcription features requested for every job
+_TRANSCRIPT_OPTIONS = {
+    'speaker_labels': True,  # Enable speaker diarization
+    'auto_chapters': True,  # Auto-detect chapters
+    'sentiment_analysis': True,  # Enable sentiment analysis
+    'entity_detection': True,  # Detect entities
+    'language_detection': True,  # Auto-detect language
+    'punctuate': True,  # Add punctuation
+    'format_text': True  # Format text properly
+}
+
+
+def _approved(approval):
+    """Wait for an approval future; anything but True (or an error/timeout) means no"""
+    try:
+        return approval.result(timeout=ASSEMBLYAI_TIMEOUT_SECONDS) is True
+    except Exception:
+        return False
+
+
+class _PendingTranscript:
+    """A submitted job waiting for completion"""
+
+    def __init__(self, future, interval, deadline):
+        self.future = future
+        self.interval = interval
+        self.deadline = deadline
+        self.started = time.monotonic()
+        self.polls = 0
+
+
+class TranscriptionClient:
+    """AssemblyAI jobs completed by a shared poller or by webhook callbacks"""
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        """Singleton pattern"""
+        if cls._instance is None:
+            cls._instance = super(TranscriptionClient, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self.api_key = ASSEMBLYAI_API_KEY
+        self.base_url = ASSEMBLYAI_BASE_URL
+        self.webhook_url = ASSEMBLYAI_WEBHOOK_URL
+        self._upload_executor = ThreadPoolExecutor(
+            max_workers=max(1, ASSEMBLYAI_UPLOAD_WORKERS), thread_name_prefix='assemblyai-upload'
+        )
+        # transcript id -> _PendingTranscript, plus (due, id) poll schedule
+        self._pending = {}
+        self._schedule = []
+        self._condition = threading.Condition()
+        self._poller = None
+        self.stats = {'submitted': 0, 'polls': 0, 'completed_by_poll': 0, 'completed_by_webhook': 0, 'failed': 0}
+        TranscriptionClient._initialized = True
+
+    def _headers(self):
+        return {'Authorization': self.api_key}
+
+    def start(self, file_stream, duration=None, approval=None):
+        """
+        Upload audio and request a transcript
+
+        Args:
+            file_stream: Audio file stream (read on an upload worker)
+            duration (float): Audio duration in seconds, if known (seeds polling)
+            approval (Future): Optional; resolves to True once the transcript may be
+                requested. The upload (not billed) starts right away, the transcript
+                request (billed) waits for it and is skipped if it is False or fails.
+
+        Returns:
+            Future: Resolves to {'success': True, 'transcript_data': dict} or
+                {'success': False, 'error': str}
+        """
+        future = Future()
+        self._upload_executor.submit(self._submit, file_stream, duration, future, approval)
+        return future
+
+    def _submit(self, file_stream, duration, future, approval=None):
+        try:
+            result = self._upload_and_request(file_stream, approval)
+        except Exception as e:
+            result = {'success': False, 'error': str(e)}
+        if not result['success']:
+            self._finish(future, result)
+            return
+
+        transcript_id = result['transcript_id']
+        if self.webhook_url:
+            interval = ASSEMBLYAI_WEBHOOK_POLL_SECONDS
+        else:
+            # About when a job of this length should be done, then back off from there
+            seed = (duration or 0) * ASSEMBLYAI_POLL_SEED_RATIO
+            interval = min(ASSEMBLYAI_POLL_MAX_SECONDS, max(ASSEMBLYAI_POLL_MIN_SECONDS, seed))
+        deadline = time.monotonic() + max(ASSEMBLYAI_TIMEOUT_SECONDS, duration or 0)
+
+        with self._condition:
+            self._pending[transcript_id] = _PendingTranscript(future, interval, deadline)
+            self._schedule_poll(transcript_id, interval)
+            self.stats['submitted'] += 1
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._poll_loop, name='assemblyai-poller', daemon=True)
+                self._poller.start()
+
+    def _upload_and_request(self, file_stream, approval=None):
+        """Upload the audio and create the transcript job (once approved)"""
+        file_stream.seek(0)
+        print("[AUDIO] Uploading audio to AssemblyAI...")
+        upload_response = requests.post(
+            f'{self.base_url}/upload',
+            headers=self._headers(),
+            files={'file': file_stream},
+            timeout=_UPLOAD_TIMEOUT
+        )
+
+        if upload_response.status_code != 200:
+            error_text = upload_response.text
+            if 'Invalid API key' in error_text or upload_response.status_code == 401:
+                return {
+                    'success': False,
+                    'error': f'Invalid AssemblyAI API key. Please check your ASSEMBLYAI_API_KEY in .env file. Error: {error_text}'
+                }
+            return {
+                'success': False,
+                'error': f'Failed to upload audio: {error_text}'
+            }
+
+        audio_url = upload_response.json().get('upload_url')
+        if not audio_url:
+            return {
+                'success': False,
+                'error': 'Failed to get upload URL from AssemblyAI'
+            }
+
+        if approval is not None and not _approved(approval):
+            print("[AUDIO] Transcription not requested: the upload was rejected")
+            return {
+                'success': False,
+                'error': 'Transcription cancelled before it was requested'
+            }
+
+        transcript_request = {'audio_url': audio_url, **_TRANSCRIPT_OPTIONS}
+        if self.webhook_url:
+            transcript_request['webhook_url'] = self.webhook_url
+            if ASSEMBLYAI_WEBHOOK_SECRET:
+                transcript_request['webhook_auth_header_name'] = ASSEMBLYAI_WEBHOOK_HEADER
+                transcript_request['webhook_auth_header_value'] = ASSEMBLYAI_WEBHOOK_SECRET
+
+        print("[AUDIO] Requesting transcription...")
+        transcript_response = requests.post(
+            f'{self.base_url}/transcript',
+            json=transcript_request,
+            headers=self._headers(),
+            timeout=_API_TIMEOUT
+        )
+
+        if transcript_response.status_code != 200:
+            return {
+                'success': False,
+                'error': f'Failed to request transcription: {transcript_response.text}'
+            }
+
+        transcript_id = transcript_response.json().get('id')
+        if not transcript_id:
+            return {
+                'success': False,
+                'error': 'Failed to get transcript ID'
+            }
+
+        print(f"[AUDIO] Waiting for transcription {transcript_id} "
+              f"({'webhook' if self.webhook_url else 'polling'})...")
+        return {'success': True, 'transcript_id': transcript_id}
+
+    def _schedule_poll(self, transcript_id, delay):
+        """Queue the next poll (caller holds the condition)"""
+        heapq.heappush(self._schedule, (time.monotonic() + delay, transcript_id))
+        self._condition.notify()
+
+    def _poll_loop(self):
+        """Poll due jobs one at a time; sleeps until the next one is due"""
+        while True:
+            with self._condition:
+                while True:
+                    if not self._schedule:
+                        self._condition.wait()
+                        continue
+                    due, transcript_id = self._schedule[0]
+                    wait = due - time.monotonic()
+                    if wait > 0:
+                        self._condition.wait(wait)
+                        continue
+                    heapq.heappop(self._schedule)
+                    pending = self._pending.get(transcript_id)
+                    if pending is not None:
+                        break
+            try:
+                self._poll(transcript_id, pending)
+            except Exception as e:
+                print(f"[AUDIO] Poll for transcription {transcript_id} failed: {e}")
+                self._retry_or_expire(transcript_id, pending)
+
+    def _fetch(self, transcript_id):
+        """GET the transcript; returns the final result, or None while it is still processing"""
+        response = requests.get(
+            f'{self.base_url}/transcript/{transcript_id}',
+            headers=self._headers(),
+            timeout=_API_TIMEOUT
+        )
+        if response.status_code != 200:
+            return {
+                'success': False,
+                'error': f'Failed to poll transcription status: {response.text}'
+            }
+
+        transcript_data = response.json()
+        status = transcript_data.get('status')
+        if status == 'completed':
+            return {'success': True, 'transcript_data': transcript_data}
+        if status == 'error':
+            return {
+                'success': False,
+                'error': f'Transcription failed: {transcript_data.get("error", "Unknown error")}'
+            }
+        return None
+
+    def _poll(self, transcript_id, pending):
+        pending.polls += 1
+        with self._condition:
+            self.stats['polls'] += 1
+
+        result = self._fetch(transcript_id)
+        if result is not None:
+            self._complete(transcript_id, result, 'completed_by_poll')
+            return
+        self._retry_or_expire(transcript_id, pending)
+
+    def _retry_or_expire(self, transcript_id, pending):
+        """Schedule the next poll with backoff, or fail the job past its deadline"""
+        if time.monotonic() >= pending.deadline:
+            self._complete(transcript_id, {
+                'success': False,
+                'error': 'Transcription timeout - took too long to complete'
+            })
+            return
+        if not self.webhook_url:
+            pending.interval = min(ASSEMBLYAI_POLL_MAX_SECONDS, pending.interval * ASSEMBLYAI_POLL_BACKOFF)
+        with self._condition:
+            if transcript_id in self._pending:
+                self._schedule_poll(transcript_id, min(pending.interval, max(0.0, pending.deadline - time.monotonic())))
+
+    def _complete(self, transcript_id, result, source=None):
+        """Resolve a pending job once (poll and webhook may race)"""
+        with self._condition:
+            pending = self._pending.pop(transcript_id, None)
+            if pending is None:
+                return False
+            if result['success'] and source:
+                self.stats[source] += 1
+        waited = time.monotonic() - pending.started
+        print(f"[AUDIO] Transcription {transcript_id} finished after {waited:.1f}s "
+              f"({pending.polls} polls{', webhook' if source == 'completed_by_webhook' else ''})")
+        self._finish(pending.future, result)
+        return True
+
+    def _finish(self, future, result):
+        if not result['success']:
+            with self._condition:
+                self.stats['failed'] += 1
+        future.set_result(result)
+
+    def handle_webhook(self, payload, secret=None):
+        """
+        Complete a job from an AssemblyAI webhook callback
+
+        Args:
+            payload (dict): Callback body ({'transcript_id', 'status'})
+            secret (str): Value of the ASSEMBLYAI_WEBHOOK_HEADER header
+
+        Returns:
+            dict: {'success': bool, 'completed': bool, 'error': str (if rejected)}
+        """
+        if ASSEMBLYAI_WEBHOOK_SECRET and not hmac.compare_digest(secret or '', ASSEMBLYAI_WEBHOOK_SECRET):
+            return {'success': False, 'completed': False, 'error': 'Invalid webhook secret'}
+
+        transcript_id = (payload or {}).get('transcript_id')
+        if not transcript_id:
+            return {'success': False, 'completed': False, 'error': 'transcript_id missing'}
+
+        with self._condition:
+            waiting = transcript_id in self._pending
+        if not waiting:
+            # Finished already, or submitted by another worker process (its poller picks it up)
+            return {'success': True, 'completed': False}
+
+        # The callback only carries the status: fetch the transcript itself
+        result = self._fetch(transcript_id)
+        if result is None:
+            return {'success': True, 'completed': False}
+        return {'success': True, 'completed': self._complete(transcript_id, result, 'completed_by_webhook')}
+
+    def get_stats(self):
+        with self._condition:
+            return {**self.stats, 'pending': len(self._pending), 'webhook': bool(self.webhook_url)}
+
+
+# Singleton instance
+transcription_client = TranscriptionClient()
+
+
+def start_transcription_job(file_stream, duration=None, approval=None):
+    """Upload audio and request a transcript; returns a Future of the raw result"""
+    return transcription_client.start(file_stream, duration, approval)
+
+
+def handle_transcription_webhook(payload, secret=None):
+    """Complete a waiting transcription from an AssemblyAI webhook callback"""
+    return transcription_client.handle_webhook(payload, secret)
+
+
+def get_transcription_stats():
+    """Get submitted / polled / completed counters"""
+    return transcription_client.get_stats()
@@ -0,0 +1,127 @@
+"""
+Vector Store - Backend selection for RAG chunk storage and retrieval
+
+Every backend exposes the same API as PineconeService:
+store_chunks / search_similar_chunks / delete_document / upsert_vectors,
+plus the 'dimension' and 'use_pinecone_embeddings' attributes the ingestion
+path reads.
+
+VECTOR_STORE_BACKEND:
+- 'auto' (default): Pinecone when it is configured and reachable, otherwise local
+- 'pinecone': always Pinecone (RAG disabled if it isn't configured)
+- 'local': in-process NumPy index persisted to a memory-mapped file
+"""
+
+import os
+from abc import ABC, abstractmethod
+from dotenv import load_dotenv
+
+load_dotenv(verbose=False)
+
+
+class VectorStore(ABC):
+    """Interface shared by all vector store backends"""
+
+    dimension = 768
+    use_pinecone_embeddings = False
+
+    @abstractmethod
+    def is_available(self):
+        """Whether the backend can serve requests"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def store_chunks(self, document_id, chunks, embeddings=None, metadata_list=None):
+        """Store document chunks with their embeddings"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def upsert_vectors(self, vectors):
+        """Upsert one batch of vectors built by build_chunk_vectors (a single request)"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def search_similar_chunks(self, embedding, top_k=5, filters=None):
+        """Return the top_k most similar chunks as dicts with id, score, text, chunk_index, document_id"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_document(self, document_id, chunk_count=None):
+        """Delete all chunks for a document (chunk_count, if known, skips id enumeration)"""
+        raise NotImplementedError
+
+
+def build_chunk_vectors(document_id, chunks, embeddings, metadata_list=None, start_index=0, total_chunks=None):
+    """
+    Build upsert records for a run of consecutive chunks
+
+    Args:
+        document_id: Document identifier
+        chunks: Chunk dicts with a 'text' key (or plain strings)
+        embeddings: One embedding per chunk
+        metadata_list: Optional extra metadata per chunk (indexed like chunks)
+        start_index: Index of chunks[0] within the whole document
+        total_chunks: Number of chunks in the whole document (default: len(chunks))
+
+    Returns:
+        list: Dicts with 'id', 'values' and 'metadata'
+    """
+    if total_chunks is None:
+        total_chunks = len(chunks)
+
+    vectors = []
+    for offset, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
+        i = start_index + offset
+        # Extract text from chunk (could be dict with 'text' key or just a string)
+        chunk_text = chunk.get('text', '') if isinstance(chunk, dict) else str(chunk)
+
+        metadata = {
+            "document_id": document_id,
+            "chunk_index": i,
+            "text": chunk_text,
+            "total_chunks": total_chunks
+        }
+        if metadata_list and offset < len(metadata_list):
+            metadata.update(metadata_list[offset])
+
+        vectors.append({
+            "id": f"{document_id}_chunk_{i}",
+            "values": embedding,
+            "metadata": metadata
+        })
+    return vectors
+
+
+_vector_store = None
+
+
+def get_vector_store():
+    """Get the configured vector store backend (created on first use)"""
+    global _vector_store
+    if _vector_store is not None:
+        return _vector_store
+
+    backend = os.getenv('VECTOR_STORE_BACKEND', 'auto').lower()
+
+    if backend in ('auto', 'pinecone'):
+        from .pinecone_service import pinecone_service
+        if backend == 'pinecone' or pinecone_service.is_available():
+            _vector_store = pinecone_service
+            return _vector_store
+        print("[INFO] Pinecone unavailable - using local vector store for RAG")
+
+    from .local_vector_store import local_vector_store
+    _vector_store = local_vector_store
+    return _vector_store
+
+
+def store_chunks(document_id, chunks, embeddings, metadata_list=None):
+    return get_vector_store().store_chunks(document_id, chunks, embeddings, metadata_list)
+
+
+def search_similar_chunks(embedding, top_k=5, filters=None):
+    return get_vector_store().search_similar_chunks(embedding, top_k, filters)
+
+
+def delete_document(document_id, chunk_count=None):
+    return get_vector_store().delete_document(document_id, chunk_count)
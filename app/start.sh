@@ -9,12 +9,23 @@ PORT=${PORT:-80}
 # For high-memory VPS (8GB+): use 4+ workers
 WORKERS=${GUNICORN_WORKERS:-1}
 
+# Worker class: "sync" (default) or "gevent"
+# With gevent, each worker serves many SSE streams cooperatively instead of
+# being pinned by one slow Gemini stream. GEMINI_MAX_CONCURRENT_STREAMS caps
+# the streams per worker; GUNICORN_WORKER_CONNECTIONS caps open connections.
+WORKER_CLASS=${GUNICORN_WORKER_CLASS:-sync}
+WORKER_ARGS="--worker-class ${WORKER_CLASS}"
+if [ "${WORKER_CLASS}" = "gevent" ]; then
+    WORKER_ARGS="${WORKER_ARGS} --worker-connections ${GUNICORN_WORKER_CONNECTIONS:-200}"
+fi
+
 # Memory-optimized Gunicorn settings for 1GB RAM VPS
 # - 1 worker to minimize memory usage
 # - Reduced timeout for faster cleanup
 # - Preload app to share memory between processes (not used with 1 worker, but good practice)
 exec gunicorn --bind "0.0.0.0:${PORT}" \
     --workers ${WORKERS} \
+    ${WORKER_ARGS} \
     --timeout 300 \
     --keep-alive 5 \
     --max-requests 1000 \
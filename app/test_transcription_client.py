@@ -0,0 +1,195 @@
+"""
+Manual test for the AssemblyAI transcription client against a local stub
+The stub server stands in for AssemblyAI (upload, transcript, status) and
+finishes each job after a fixed processing time. Checks:
+- adaptive polling: a short clip completes about when the stub finishes,
+  instead of on the old fixed 5 s poll
+- webhook completion through /api/audio/transcription-webhook
+- a failed job and a webhook with the wrong secret
+
+No API key or network access needed.
+Run this: python app/test_transcription_client.py
+"""
+
+import io
+import json
+import os
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import requests
+import soundfile as sf
+
+# Processing time of every stub job (seconds)
+STUB_PROCESSING_SECONDS = 1.2
+WEBHOOK_SECRET = 'stub-secret'
+
+
+class _StubAssemblyAI(BaseHTTPRequestHandler):
+    """Minimal AssemblyAI v2 API: /upload, /transcript, /transcript/<id>"""
+
+    jobs = {}
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def do_POST(self):
+        body = self._body()
+        if self.path == '/upload':
+            # The file name picks the outcome: 'fail' in it makes the job fail
+            failing = b'filename="fail' in body
+            self._reply({'upload_url': f"stub://{'fail' if failing else 'ok'}/{uuid.uuid4().hex}"})
+        elif self.path == '/transcript':
+            request = json.loads(body)
+            transcript_id = uuid.uuid4().hex
+            job = {'request': request, 'ready_at': time.monotonic() + STUB_PROCESSING_SECONDS, 'polls': 0}
+            self.jobs[transcript_id] = job
+            if request.get('webhook_url'):
+                threading.Timer(STUB_PROCESSING_SECONDS, _send_webhook, (transcript_id, job)).start()
+            self._reply({'id': transcript_id, 'status': 'queued'})
+        else:
+            self._reply({'error': 'not found'}, 404)
+
+    def do_GET(self):
+        transcript_id = self.path.rsplit('/', 1)[-1]
+        job = self.jobs.get(transcript_id)
+        if job is None:
+            self._reply({'error': 'not found'}, 404)
+            return
+        job['polls'] += 1
+        self._reply(_job_status(transcript_id, job))
+
+
+def _job_status(transcript_id, job):
+    if time.monotonic() < job['ready_at']:
+        return {'id': transcript_id, 'status': 'processing'}
+    if job['request']['audio_url'].startswith('stub://fail'):
+        return {'id': transcript_id, 'status': 'error', 'error': 'Stub failure'}
+    return {
+        'id': transcript_id,
+        'status': 'completed',
+        'text': 'Hello from the stub.',
+        'words': [
+            {'start': 0, 'end': 400, 'text': 'Hello', 'speaker': 'A'},
+            {'start': 400, 'end': 900, 'text': 'from', 'speaker': 'A'},
+            {'start': 900, 'end': 1500, 'text': 'the stub.', 'speaker': 'A'}
+        ],
+        'language_code': 'en',
+        'audio_duration': 5
+    }
+
+
+def _send_webhook(transcript_id, job):
+    request = job['request']
+    headers = {}
+    if request.get('webhook_auth_header_name'):
+        headers[request['webhook_auth_header_name']] = request['webhook_auth_header_value']
+    status = _job_status(transcript_id, job)['status']
+    requests.post(request['webhook_url'], json={'transcript_id': transcript_id, 'status': status},
+                  headers=headers, timeout=10)
+
+
+def _serve(server):
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def _clip(name, seconds=5, sample_rate=16000):
+    """In-memory WAV upload named like a form file"""
+    buffer = io.BytesIO()
+    sf.write(buffer, np.zeros(seconds * sample_rate, dtype=np.float32), sample_rate, format='WAV')
+    buffer.seek(0)
+    buffer.name = name
+    return buffer
+
+
+stub = _serve(ThreadingHTTPServer(('127.0.0.1', 0), _StubAssemblyAI))
+# Point the client at the stub before the services read their configuration
+os.environ['ASSEMBLYAI_API_KEY'] = 'stub-key'
+os.environ['ASSEMBLYAI_BASE_URL'] = f'http://127.0.0.1:{stub.server_port}'
+os.environ['ASSEMBLYAI_WEBHOOK_SECRET'] = WEBHOOK_SECRET
+
+from werkzeug.serving import make_server
+
+from main import app
+from services.audio_service import transcribe_audio
+from services.transcription_client import transcription_client, get_transcription_stats
+
+
+def test_polling():
+    print("\n" + "-" * 60)
+    print(f"Adaptive polling (stub finishes after {STUB_PROCESSING_SECONDS}s)")
+    print("-" * 60)
+    start = time.perf_counter()
+    result = transcribe_audio(_clip('short.wav'))
+    elapsed = time.perf_counter() - start
+    assert result['success'], result
+    assert result['transcript'] == 'Hello from the stub.'
+    print(f"[OK] Transcribed in {elapsed:.2f}s (fixed 5 s polling: at least 5 s)")
+
+
+def test_failed_job():
+    print("\n" + "-" * 60)
+    print("Failed job")
+    print("-" * 60)
+    result = transcribe_audio(_clip('fail.wav'))
+    assert not result['success'] and 'Stub failure' in result['error'], result
+    print(f"[OK] Error reported: {result['error']}")
+
+
+def test_webhook():
+    print("\n" + "-" * 60)
+    print("Webhook completion")
+    print("-" * 60)
+    server = _serve(make_server('127.0.0.1', 0, app, threaded=True))
+    transcription_client.webhook_url = f'http://127.0.0.1:{server.server_port}/api/audio/transcription-webhook'
+    try:
+        before = get_transcription_stats()['completed_by_webhook']
+        start = time.perf_counter()
+        result = transcribe_audio(_clip('webhook.wav'))
+        elapsed = time.perf_counter() - start
+        assert result['success'], result
+        assert get_transcription_stats()['completed_by_webhook'] == before + 1
+        print(f"[OK] Completed by webhook in {elapsed:.2f}s")
+
+        response = requests.post(
+            transcription_client.webhook_url,
+            json={'transcript_id': 'unknown', 'status': 'completed'},
+            headers={'X-Transcription-Webhook-Secret': 'wrong'},
+            timeout=10
+        )
+        assert response.status_code == 401, response.status_code
+        print("[OK] Webhook with the wrong secret rejected (401)")
+    finally:
+        transcription_client.webhook_url = ''
+        server.shutdown()
+
+
+def run_tests():
+    print("=" * 60)
+    print("Transcription client test (stub AssemblyAI)")
+    print("=" * 60)
+    test_polling()
+    test_failed_job()
+    test_webhook()
+    print(f"\nStats: {get_transcription_stats()}")
+    stub.shutdown()
+
+
+if __name__ == '__main__':
+    run_tests()
@@ -40,6 +40,7 @@ export const useInsightGenerator = (fileData, analysisData, tables) => {
           tables: tables || [],
           temperature: isCSV ? 0.3 : 0.7, // Lower temperature for CSV for more structured output
           max_tokens: isCSV ? 4096 : 2048, // More tokens for CSV to allow comprehensive insights
+          regenerate: insights !== null, // "Regenerate Insights" asks for a fresh answer
         },
         (chunk) => {
           fullResponse += chunk;
@@ -5,6 +5,19 @@
 
 import { API_BASE_URL } from './api';
 
+// Dataset id the server returned for a CSV rows array (X-Dataset-Id). Follow-up
+// analysis types send the id instead of re-posting every row.
+const csvDatasetIds = new WeakMap();
+
+const postInsightRequest = (payload) =>
+  fetch(`${API_BASE_URL}/api/ai/generate-insights-stream`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify(payload),
+  });
+
 /**
  * Generate insights for a document/CSV file
  * @param {Object} params - Parameters for insight generation
@@ -22,6 +35,7 @@ export const generateInsights = async (params, onChunk) => {
       tables,
       temperature = 0.7,
       max_tokens = 2048,
+      regenerate = false,
     } = params;
 
     console.log('Generating insights with params:', {
@@ -42,13 +56,23 @@ export const generateInsights = async (params, onChunk) => {
       max_tokens,
     };
 
+    // Repeat requests are answered from the server's response cache unless regenerating
+    if (regenerate) {
+      payload.regenerate = true;
+    }
+
     // Add file-type specific data
     if (fileType === 'CSV') {
       if (!csvData || !columns) {
         throw new Error('CSV data and columns are required for CSV files');
       }
-      payload.data = csvData;
-      payload.columns = columns;
+      const datasetId = csvDatasetIds.get(csvData);
+      if (datasetId) {
+        payload.datasetId = datasetId;
+      } else {
+        payload.data = csvData;
+        payload.columns = columns;
+      }
       payload.metadata = metadata || {};
       payload.analysisType = params.analysisType || 'overview';
     } else if (fileType === 'AUDIO') {
@@ -78,13 +102,16 @@ export const generateInsights = async (params, onChunk) => {
       text: payload.text ? `[${payload.text.length} chars]` : undefined,
     });
 
-    const response = await fetch(`${API_BASE_URL}/api/ai/generate-insights-stream`, {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-      },
-      body: JSON.stringify(payload),
-    });
+    let response = await postInsightRequest(payload);
+
+    if (response.status === 404 && payload.datasetId) {
+      // The server no longer has the dataset - send the rows once more
+      csvDatasetIds.delete(csvData);
+      delete payload.datasetId;
+      payload.data = csvData;
+      payload.columns = columns;
+      response = await postInsightRequest(payload);
+    }
 
     console.log('Response status:', response.status, response.statusText);
 
@@ -107,6 +134,11 @@ export const generateInsights = async (params, onChunk) => {
       throw new Error(errorMessage);
     }
 
+    const returnedDatasetId = response.headers.get('X-Dataset-Id');
+    if (fileType === 'CSV' && csvData && returnedDatasetId) {
+      csvDatasetIds.set(csvData, returnedDatasetId);
+    }
+
     const reader = response.body.getReader();
     const decoder = new TextDecoder();
     let fullText = '';